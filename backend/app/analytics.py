@@ -0,0 +1,176 @@
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+from importlib import import_module
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Spend rollups for the /analytics endpoints.
+#
+# spend_rollups holds one row per (owner, category, renewal month, status) with
+# the summed cost and subscription count. Every code path that writes
+# subscriptions applies its delta through record() inside the same transaction,
+# so the rollups commit or roll back with the change itself. Dashboard reads
+# aggregate this table, whose size depends on users x categories x months and
+# not on how many subscriptions exist.
+
+UNCATEGORIZED = "Uncategorized"
+SPEND_STATUS = "Active"
+BUCKET_COLUMNS = ("owner_id", "category", "period", "status")
+# Columns record() needs from a subscription; select these when snapshotting rows for bulk changes
+SNAPSHOT_COLUMNS = (
+    models.Subscription.id, models.Subscription.owner_id, models.Subscription.category,
+    models.Subscription.renewal_date, models.Subscription.status, models.Subscription.cost,
+)
+REBUILD_BATCH_SIZE = 10000
+
+
+def period(renewal_date) -> str:
+    return renewal_date.strftime("%Y-%m") if renewal_date else ""
+
+
+def _value(row, name):
+    return row.get(name) if isinstance(row, dict) else getattr(row, name)
+
+
+def snapshot(sub) -> dict:
+    """Copy of the rollup-relevant fields, taken before an in-place ORM update."""
+    return {name: _value(sub, name) for name in ("owner_id", "category", "renewal_date", "status", "cost")}
+
+
+def _deltas(rows, sign, into):
+    for row in rows:
+        key = (
+            _value(row, "owner_id"),
+            _value(row, "category") or UNCATEGORIZED,
+            period(_value(row, "renewal_date")),
+            _value(row, "status") or SPEND_STATUS,
+        )
+        entry = into[key]
+        entry[0] += sign * (_value(row, "cost") or 0.0)
+        entry[1] += sign
+    return into
+
+
+def record(db: Session, added=(), removed=()):
+    """
+    Applies the rollup delta for subscriptions entering (added) and leaving
+    (removed) the table; an update is its old snapshot removed plus the new row
+    added. Rows may be ORM objects or dicts. Caller commits.
+    """
+    changes = _deltas(removed, -1, _deltas(added, 1, defaultdict(lambda: [0.0, 0])))
+    rows = [
+        dict(zip(BUCKET_COLUMNS, key), total_cost=cost, sub_count=count)
+        for key, (cost, count) in sorted(changes.items(), key=lambda item: repr(item[0]))
+        if cost or count
+    ]
+    if rows:
+        _upsert(db, rows)
+
+
+def _upsert(db: Session, rows):
+    # Rows arrive sorted by bucket so concurrent writers lock them in the same order
+    table = models.SpendRollup.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        # The engine has already imported its own dialect; importing both up front cost ~30ms at startup
+        insert = import_module(f"sqlalchemy.dialects.{dialect}").insert(table)
+        stmt = insert.on_conflict_do_update(
+            index_elements=list(BUCKET_COLUMNS),
+            set_={
+                "total_cost": table.c.total_cost + insert.excluded.total_cost,
+                "sub_count": table.c.sub_count + insert.excluded.sub_count,
+            },
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Portable fallback: update the bucket, insert it if it wasn't there
+    for row in rows:
+        result = db.execute(
+            update(table)
+            .where(*(table.c[name] == row[name] for name in BUCKET_COLUMNS))
+            .values(total_cost=table.c.total_cost + row["total_cost"], sub_count=table.c.sub_count + row["sub_count"])
+        )
+        if result.rowcount == 0:
+            db.execute(table.insert().values(**row))
+
+
+def rebuild(db: Session, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recomputes every rollup from the subscriptions table (initial backfill or
+    repair). Streams rows in batches, so memory is bounded by the number of
+    buckets rather than subscriptions. Commits.
+    """
+    totals = defaultdict(lambda: [0.0, 0])
+    stmt = select(*SNAPSHOT_COLUMNS[1:]).execution_options(yield_per=batch_size)
+    for partition in db.execute(stmt).partitions():
+        _deltas(partition, 1, totals)
+    db.execute(delete(models.SpendRollup))
+    rows = [dict(zip(BUCKET_COLUMNS, key), total_cost=cost, sub_count=count) for key, (cost, count) in totals.items()]
+    for start in range(0, len(rows), batch_size):
+        db.execute(models.SpendRollup.__table__.insert(), rows[start:start + batch_size])
+    db.commit()
+    return len(rows)
+
+
+# --- READS ---
+def _spend(*columns, owner_id=None, status=SPEND_STATUS):
+    r = models.SpendRollup
+    total, count = func.sum(r.total_cost), func.sum(r.sub_count)
+    stmt = select(*columns, total, count).where(r.status == status).group_by(*columns).having(count > 0)
+    if owner_id is not None:
+        stmt = stmt.where(r.owner_id == owner_id)
+    return stmt, total
+
+
+def spend_by_category(db: Session, owner_id=None):
+    stmt, total = _spend(models.SpendRollup.category, owner_id=owner_id)
+    rows = db.execute(stmt.order_by(total.desc()))
+    return [{"category": c, "total_cost": round(t, 2), "count": n} for c, t, n in rows]
+
+
+def spend_by_user(db: Session):
+    stmt, total = _spend(models.SpendRollup.owner_id, models.User.username)
+    stmt = stmt.join(models.User, models.User.id == models.SpendRollup.owner_id)
+    rows = db.execute(stmt.order_by(total.desc()))
+    return [{"owner_id": o, "username": u, "total_cost": round(t, 2), "count": n} for o, u, t, n in rows]
+
+
+def spend_by_month(db: Session, owner_id=None, start: datetime = None, end: datetime = None):
+    stmt, _ = _spend(models.SpendRollup.period, owner_id=owner_id)
+    if start is not None:
+        stmt = stmt.where(models.SpendRollup.period >= period(start))
+    if end is not None:
+        stmt = stmt.where(models.SpendRollup.period <= period(end))
+    rows = db.execute(stmt.where(models.SpendRollup.period != "").order_by(models.SpendRollup.period))
+    return [{"month": p, "total_cost": round(t, 2), "count": n} for p, t, n in rows]
+
+
+def upcoming_renewals(db: Session, owner_id=None, days=30, limit=100, now: datetime = None):
+    """Active subscriptions renewing in the next `days` days, soonest first (an index range scan)."""
+    s = models.Subscription
+    now = now or datetime.utcnow()
+    stmt = (
+        select(s.id, s.name, s.cost, s.category, s.renewal_date, s.owner_id)
+        .where(s.status == SPEND_STATUS, s.renewal_date >= now, s.renewal_date < now + timedelta(days=days))
+        .order_by(s.renewal_date, s.id)
+        .limit(limit)
+    )
+    if owner_id is not None:
+        stmt = stmt.where(s.owner_id == owner_id)
+    return [row._asdict() for row in db.execute(stmt)]
+
+
+if __name__ == "__main__":
+    # python -m app.analytics rebuild
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m app.analytics rebuild")
+    from .database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(f"[ANALYTICS] Rebuilt {rebuild(session)} spend rollup buckets")
+    finally:
+        session.close()
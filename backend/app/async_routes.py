@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, Query, Response
+from datetime import datetime
+from typing import List, Optional
+
+from . import models, schemas, auth, crud, cache, routing
+
+# asyncio versions of the hot dashboard reads, enabled with DB_ASYNC=1.
+# They mirror the sync endpoints in main.py (same paths, parameters and
+# response models, so the OpenAPI schema is unchanged) but hold no threadpool
+# worker while waiting on Postgres or Redis. Like the sync ones, they read
+# through routing (replicas and read-your-writes pins) on a cache miss.
+
+router = APIRouter()
+
+
+async def cached_page(namespace, scope, params, loader):
+    """asyncio twin of main.cached_page(): on a miss loader(db) reads from a routed session."""
+    async def load():
+        async with routing.async_read_session(namespace, scope) as db:
+            return await loader(db)
+
+    body, headers = await cache.aget_or_load(namespace, scope, params, load)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/requests", response_model=List[schemas.RequestOut])
+async def get_requests(
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user_async)
+):
+    requester_id = None if current_user.role == "admin" else current_user.id
+    projection = crud.parse_fields(fields, schemas.RequestOut)
+    params = dict(
+        status=status, type=type, created_from=created_from, created_to=created_to,
+        sort=sort, cursor=cursor, limit=limit, fields=projection,
+    )
+
+    async def load(db):
+        rows, next_cursor = await crud.alist_requests(db, requester_id=requester_id, **params)
+        return cache.encode_models(rows, schemas.RequestOut, projection), crud.cursor_headers(next_cursor)
+
+    return await cached_page("requests", "all" if requester_id is None else requester_id, params, load)
+
+
+@router.get("/subscriptions", response_model=List[schemas.SubscriptionOut])
+async def get_subs(
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    renewal_from: Optional[datetime] = None,
+    renewal_to: Optional[datetime] = None,
+    min_cost: Optional[float] = None,
+    max_cost: Optional[float] = None,
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user_async)
+):
+    projection = crud.parse_fields(fields, schemas.SubscriptionOut)
+    params = dict(
+        status=status, category=category, renewal_from=renewal_from, renewal_to=renewal_to,
+        min_cost=min_cost, max_cost=max_cost, sort=sort, cursor=cursor, limit=limit, fields=projection,
+    )
+
+    async def load(db):
+        subs, next_cursor = await crud.alist_subscriptions(db, current_user.id, **params)
+        return cache.encode_models(subs, schemas.SubscriptionOut, projection), crud.cursor_headers(next_cursor)
+
+    return await cached_page("subs", current_user.id, params, load)
+
+
+def install(app):
+    """Swaps the sync routes for the async ones registered on `router`."""
+    replaced = {(route.path, method) for route in router.routes for method in route.methods}
+    app.router.routes = [
+        route for route in app.router.routes
+        if not any((getattr(route, "path", None), m) in replaced for m in (getattr(route, "methods", None) or ()))
+    ]
+    app.include_router(router)
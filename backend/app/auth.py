@@ -1,41 +1,234 @@
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from . import database, models
+from . import database, hashing, models
 import os
+import threading
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "prod_secret_88374_xyz_secure")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 
+# EventSource can only authenticate through the URL, which ends up in access logs
+# and browser history, so the stream gets its own token that is good for nothing else
+STREAM_TOKEN_SECONDS = int(os.getenv("STREAM_TOKEN_SECONDS", "60"))
+STREAM_SCOPE = "events"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Principal cache: bounds how long a role change can take to be seen by other workers
+PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))
+
+pwd_context = hashing.pwd_context
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
+# Synchronous versions for scripts; endpoints use the pooled ones below
 def verify_password(plain, hashed): return pwd_context.verify(plain, hashed)
 def get_password_hash(password): return pwd_context.hash(password)
 
+def _busy():
+    return HTTPException(status_code=503, detail="Too many logins in progress. Please retry shortly.",
+                         headers={"Retry-After": str(hashing.RETRY_AFTER_SECONDS)})
+
+async def hash_password(password: str) -> str:
+    try:
+        return await hashing.pool.run(hashing.hash_password, password)
+    except hashing.HashingBusy:
+        raise _busy()
+
+async def check_password(password: str, hashed):
+    """(valid, replacement hash or None) computed in the hashing pool."""
+    try:
+        return await hashing.pool.run(hashing.verify_and_update, password, hashed)
+    except hashing.HashingBusy:
+        raise _busy()
+
+# Short-lived sessions for the async auth endpoints (called through run_in_threadpool)
+def find_credentials(username: str):
+    """(id, username, role, hashed_password) or None."""
+    db = database.SessionLocal()
+    try:
+        return db.execute(select(models.User.id, models.User.username, models.User.role, models.User.hashed_password)
+                          .where(models.User.username == username)).first()
+    finally:
+        db.close()
+
+def create_user(username: str, hashed_password: str, role: str):
+    """Returns a Principal, or None if the username was taken in the meantime."""
+    db = database.SessionLocal()
+    try:
+        user = models.User(username=username, hashed_password=hashed_password, role=role)
+        db.add(user)
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return None
+        return Principal(user.id, user.username, user.role)
+    finally:
+        db.close()
+
+def replace_password_hash(user_id: int, old_hash: str, new_hash: str):
+    # Only if the password was not changed since it was verified
+    db = database.SessionLocal()
+    try:
+        db.execute(update(models.User).where(models.User.id == user_id, models.User.hashed_password == old_hash)
+                   .values(hashed_password=new_hash))
+        db.commit()
+    finally:
+        db.close()
+
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # iat lets the principal cache tell tokens issued before/after a role change apart
+    to_encode.update({"exp": expire, "iat": now})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+def create_stream_token(username: str):
+    """Short-lived token that only GET /events accepts; it is checked when the stream connects."""
+    now = datetime.utcnow()
+    claims = {"sub": username, "scope": STREAM_SCOPE, "iat": now, "exp": now + timedelta(seconds=STREAM_TOKEN_SECONDS)}
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+class Principal:
+    """Detached snapshot of the authenticated user (safe to share across sessions/threads)."""
+    __slots__ = ("id", "username", "role")
+
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+
+class TTLCache:
+    """Small thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate):
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+def invalidate_principal(username: str):
+    """Drops every cached principal for a user, e.g. after their role changed."""
+    principal_cache.discard_where(lambda key: key[0] == username)
+
+
+def decode_token(request: Request, token: str) -> dict:
+    """
+    Decodes a JWT at most once per request. The claims are kept on request.state
+    so the RBAC middleware and the auth dependencies share the same decode.
+    Raises JWTError on an invalid token.
+    """
+    cached = getattr(request.state, "auth_claims", None)
+    if cached is not None and cached[0] == token:
+        return cached[1]
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    request.state.auth_claims = (token, payload)
+    return payload
+
+
+def claims_principal(request: Request, token: str, scope: Optional[str] = None):
+    """Returns (cache_key, cached principal or None) for the bearer token; scoped tokens only pass for their scope."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(request, token)
         username: str = payload.get("sub")
-        if username is None: raise HTTPException(status_code=401, detail="Invalid token")
+        if username is None or payload.get("scope") != scope: raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
-        
-    user = db.query(models.User).filter(models.User.username == username).first()
+    cache_key = (username, payload.get("iat"))
+    return cache_key, principal_cache.get(cache_key)
+
+def _remember(cache_key, user):
     if user is None: raise HTTPException(status_code=401, detail="User not found")
-    return user
+    principal = Principal(user.id, user.username, user.role)
+    principal_cache.set(cache_key, principal)
+    return principal
+
+def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+    cache_key, principal = claims_principal(request, token)
+    if principal is not None:
+        return principal
+    user = db.query(models.User).filter(models.User.username == cache_key[0]).first()
+    return _remember(cache_key, user)
+
+async def get_current_user_async(request: Request, token: str = Depends(oauth2_scheme), db=Depends(database.get_async_db)):
+    """asyncio variant of get_current_user for the DB_ASYNC endpoints."""
+    cache_key, principal = claims_principal(request, token)
+    if principal is not None:
+        return principal
+    result = await db.execute(select(models.User).where(models.User.username == cache_key[0]))
+    return _remember(cache_key, result.scalars().first())
+
+def get_stream_user(request: Request, stream_token: Optional[str] = None, token: Optional[str] = Depends(oauth2_scheme_optional)):
+    """
+    Auth for long-lived streams. Browsers' EventSource can't set headers, so it
+    sends a token from POST /events/token as ?stream_token=; the access token is
+    only accepted in the Authorization header. Uses its own short session: a
+    get_db dependency would hold a pooled connection for the whole life of the stream.
+    """
+    if token:
+        cache_key, principal = claims_principal(request, token)
+    elif stream_token:
+        cache_key, principal = claims_principal(request, stream_token, scope=STREAM_SCOPE)
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if principal is not None:
+        return principal
+    return load_principal(cache_key)
+
+def load_principal(cache_key):
+    """Reads and caches the principal for a claims_principal() miss, in its own short session."""
+    db = database.SessionLocal()
+    try:
+        return _remember(cache_key, db.query(models.User).filter(models.User.username == cache_key[0]).first())
+    finally:
+        db.close()
 
 def get_current_active_admin(current_user: models.User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized. Admin access required.")
-    return current_user
\ No newline at end of file
+    return current_user
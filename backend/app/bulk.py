@@ -0,0 +1,229 @@
+import csv
+import io
+import os
+from datetime import datetime
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import insert, update, delete, select
+from sqlalchemy.orm import Session
+
+from . import analytics, models, schemas
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "100000"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(20 * 1024 * 1024)))
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", "10000"))
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("json", "csv", "ndjson")
+
+
+def detect_format(content_type: str, filename: str = None):
+    """Maps a Content-Type header or upload filename onto one of FORMATS."""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".json"):
+        return "json"
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return "ndjson"
+    if content_type == "application/json":
+        return "json"
+    return None
+
+
+# --- PARSERS ---
+# Each parser yields (row_number, raw_row) where raw_row is a dict, or an Exception
+# describing why that row could not be decoded. Files are read incrementally.
+def iter_csv(binary_file):
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    for number, row in enumerate(csv.DictReader(text), start=1):
+        # Empty cells mean "not provided" so schema defaults apply
+        cleaned = {k.strip(): v for k, v in row.items() if k and v not in (None, "")}
+        attrs = cleaned.get("custom_attributes")
+        if attrs is not None:
+            try:
+                cleaned["custom_attributes"] = orjson.loads(attrs)
+            except orjson.JSONDecodeError:
+                yield number, ValueError("custom_attributes must be a JSON object")
+                continue
+        yield number, cleaned
+    text.detach()
+
+
+def iter_ndjson(binary_file):
+    number = 0
+    for line in binary_file:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield number, ValueError(f"Invalid JSON: {e}")
+
+
+def iter_json(binary_file):
+    # A JSON array has to be decoded as a whole; orjson keeps that cheap
+    try:
+        rows = orjson.loads(binary_file.read())
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of subscriptions")
+    if len(rows) > BULK_MAX_ROWS:
+        raise ImportTooLarge(f"Too many rows; the limit is {BULK_MAX_ROWS} per upload")
+    for number, row in enumerate(rows, start=1):
+        yield number, row
+
+
+PARSERS = {"csv": iter_csv, "ndjson": iter_ndjson, "json": iter_json}
+
+
+class ImportAborted(ValueError):
+    """The upload stopped being readable partway; `result` counts what earlier batches already committed."""
+
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+
+class ImportTooLarge(ValueError):
+    """The upload holds more than BULK_MAX_ROWS rows; raised before any row is inserted."""
+
+
+def check_row_count(binary_file, fmt: str):
+    """
+    Refuses a CSV/NDJSON upload with more than BULK_MAX_ROWS rows by counting its
+    non-blank lines, without decoding them. Each row takes at least one line, so
+    this is an upper bound (a quoted CSV cell spanning lines counts extra).
+    JSON arrays are counted by iter_json right after they are decoded.
+    """
+    if fmt not in ("csv", "ndjson"):
+        return
+    lines = 0
+    for line in binary_file:
+        if line.strip():
+            lines += 1
+    binary_file.seek(0)
+    if fmt == "csv":
+        lines -= 1  # header
+    if lines > BULK_MAX_ROWS:
+        raise ImportTooLarge(f"Too many rows; the limit is {BULK_MAX_ROWS} per upload")
+
+
+def _describe(error):
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+def import_subscriptions(db: Session, owner_id: int, binary_file, fmt: str, batch_size=BULK_BATCH_SIZE):
+    """
+    Validates rows in chunks against SubscriptionCreate and inserts each chunk with
+    a single executemany INSERT in its own transaction. Bad rows are reported and
+    skipped; they never abort the rest of the upload. A file that cannot be read
+    any further (bad encoding, broken JSON array) raises ImportAborted instead,
+    and one with more than BULK_MAX_ROWS rows raises ImportTooLarge up front.
+    """
+    check_row_count(binary_file, fmt)
+    received = inserted = failed = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        if batch:
+            db.execute(insert(models.Subscription), batch)
+            analytics.record(db, added=batch)
+            db.commit()
+            inserted += len(batch)
+            batch.clear()
+
+    try:
+        for number, raw in PARSERS[fmt](binary_file):
+            received += 1
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                if not isinstance(raw, dict):
+                    raise ValueError("Each row must be an object")
+                sub = schemas.SubscriptionCreate.model_validate(raw)
+            except (ValidationError, ValueError) as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": number, "error": _describe(e)})
+                continue
+
+            # executemany needs the same keys on every row, so fill the column defaults here
+            batch.append({
+                "name": sub.name,
+                "cost": sub.cost,
+                "category": sub.category,
+                "renewal_date": sub.renewal_date or datetime.utcnow(),
+                "custom_attributes": sub.custom_attributes or {},
+                "status": "Active",
+                "owner_id": owner_id,
+            })
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+    except ImportTooLarge:
+        raise
+    except ValueError as e:
+        # Rows in earlier batches are committed already
+        raise ImportAborted(str(e), {"received": received, "inserted": inserted, "failed": failed, "errors": errors}) from e
+
+    return {"received": received, "inserted": inserted, "failed": failed, "errors": errors}
+
+
+def _check_ids(ids):
+    if len(ids) > BULK_MAX_IDS:
+        raise ValueError(f"Too many ids; the limit is {BULK_MAX_IDS} per call")
+    return sorted(set(ids))
+
+
+def _owned_rows(db: Session, owner_id: int, ids):
+    # Locked snapshots: the rollup delta is computed from them before the UPDATE/DELETE runs
+    stmt = select(*analytics.SNAPSHOT_COLUMNS).where(
+        models.Subscription.owner_id == owner_id, models.Subscription.id.in_(ids)
+    ).with_for_update()
+    return db.execute(stmt).mappings().all()
+
+
+def update_subscriptions(db: Session, owner_id: int, ids, changes: dict):
+    """Applies the same changes to every listed subscription the user owns, in one UPDATE."""
+    ids = _check_ids(ids)
+    rows = _owned_rows(db, owner_id, ids)
+    found = {row["id"] for row in rows}
+    if found and changes:
+        analytics.record(db, added=[{**row, **changes} for row in rows], removed=rows)
+        db.execute(
+            update(models.Subscription)
+            .where(models.Subscription.owner_id == owner_id, models.Subscription.id.in_(found))
+            .values(**changes)
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return {"matched": len(found), "missing_ids": [i for i in ids if i not in found]}
+
+
+def delete_subscriptions(db: Session, owner_id: int, ids):
+    """Deletes every listed subscription the user owns in one DELETE."""
+    ids = _check_ids(ids)
+    rows = _owned_rows(db, owner_id, ids)
+    found = {row["id"] for row in rows}
+    if found:
+        analytics.record(db, removed=rows)
+        db.execute(
+            delete(models.Subscription)
+            .where(models.Subscription.owner_id == owner_id, models.Subscription.id.in_(found))
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return {"matched": len(found), "missing_ids": [i for i in ids if i not in found]}
@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+import orjson
+import redis
+import redis.asyncio as aioredis
+
+from . import logs, metrics
+
+log = logs.get_logger(__name__)
+
+# Redis read-through cache for the dashboard list endpoints.
+#
+# Keys are namespaced per user and carry a generation number:
+#     cache:{namespace}:{scope}:g{generation}:{params-hash}
+# Invalidation bumps the generation instead of deleting keys, so a request that
+# computed its page before the invalidation can only ever write to the old,
+# now unreachable generation. Old generations simply age out via their TTL.
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+FRESH_TTL = int(os.getenv("CACHE_FRESH_TTL", "60"))     # seconds a page is served as fresh
+STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "240"))    # extra seconds a page may be served stale
+LOCK_TTL_MS = int(os.getenv("CACHE_LOCK_TTL_MS", "5000"))
+LOCK_WAIT_MS = int(os.getenv("CACHE_LOCK_WAIT_MS", "2000"))
+LOCK_POLL_MS = 25
+# Opt-in: encode list pages straight from the selected row tuples, skipping the
+# per-row response-model validation. The routes keep their response_model, so
+# the OpenAPI schema is unchanged either way.
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "0") == "1"
+
+try:
+    client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+    # Used by the asyncio endpoints (DB_ASYNC=1) so cache round trips don't block the loop
+    async_client = aioredis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+except Exception as e:
+    log.warning("Redis connection failed", extra={"error": str(e)})
+    client = None
+    async_client = None
+
+
+# --- LIFECYCLE ---
+# from_url() only builds the pools; the API's lifespan connects at startup so
+# the first cached request doesn't pay for it.
+async def connect():
+    if async_client is None:
+        return
+    try:
+        await async_client.ping()
+        await asyncio.to_thread(client.ping)
+    except redis.RedisError as e:
+        log.warning("Redis unavailable at startup; the cache fails open", extra={"error": str(e)})
+
+
+async def close():
+    if async_client is None:
+        return
+    client.close()
+    await async_client.aclose()
+
+
+# --- STATS ---
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _record(namespace, counter, seconds=None):
+    metrics.record_cache(namespace, counter, seconds)
+    with _stats_lock:
+        entry = _stats.setdefault(namespace, {
+            "hits": 0, "stale_hits": 0, "misses": 0, "lock_waits": 0,
+            "errors": 0, "load_seconds": 0.0, "lookup_seconds": 0.0,
+        })
+        entry[counter] += 1
+        if seconds is not None:
+            key = "load_seconds" if counter == "misses" else "lookup_seconds"
+            entry[key] += seconds
+
+
+def stats():
+    """Snapshot of hit/miss/latency counters per namespace."""
+    with _stats_lock:
+        return {ns: dict(values) for ns, values in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+# --- ENCODING ---
+def dumps(value) -> bytes:
+    return orjson.dumps(value)
+
+
+def encode_rows(rows, names) -> bytes:
+    """Encodes row tuples as JSON objects keyed by `names`, which name the leading columns."""
+    # zip() stops at the last name, so trailing sort-key columns are dropped
+    return orjson.dumps([dict(zip(names, row)) for row in rows])
+
+
+def encode_models(rows, schema, fields=None) -> bytes:
+    """Serializes column-projected listing rows (see crud._projection) to JSON bytes."""
+    if fields:
+        # A fields= projection has never gone through the schema: the columns are the response
+        return encode_rows(rows, fields)
+    if FAST_SERIALIZATION:
+        return encode_rows(rows, list(schema.model_fields))
+    return orjson.dumps([schema.model_validate(row).model_dump() for row in rows])
+
+
+def _pack(body: bytes, headers: dict, fresh_until: float) -> bytes:
+    # Metadata line, then the response body verbatim (orjson never emits newlines)
+    return orjson.dumps({"f": fresh_until, "h": headers}) + b"\n" + body
+
+
+def _unpack(raw: bytes):
+    meta, _, body = raw.partition(b"\n")
+    meta = orjson.loads(meta)
+    return body, meta["h"], meta["f"]
+
+
+# --- KEYS ---
+def _generation_key(namespace, scope):
+    return f"cache:gen:{namespace}:{scope}"
+
+
+def _value_key(namespace, scope, generation, params):
+    digest = hashlib.sha1(orjson.dumps(params, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+    return f"cache:{namespace}:{scope}:g{generation}:{digest}"
+
+
+def invalidate(namespace, scope):
+    """Moves the scope to a new generation; entries written for older generations are never read again."""
+    if client is None:
+        return
+    try:
+        client.incr(_generation_key(namespace, scope))
+    except redis.RedisError as e:
+        _record(namespace, "errors")
+        log.warning("Cache invalidation failed", extra={"namespace": namespace, "scope": scope, "error": str(e)})
+
+
+# --- READ-THROUGH ---
+def get_or_load(namespace, scope, params, loader, fresh_ttl=FRESH_TTL, stale_ttl=STALE_TTL):
+    """
+    Returns (body_bytes, headers) for the page described by `params`.
+
+    loader() must return (body_bytes, headers). On a miss only the caller that
+    wins the Redis lock runs it; concurrent callers either get the stale copy
+    (stale-while-revalidate) or briefly wait for the winner to publish.
+    Redis failures degrade to calling the loader directly.
+    """
+    if client is None:
+        return loader()
+
+    start = time.perf_counter()
+    try:
+        generation = int(client.get(_generation_key(namespace, scope)) or 0)
+        key = _value_key(namespace, scope, generation, params)
+        raw = client.get(key)
+    except redis.RedisError:
+        _record(namespace, "errors")
+        return loader()
+
+    stale = None
+    if raw is not None:
+        body, headers, fresh_until = _unpack(raw)
+        if fresh_until > time.time():
+            _record(namespace, "hits", time.perf_counter() - start)
+            return body, headers
+        stale = (body, headers)
+
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    try:
+        acquired = client.set(lock_key, token, nx=True, px=LOCK_TTL_MS)
+    except redis.RedisError:
+        _record(namespace, "errors")
+        return stale or loader()
+
+    if not acquired:
+        if stale is not None:
+            # Someone else is already revalidating; serve what we have
+            _record(namespace, "stale_hits", time.perf_counter() - start)
+            return stale
+        waited = _wait_for(key, namespace)
+        if waited is not None:
+            return waited
+        # The winner is slow or died; fall through and compute ourselves
+
+    try:
+        load_start = time.perf_counter()
+        body, headers = loader()
+        _record(namespace, "misses", time.perf_counter() - load_start)
+        try:
+            client.set(key, _pack(body, headers, time.time() + fresh_ttl), ex=fresh_ttl + stale_ttl)
+        except redis.RedisError:
+            _record(namespace, "errors")
+        return body, headers
+    finally:
+        if acquired:
+            _release(lock_key, token)
+
+
+def _wait_for(key, namespace):
+    _record(namespace, "lock_waits")
+    deadline = time.monotonic() + LOCK_WAIT_MS / 1000
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_MS / 1000)
+        try:
+            raw = client.get(key)
+        except redis.RedisError:
+            return None
+        if raw is not None:
+            body, headers, _ = _unpack(raw)
+            _record(namespace, "hits")
+            return body, headers
+    return None
+
+
+def _release(lock_key, token):
+    try:
+        # Only drop the lock if it is still ours (it may have expired and been re-taken)
+        if client.get(lock_key) == token.encode():
+            client.delete(lock_key)
+    except redis.RedisError:
+        pass
+
+
+# --- ASYNC READ-THROUGH ---
+async def aget_or_load(namespace, scope, params, loader, fresh_ttl=FRESH_TTL, stale_ttl=STALE_TTL):
+    """asyncio twin of get_or_load(); loader is a coroutine function."""
+    if async_client is None:
+        return await loader()
+
+    start = time.perf_counter()
+    try:
+        generation = int(await async_client.get(_generation_key(namespace, scope)) or 0)
+        key = _value_key(namespace, scope, generation, params)
+        raw = await async_client.get(key)
+    except redis.RedisError:
+        _record(namespace, "errors")
+        return await loader()
+
+    stale = None
+    if raw is not None:
+        body, headers, fresh_until = _unpack(raw)
+        if fresh_until > time.time():
+            _record(namespace, "hits", time.perf_counter() - start)
+            return body, headers
+        stale = (body, headers)
+
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    try:
+        acquired = await async_client.set(lock_key, token, nx=True, px=LOCK_TTL_MS)
+    except redis.RedisError:
+        _record(namespace, "errors")
+        return stale or await loader()
+
+    if not acquired:
+        if stale is not None:
+            _record(namespace, "stale_hits", time.perf_counter() - start)
+            return stale
+        _record(namespace, "lock_waits")
+        deadline = time.monotonic() + LOCK_WAIT_MS / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_MS / 1000)
+            try:
+                raw = await async_client.get(key)
+            except redis.RedisError:
+                break
+            if raw is not None:
+                body, headers, _ = _unpack(raw)
+                _record(namespace, "hits")
+                return body, headers
+
+    try:
+        load_start = time.perf_counter()
+        body, headers = await loader()
+        _record(namespace, "misses", time.perf_counter() - load_start)
+        try:
+            await async_client.set(key, _pack(body, headers, time.time() + fresh_ttl), ex=fresh_ttl + stale_ttl)
+        except redis.RedisError:
+            _record(namespace, "errors")
+        return body, headers
+    finally:
+        if acquired:
+            try:
+                if await async_client.get(lock_key) == token.encode():
+                    await async_client.delete(lock_key)
+            except redis.RedisError:
+                pass
@@ -0,0 +1,167 @@
+import re
+import threading
+from sqlalchemy import select, update
+
+from . import logs, models
+
+log = logs.get_logger(__name__)
+
+# Built-in catalog used until an admin adds vendors through /vendors
+DEFAULT_VENDORS = [
+    {"name": "Zoom", "category": "Communication", "aliases": []},
+    {"name": "Slack", "category": "Communication", "aliases": []},
+    {"name": "Salesforce", "category": "CRM", "aliases": []},
+    {"name": "GitHub", "category": "DevTools", "aliases": []},
+    {"name": "Adobe", "category": "Design", "aliases": []},
+    {"name": "AWS", "category": "Cloud", "aliases": ["Amazon Web Services"]},
+    {"name": "DigitalOcean", "category": "Cloud", "aliases": []},
+    {"name": "Figma", "category": "Design", "aliases": []},
+    {"name": "Notion", "category": "Productivity", "aliases": []},
+]
+
+
+def normalize(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+def trie_pattern(terms):
+    """
+    Compiles literal terms into a regex shaped like a trie, e.g. ["aws", "adobe",
+    "adobe sign"] -> a(?:dobe(?:\\s+sign)?|ws). At every position the engine
+    follows at most one branch per character, so the scan stays linear in the
+    text length however many vendors there are. Spaces match any whitespace run
+    because PDF extraction often splits names across lines.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = None
+
+    def render(node):
+        branches = []
+        for ch in sorted(k for k in node if k):
+            piece = r"\s+" if ch == " " else re.escape(ch)
+            branches.append(piece + render(node[ch]))
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return render(trie)
+
+
+class VendorMatcher:
+    """Immutable compiled form of the catalog; scan() is safe to share across threads."""
+
+    # Regex to find currency (e.g., $14.99, $ 20.00)
+    PRICE = re.compile(r'\$\s?(\d+\.\d{2})')
+
+    def __init__(self, vendors):
+        self.lookup = {}      # normalized name/alias -> (canonical name, category)
+        self.price_hints = {}  # canonical name -> compiled vendor-specific price regex
+        for vendor in vendors:
+            entry = (vendor["name"], vendor.get("category"))
+            for term in [vendor["name"], *(vendor.get("aliases") or [])]:
+                if normalize(term):
+                    self.lookup[normalize(term)] = entry
+            if vendor.get("price_pattern"):
+                self.price_hints[vendor["name"]] = re.compile(vendor["price_pattern"], re.IGNORECASE)
+        self.pattern = re.compile(r"\b(?:" + trie_pattern(self.lookup) + r")\b") if self.lookup else None
+
+    def scan(self, pages, on_page=None):
+        """
+        Consumes an iterable of page texts. Returns ({name: category} in first-seen
+        order, {name: hinted price}, max price in the document, chars scanned).
+        on_page(pages_done, vendors_found), if given, is called after every page.
+        """
+        found = {}
+        hinted = {}
+        max_price = None
+        chars = 0
+        for page_no, text in enumerate(pages, 1):
+            chars += len(text)
+            page_vendors = set()
+            if self.pattern is not None:
+                for term in self.pattern.findall(text.lower()):
+                    name, category = self.lookup[normalize(term)]
+                    found.setdefault(name, category)
+                    page_vendors.add(name)
+            # Vendor price hints only run on pages that mention the vendor
+            for name in page_vendors & self.price_hints.keys():
+                values = [float(v) for v in self.price_hints[name].findall(text) if v]
+                if values:
+                    hinted[name] = max(hinted.get(name, 0.0), *values)
+            prices = self.PRICE.findall(text)
+            if prices:
+                page_max = max(map(float, prices))
+                max_price = page_max if max_price is None else max(max_price, page_max)
+            if on_page is not None:
+                on_page(page_no, len(found))
+        return found, hinted, max_price, chars
+
+
+class CatalogState:
+    def __init__(self, version, matcher):
+        self.version = version
+        self.matcher = matcher
+
+
+_state = CatalogState(0, VendorMatcher(DEFAULT_VENDORS))
+_reload_lock = threading.Lock()
+
+
+def vendor_dicts(rows):
+    return [{"name": v.name, "category": v.category, "aliases": v.aliases or [], "price_pattern": v.price_pattern}
+            for v in rows]
+
+
+def current_matcher(db):
+    """
+    Returns the compiled matcher, recompiling only when the stored catalog version
+    moved. Costs one small SELECT per call; the swap of the module-level state is
+    a single reference assignment, so in-flight scans keep their old matcher.
+    """
+    global _state
+    version = db.execute(select(models.VendorCatalog.version).where(models.VendorCatalog.id == 1)).scalar() or 0
+    if version == _state.version:
+        return _state.matcher
+    with _reload_lock:
+        if version != _state.version:
+            rows = db.execute(select(models.Vendor)).scalars().all()
+            vendors = vendor_dicts(rows) or DEFAULT_VENDORS
+            _state = CatalogState(version, VendorMatcher(vendors))
+            log.info("Compiled vendor catalog", extra={"vendors": len(vendors), "catalog_version": version})
+    return _state.matcher
+
+
+def seed_defaults(db):
+    """
+    Copies the built-in vendors into an empty table, which is what matching uses
+    then, so GET /vendors lists them. migrate.py runs it on every deploy; the
+    first admin edit runs it again in case the table was emptied since.
+    Returns how many vendors were added.
+    """
+    if db.execute(select(models.Vendor.id).limit(1)).first() is not None:
+        return 0
+    db.add_all([models.Vendor(**v) for v in DEFAULT_VENDORS])
+    db.flush()
+    return len(DEFAULT_VENDORS)
+
+
+def validate_price_pattern(pattern):
+    if not pattern:
+        return None
+    compiled = re.compile(pattern)  # raises re.error
+    if compiled.groups != 1:
+        raise re.error("price_pattern must contain exactly one capture group")
+    return pattern
+
+
+def bump_version(db):
+    """Marks the catalog as changed; workers recompile on their next scan. Caller commits."""
+    result = db.execute(update(models.VendorCatalog).where(models.VendorCatalog.id == 1)
+                        .values(version=models.VendorCatalog.version + 1))
+    if result.rowcount == 0:
+        db.add(models.VendorCatalog(id=1, version=1))
@@ -0,0 +1,180 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Sort key -> columns used for keyset ordering. Every key ends in the primary key
+# so the ordering is total and a cursor always points at exactly one row.
+SUBSCRIPTION_SORTS = {
+    "id": (models.Subscription.id,),
+    "renewal_date": (models.Subscription.renewal_date, models.Subscription.id),
+}
+REQUEST_SORTS = {
+    "id": (models.Request.id,),
+    "created_at": (models.Request.created_at, models.Request.id),
+}
+
+
+# --- CURSORS ---
+def encode_cursor(values) -> str:
+    raw = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(raw, list) or len(raw) != len(columns):
+            raise ValueError("cursor shape")
+        values = []
+        for col, value in zip(columns, raw):
+            if col.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            values.append(value)
+        return values
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def cursor_for(item, sort: str, sorts: dict):
+    """Builds the cursor pointing after `item` (a row or a cached dict)."""
+    columns = sorts[sort.lstrip("-")]
+    if isinstance(item, dict):
+        return encode_cursor([item[col.key] for col in columns])
+    return encode_cursor([getattr(item, col.key) for col in columns])
+
+
+def cursor_headers(next_cursor):
+    return {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+
+# --- QUERY HELPERS ---
+def parse_sort(sort: str, sorts: dict):
+    descending = sort.startswith("-")
+    key = sort.lstrip("-")
+    if key not in sorts:
+        allowed = ", ".join(sorted(sorts) + [f"-{k}" for k in sorted(sorts)])
+        raise HTTPException(status_code=400, detail=f"Invalid sort. Use one of: {allowed}")
+    return sorts[key], descending
+
+
+def parse_fields(fields, schema):
+    """Validates a `fields=` projection against the response schema."""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def _paginate(stmt, columns, descending, cursor, limit):
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        key = columns[0] if len(columns) == 1 else tuple_(*columns)
+        bound = values[0] if len(values) == 1 else tuple_(*values)
+        stmt = stmt.where(key < bound if descending else key > bound)
+    order = [c.desc() if descending else c.asc() for c in columns]
+    # Fetch one extra row to learn whether another page exists without a COUNT(*)
+    return stmt.order_by(*order).limit(limit + 1)
+
+
+def _projection(model, schema, columns, fields):
+    """
+    The columns a listing selects: the response schema's fields (or the
+    `fields=` subset), then any sort columns the next cursor needs.
+    cache.encode_rows relies on the fields coming first.
+    Listings select plain row tuples, so there is no ORM identity map and
+    nothing that could lazy-load while the page is serialized.
+    """
+    names = list(fields or schema.model_fields)
+    names += [col.key for col in columns if col.key not in names]
+    return [getattr(model, name) for name in names]
+
+
+def _finish_page(rows, limit, sort, sorts):
+    rows = list(rows)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (cursor_for(rows[-1], sort, sorts) if has_more else None)
+
+
+# --- LISTINGS ---
+# Each listing is built as a plain select() so the sync and asyncio sessions share it.
+def subscriptions_page_stmt(
+    owner_id: int,
+    status=None, category=None,
+    renewal_from=None, renewal_to=None,
+    min_cost=None, max_cost=None,
+    sort="id", cursor=None, limit=DEFAULT_PAGE_SIZE, fields=None,
+):
+    columns, descending = parse_sort(sort, SUBSCRIPTION_SORTS)
+    stmt = select(*_projection(models.Subscription, schemas.SubscriptionOut, columns, fields))
+    stmt = stmt.where(models.Subscription.owner_id == owner_id)
+    if status:
+        stmt = stmt.where(models.Subscription.status == status)
+    if category:
+        stmt = stmt.where(models.Subscription.category == category)
+    if renewal_from:
+        stmt = stmt.where(models.Subscription.renewal_date >= renewal_from)
+    if renewal_to:
+        stmt = stmt.where(models.Subscription.renewal_date <= renewal_to)
+    if min_cost is not None:
+        stmt = stmt.where(models.Subscription.cost >= min_cost)
+    if max_cost is not None:
+        stmt = stmt.where(models.Subscription.cost <= max_cost)
+
+    return _paginate(stmt, columns, descending, cursor, limit)
+
+
+def requests_page_stmt(
+    requester_id=None,
+    status=None, type=None,
+    created_from=None, created_to=None,
+    sort="id", cursor=None, limit=DEFAULT_PAGE_SIZE, fields=None,
+):
+    columns, descending = parse_sort(sort, REQUEST_SORTS)
+    stmt = select(*_projection(models.Request, schemas.RequestOut, columns, fields))
+    if requester_id is not None:
+        stmt = stmt.where(models.Request.requester_id == requester_id)
+    if status:
+        stmt = stmt.where(models.Request.status == status)
+    if type:
+        stmt = stmt.where(models.Request.type == type)
+    if created_from:
+        stmt = stmt.where(models.Request.created_at >= created_from)
+    if created_to:
+        stmt = stmt.where(models.Request.created_at <= created_to)
+
+    return _paginate(stmt, columns, descending, cursor, limit)
+
+
+def list_subscriptions(db: Session, owner_id: int, sort="id", limit=DEFAULT_PAGE_SIZE, **filters):
+    """Returns (rows, next_cursor) for one keyset page of a user's subscriptions."""
+    stmt = subscriptions_page_stmt(owner_id, sort=sort, limit=limit, **filters)
+    return _finish_page(db.execute(stmt), limit, sort, SUBSCRIPTION_SORTS)
+
+
+def list_requests(db: Session, requester_id=None, sort="id", limit=DEFAULT_PAGE_SIZE, **filters):
+    """Returns (rows, next_cursor). requester_id=None lists every request (admin view)."""
+    stmt = requests_page_stmt(requester_id, sort=sort, limit=limit, **filters)
+    return _finish_page(db.execute(stmt), limit, sort, REQUEST_SORTS)
+
+
+async def alist_subscriptions(db, owner_id: int, sort="id", limit=DEFAULT_PAGE_SIZE, **filters):
+    stmt = subscriptions_page_stmt(owner_id, sort=sort, limit=limit, **filters)
+    return _finish_page(await db.execute(stmt), limit, sort, SUBSCRIPTION_SORTS)
+
+
+async def alist_requests(db, requester_id=None, sort="id", limit=DEFAULT_PAGE_SIZE, **filters):
+    stmt = requests_page_stmt(requester_id, sort=sort, limit=limit, **filters)
+    return _finish_page(await db.execute(stmt), limit, sort, REQUEST_SORTS)
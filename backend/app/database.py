@@ -1,13 +1,106 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+import itertools
 import os
+import threading
+import time
+
+from . import logs
+
+log = logs.get_logger(__name__)
 
 # Use Environment Variable for Production (Render)
 # Fallback to local Docker DB for development
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:dummy_local_password@db/licensewatch")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Pool tuning (ignored for SQLite, which manages its own connections)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+
+# Opt-in asyncio mode: hot read endpoints run on the event loop instead of the threadpool
+ASYNC_ENABLED = os.getenv("DB_ASYNC", "0") == "1"
+
+# Read replicas (comma-separated URLs); see READ REPLICAS below and routing.py
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))              # seconds behind before reads fall back
+REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))  # seconds between health checks
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", "2"))
+
+
+class _PoolMetrics:
+    """Checkout counters shared by the sync and async pools."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+
+pool_metrics = {"sync": _PoolMetrics(), "async": _PoolMetrics()}
+
+
+def _timed(pool_class, metrics):
+    class TimedPool(pool_class):
+        # _do_get is where QueuePool blocks when every connection is checked out
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except Exception:
+                metrics.record(0, timed_out=True)
+                raise
+            metrics.record(time.perf_counter() - start)
+            return conn
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+def _engine_options(url, pool_class, metrics):
+    options = {"query_cache_size": STATEMENT_CACHE_SIZE}
+    if url.startswith("sqlite"):
+        return options
+    options.update(
+        poolclass=_timed(pool_class, metrics),
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=POOL_PRE_PING,
+    )
+    return options
+
+
+def async_url(url):
+    """Maps the sync DATABASE_URL onto its asyncio driver (asyncpg / aiosqlite)."""
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    for sync_prefix, async_prefix in (("postgresql+psycopg2://", "postgresql+asyncpg://"),
+                                      ("postgresql://", "postgresql+asyncpg://"),
+                                      ("sqlite://", "sqlite+aiosqlite://")):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_options(SQLALCHEMY_DATABASE_URL, QueuePool, pool_metrics["sync"]))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -17,3 +110,177 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# --- ASYNC ---
+async_engine = None
+AsyncSessionLocal = None
+
+def _create_async(url, metrics, connect_args=None):
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    url = async_url(url)
+    options = _engine_options(url, AsyncAdaptedQueuePool, metrics)
+    if url.startswith("postgresql+asyncpg"):
+        options["connect_args"] = {"prepared_statement_cache_size": STATEMENT_CACHE_SIZE, **(connect_args or {})}
+    engine = create_async_engine(url, **options)
+    return engine, async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+def init_async_engine(url=None):
+    """Creates the asyncio engine on demand so asyncpg/aiosqlite stay optional."""
+    global async_engine, AsyncSessionLocal
+    async_engine, AsyncSessionLocal = _create_async(url or SQLALCHEMY_DATABASE_URL, pool_metrics["async"])
+    return async_engine
+
+if ASYNC_ENABLED:
+    init_async_engine()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# --- READ REPLICAS ---
+# Each replica gets its own engine and pool. Health and lag are re-checked at
+# most every REPLICA_CHECK_INTERVAL seconds, by whichever request first finds
+# the last check too old; a replica that is down or more than REPLICA_MAX_LAG
+# seconds behind gets no reads until a later check passes. With DB_ASYNC=1 a
+# replica also gets an asyncio engine for the async list routes; the health
+# check always runs on the sync one.
+
+# 0 on a standby that has replayed all the WAL it received (an idle primary
+# writes nothing, so replay timestamps alone would look like growing lag)
+_LAG_QUERIES = {
+    "postgresql": "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+                  "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END",
+}
+
+
+def replication_lag(conn) -> float:
+    """Seconds the replica is behind its primary. Dialects without replication (SQLite stand-ins) report 0."""
+    query = _LAG_QUERIES.get(conn.dialect.name)
+    if query is None:
+        conn.exec_driver_sql("SELECT 1")
+        return 0.0
+    return float(conn.exec_driver_sql(query).scalar() or 0)
+
+
+class Replica:
+    def __init__(self, name, url):
+        self.name = name
+        pool_metrics[name] = _PoolMetrics()
+        options = _engine_options(url, QueuePool, pool_metrics[name])
+        if url.startswith("postgres"):
+            # A blackholed replica must not hang the request that runs its health check
+            options["connect_args"] = {"connect_timeout": REPLICA_CONNECT_TIMEOUT}
+        self.engine = create_engine(url, **options)
+        self.Session = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.url = url
+        self.async_engine = None
+        self.AsyncSession = None
+        if ASYNC_ENABLED:
+            self.async_session()
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+        self._check_lock = threading.Lock()
+
+    def async_session(self):
+        """The replica's asyncio sessionmaker, created on first use outside DB_ASYNC=1."""
+        if self.AsyncSession is None:
+            pool_metrics[f"{self.name}_async"] = _PoolMetrics()
+            self.async_engine, self.AsyncSession = _create_async(
+                self.url, pool_metrics[f"{self.name}_async"], {"timeout": REPLICA_CONNECT_TIMEOUT})
+        return self.AsyncSession
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                lag = replication_lag(conn)
+        except DBAPIError as e:
+            if self.healthy or self.checked_at is None:
+                log.warning("Read replica unavailable", extra={"replica": self.name, "error": str(e).splitlines()[0]})
+            self.healthy, self.lag = False, None
+        else:
+            if lag > REPLICA_MAX_LAG and (self.lag is None or self.lag <= REPLICA_MAX_LAG):
+                log.warning("Read replica lagging", extra={"replica": self.name, "lag_seconds": round(lag, 3)})
+            self.healthy, self.lag = True, lag
+        self.checked_at = time.monotonic()
+
+    def usable(self) -> bool:
+        """Re-checks when the last result is stale; concurrent callers use the previous result meanwhile."""
+        if self.checked_at is None or time.monotonic() - self.checked_at >= REPLICA_CHECK_INTERVAL:
+            if self._check_lock.acquire(blocking=False):
+                try:
+                    self.check()
+                finally:
+                    self._check_lock.release()
+        return self.healthy and self.lag <= REPLICA_MAX_LAG
+
+
+replicas = [Replica(f"replica{i}", url) for i, url in enumerate(REPLICA_URLS)]
+_rotation = itertools.count()
+
+
+def pick_replica():
+    """Round-robins over the replicas that are up and caught up; None means read from the primary."""
+    usable = [replica for replica in replicas if replica.usable()]
+    if not usable:
+        return None
+    return usable[next(_rotation) % len(usable)]
+
+
+# --- LIFECYCLE ---
+# Creating the engines above does no I/O. The API's lifespan opens the first
+# connections at startup so the first request doesn't pay for the handshake, and
+# closes them on shutdown.
+async def warm_up():
+    """A database that isn't reachable yet only logs: pools connect again on demand."""
+    try:
+        with engine.connect():
+            pass
+        if async_engine is not None:
+            async with async_engine.connect():
+                pass
+    except DBAPIError as e:
+        log.warning("Database unavailable at startup", extra={"error": str(e).splitlines()[0]})
+    for replica in replicas:
+        replica.check()
+
+
+async def dispose():
+    engine.dispose()
+    for replica in replicas:
+        replica.engine.dispose()
+        if replica.async_engine is not None:
+            await replica.async_engine.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
+def pool_stats():
+    """Occupancy and checkout wait time for each configured engine."""
+    stats = {}
+    engines = [("sync", engine), ("async", async_engine and async_engine.sync_engine)]
+    for replica in replicas:
+        engines += [(replica.name, replica.engine),
+                    (f"{replica.name}_async", replica.async_engine and replica.async_engine.sync_engine)]
+    for name, eng in engines:
+        if eng is None:
+            continue
+        pool = eng.pool
+        metrics = pool_metrics[name]
+        entry = {
+            "pool": type(pool).__name__,
+            "checkouts": metrics.checkouts,
+            "wait_seconds_total": round(metrics.wait_seconds, 6),
+            "wait_seconds_max": round(metrics.max_wait_seconds, 6),
+            "timeouts": metrics.timeouts,
+        }
+        if isinstance(pool, QueuePool):
+            entry.update(size=pool.size(), checked_out=pool.checkedout(),
+                         checked_in=pool.checkedin(), overflow=pool.overflow())
+        stats[name] = entry
+    for replica in replicas:
+        stats[replica.name].update(healthy=replica.healthy, lag_seconds=replica.lag)
+    return stats
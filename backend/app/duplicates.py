@@ -0,0 +1,344 @@
+import os
+import re
+import sys
+from collections import defaultdict
+from datetime import datetime
+from difflib import SequenceMatcher
+from importlib import import_module
+from sqlalchemy import bindparam, delete, exists, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import catalog, logs, models
+
+log = logs.get_logger(__name__)
+
+# Cross-user duplicate and shadow-IT detection (run nightly by Celery beat, see worker.py).
+#
+# Every subscription resolves to a vendor: its name is reduced to a key (lowercase
+# words minus plan and company suffixes, so "Slack Pro" and "slack" agree), keys
+# that a catalog vendor owns map to it, and a key the scan has not seen before is
+# compared only with the vendors sharing one of its blocking keys (first or last
+# three letters) to catch misspellings. Everything else is dict lookups, so a
+# scan costs time linear in the number of changed rows, not all pairs of names.
+#
+# subscription_vendors keeps what the previous scan saw of each subscription;
+# only rows that differ from it are resolved again, and only the vendors they
+# leave or join are re-aggregated into vendor_groups. Each batch commits on its
+# own and dirty flags live in the database, so a run that dies halfway resumes
+# where it stopped.
+
+DUPLICATE_BATCH_SIZE = int(os.getenv("DUPLICATE_BATCH_SIZE", "5000"))
+# Expected discount for moving separate accounts onto one org-wide plan
+CONSOLIDATION_DISCOUNT = float(os.getenv("CONSOLIDATION_DISCOUNT", "0.2"))
+FUZZY_MIN_LENGTH = 5    # shorter keys only match exactly ("zoom" is not "zoho")
+FUZZY_RATIO = 0.85      # difflib ratio for two keys to count as one vendor
+MAX_BLOCK_COMPARISONS = 200
+GROUP_BATCH_SIZE = 500
+
+STOP_WORDS = {
+    "inc", "llc", "ltd", "corp", "corporation", "co", "gmbh", "technologies", "software", "com", "io",
+    "pro", "plus", "premium", "business", "enterprise", "team", "standard", "basic", "starter",
+    "professional", "annual", "monthly", "yearly", "license", "licenses", "seat", "seats",
+    "subscription", "plan", "edition",
+}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def vendor_key(name: str) -> str:
+    """"Slack Technologies, Inc. (Pro plan)" -> "slack". Names made only of stop words keep them."""
+    tokens = _TOKEN.findall((name or "").lower())
+    return " ".join([t for t in tokens if t not in STOP_WORDS] or tokens)
+
+
+def block_keys(key: str):
+    compact = key.replace(" ", "")
+    return {compact[:3], compact[-3:]}
+
+
+class VendorResolver:
+    """
+    Maps subscription names to vendor keys. Starts from the aliases stored by
+    earlier scans; new aliases are collected in `added` for the caller to save.
+    """
+
+    def __init__(self, matcher, aliases):
+        self.aliases = dict(aliases)   # key -> vendor
+        self.catalog = {}              # vendor -> (canonical name, category)
+        self.added = {}                # key -> (vendor, spelling), new this run
+        self.blocks = defaultdict(list)
+        self.comparisons = 0
+        self._names = {}
+        for term, (name, category) in matcher.lookup.items():
+            vendor = vendor_key(name)
+            self.catalog.setdefault(vendor, (name, category))
+            self.aliases.setdefault(vendor_key(term), vendor)
+        for vendor in set(self.aliases.values()):
+            self._index(vendor)
+
+    def _index(self, vendor):
+        for block in block_keys(vendor):
+            self.blocks[block].append(vendor)
+
+    def _closest(self, key):
+        best, best_ratio = None, FUZZY_RATIO
+        for block in block_keys(key):
+            for vendor in self.blocks.get(block, ())[:MAX_BLOCK_COMPARISONS]:
+                if abs(len(vendor) - len(key)) > 2:
+                    continue
+                self.comparisons += 1
+                matcher = SequenceMatcher(None, key, vendor)
+                if matcher.quick_ratio() < best_ratio:
+                    continue
+                ratio = matcher.ratio()
+                if ratio >= best_ratio:
+                    best, best_ratio = vendor, ratio
+        return best
+
+    def resolve(self, name: str) -> str:
+        vendor = self._names.get(name)
+        if vendor is not None:
+            return vendor
+        key = vendor_key(name)
+        vendor = self.aliases.get(key)
+        if vendor is None:
+            first = key.split(" ", 1)[0]
+            if first in self.catalog:
+                vendor = first  # "adobe sign" is bought from Adobe
+            elif len(key) >= FUZZY_MIN_LENGTH:
+                vendor = self._closest(key)
+            if vendor is None:
+                vendor = key
+                self._index(vendor)
+            self.aliases[key] = vendor
+            self.added[key] = (vendor, name)
+        self._names[name] = vendor
+        return vendor
+
+    def display(self, vendor):
+        """(name, category, in_catalog) for a vendor group."""
+        if vendor in self.catalog:
+            name, category = self.catalog[vendor]
+            return name, category, True
+        return None, None, False
+
+
+# --- STORAGE ---
+def _dialect_insert(db: Session, table):
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        return import_module(f"sqlalchemy.dialects.{dialect}").insert(table)
+    return None
+
+
+def _save_snapshots(db: Session, rows):
+    table = models.SubscriptionVendor.__table__
+    insert = _dialect_insert(db, table)
+    if insert is None:
+        db.execute(delete(table).where(table.c.subscription_id.in_([r["subscription_id"] for r in rows])))
+        db.execute(table.insert(), rows)
+        return
+    db.execute(insert.on_conflict_do_update(
+        index_elements=["subscription_id"],
+        set_={c: insert.excluded[c] for c in ("owner_id", "name", "cost", "status", "vendor")},
+    ), rows)
+
+
+def _save_aliases(db: Session, added):
+    if not added:
+        return
+    table = models.VendorAlias.__table__
+    rows = [{"key": key, "vendor": vendor, "name": name} for key, (vendor, name) in added.items()]
+    insert = _dialect_insert(db, table)
+    if insert is None:
+        db.execute(delete(table).where(table.c.key.in_(list(added))))
+        db.execute(table.insert(), rows)
+    else:
+        db.execute(insert.on_conflict_do_nothing(index_elements=["key"]), rows)
+    added.clear()
+
+
+def _mark_dirty(db: Session, vendors):
+    vendors = sorted(v for v in vendors if v is not None)
+    if not vendors:
+        return
+    table = models.VendorGroup.__table__
+    insert = _dialect_insert(db, table)
+    if insert is None:
+        db.execute(update(table).where(table.c.vendor.in_(vendors)).values(dirty=True))
+        known = set(db.execute(select(table.c.vendor).where(table.c.vendor.in_(vendors))).scalars())
+        if len(known) < len(vendors):
+            db.execute(table.insert(), [{"vendor": v, "dirty": True} for v in vendors if v not in known])
+        return
+    db.execute(insert.on_conflict_do_update(index_elements=["vendor"], set_={"dirty": True}),
+               [{"vendor": v, "dirty": True} for v in vendors])
+
+
+# --- SCAN ---
+def _changed_rows(db: Session, after_id, batch_size):
+    """Subscriptions (keyset on id) that are new or differ from their snapshot, with the vendor they had."""
+    s, sv = models.Subscription, models.SubscriptionVendor
+    return db.execute(
+        select(s.id, s.owner_id, s.name, s.cost, s.status, sv.vendor.label("old_vendor"))
+        .outerjoin(sv, sv.subscription_id == s.id)
+        .where(s.id > after_id, or_(
+            sv.subscription_id.is_(None),
+            s.name.is_distinct_from(sv.name),
+            s.cost.is_distinct_from(sv.cost),
+            s.status.is_distinct_from(sv.status),
+            s.owner_id.is_distinct_from(sv.owner_id),
+        ))
+        .order_by(s.id)
+        .limit(batch_size)
+    ).all()
+
+
+def _sync(db: Session, resolver: VendorResolver, batch_size):
+    """Brings subscription_vendors up to date; returns how many rows changed."""
+    sv = models.SubscriptionVendor
+    # Deleted subscriptions (SQLite does not enforce the cascade)
+    gone = ~exists().where(models.Subscription.id == sv.subscription_id)
+    _mark_dirty(db, db.execute(select(sv.vendor).where(gone).distinct()).scalars())
+    db.execute(delete(sv).where(gone))
+    db.commit()
+
+    changed, last = 0, 0
+    marked = set()  # already dirty: groups are only recomputed after the sync
+    while True:
+        rows = _changed_rows(db, last, batch_size)
+        if not rows:
+            return changed
+        snapshots, dirty = [], set()
+        for row in rows:
+            vendor = resolver.resolve(row.name or "")
+            snapshots.append({"subscription_id": row.id, "owner_id": row.owner_id, "name": row.name,
+                              "cost": row.cost, "status": row.status, "vendor": vendor})
+            dirty.update((vendor, row.old_vendor))
+        _save_aliases(db, resolver.added)
+        _save_snapshots(db, snapshots)
+        _mark_dirty(db, dirty - marked)
+        marked |= dirty
+        db.commit()
+        changed += len(rows)
+        last = rows[-1].id
+
+
+def group_stats(owner_rows):
+    """
+    Totals for one vendor from (owner_id, subscriptions, total cost, max cost)
+    per owner. Duplicate cost is what owners pay beyond their most expensive
+    subscription; the rest earns CONSOLIDATION_DISCOUNT once two or more owners
+    buy separately.
+    """
+    total = sum(cost for _, _, cost, _ in owner_rows)
+    duplicate = sum(cost - top for _, n, cost, top in owner_rows if n > 1)
+    owners = len(owner_rows)
+    savings = duplicate + (CONSOLIDATION_DISCOUNT * (total - duplicate) if owners > 1 else 0.0)
+    return {
+        "subscriptions": sum(n for _, n, _, _ in owner_rows),
+        "owners": owners,
+        "total_cost": round(total, 2),
+        "duplicate_cost": round(duplicate, 2),
+        "estimated_savings": round(savings, 2),
+    }
+
+
+def _refresh_groups(db: Session, resolver: VendorResolver, now: datetime):
+    """Recomputes the dirty vendor groups in batches; returns how many were updated."""
+    g, sv = models.VendorGroup, models.SubscriptionVendor
+    aliases = models.VendorAlias
+    updated = 0
+    while True:
+        vendors = db.execute(select(g.vendor).where(g.dirty.is_(True)).order_by(g.vendor).limit(GROUP_BATCH_SIZE)).scalars().all()
+        if not vendors:
+            return updated
+        per_owner = defaultdict(list)
+        for vendor, owner_id, n, cost, top in db.execute(
+            select(sv.vendor, sv.owner_id, func.count(), func.coalesce(func.sum(sv.cost), 0.0), func.coalesce(func.max(sv.cost), 0.0))
+            .where(sv.vendor.in_(vendors), sv.status == "Active")
+            .group_by(sv.vendor, sv.owner_id)
+        ):
+            per_owner[vendor].append((owner_id, n, cost, top))
+        spellings = dict(db.execute(select(aliases.key, aliases.name).where(aliases.key.in_(vendors))).all())
+
+        empty = [v for v in vendors if v not in per_owner]
+        if empty:
+            db.execute(delete(g).where(g.vendor.in_(empty)))
+        rows = []
+        for vendor, owner_rows in per_owner.items():
+            name, category, in_catalog = resolver.display(vendor)
+            rows.append({"b_vendor": vendor, "name": name or spellings.get(vendor) or vendor, "category": category,
+                         "in_catalog": in_catalog, "dirty": False, "updated_at": now, **group_stats(owner_rows)})
+        if rows:
+            table = g.__table__
+            db.execute(update(table).where(table.c.vendor == bindparam("b_vendor")), rows)
+        db.commit()
+        updated += len(vendors)
+
+
+def _reset(db: Session):
+    for model in (models.SubscriptionVendor, models.VendorAlias, models.VendorGroup):
+        db.execute(delete(model))
+    db.commit()
+
+
+def scan_duplicates(db: Session, full=False, batch_size=DUPLICATE_BATCH_SIZE, now: datetime = None):
+    """
+    Updates vendor_groups for the subscriptions changed since the last scan.
+    full=True (or a vendor catalog change since the last scan) starts over.
+    """
+    now = now or datetime.utcnow()
+    matcher = catalog.current_matcher(db)
+    version = db.execute(select(models.VendorCatalog.version).where(models.VendorCatalog.id == 1)).scalar() or 0
+    d = models.DuplicateScan
+    previous = db.execute(select(d).where(d.finished_at.is_not(None)).order_by(d.id.desc()).limit(1)).scalar()
+    full = full or previous is None or previous.catalog_version != version
+    if full:
+        _reset(db)
+    run = models.DuplicateScan(started_at=now, catalog_version=version, full=full)
+    db.add(run)
+    db.commit()
+
+    a = models.VendorAlias
+    resolver = VendorResolver(matcher, db.execute(select(a.key, a.vendor)).all())
+    run.rows_changed = _sync(db, resolver, batch_size)
+    run.vendors_updated = _refresh_groups(db, resolver, now)
+    run.finished_at = datetime.utcnow()
+    db.commit()
+    summary = {"full": full, "rows_changed": run.rows_changed, "vendors_updated": run.vendors_updated,
+               "comparisons": resolver.comparisons}
+    log.info("Duplicate scan finished", extra=summary)
+    return summary
+
+
+# --- READS ---
+def opportunities(db: Session, min_owners=2, uncataloged=False, limit=50, offset=0):
+    """Vendor groups bought separately by at least min_owners users, biggest estimated savings first."""
+    g = models.VendorGroup
+    stmt = select(g).where(g.owners >= min_owners)
+    if uncataloged:
+        stmt = stmt.where(g.in_catalog.is_(False))
+    return db.execute(stmt.order_by(g.estimated_savings.desc(), g.vendor).offset(offset).limit(limit)).scalars().all()
+
+
+def members(db: Session, vendor: str, limit=100):
+    s, sv = models.Subscription, models.SubscriptionVendor
+    return db.execute(
+        select(s.id, s.name, s.cost, s.status, s.owner_id)
+        .join(sv, sv.subscription_id == s.id)
+        .where(sv.vendor == vendor)
+        .order_by(s.owner_id, s.id)
+        .limit(limit)
+    ).mappings().all()
+
+
+if __name__ == "__main__":
+    # python -m app.duplicates scan [--full]
+    if sys.argv[1:2] != ["scan"] or sys.argv[2:] not in ([], ["--full"]):
+        sys.exit("usage: python -m app.duplicates scan [--full]")
+    from .database import SessionLocal
+    session = SessionLocal()
+    try:
+        scan_duplicates(session, full=sys.argv[2:] == ["--full"])
+    finally:
+        session.close()
@@ -0,0 +1,92 @@
+import os
+import orjson
+import redis
+import redis.asyncio as aioredis
+
+from . import logs
+
+log = logs.get_logger(__name__)
+
+# Per-user push channel for background task progress.
+#
+# Workers publish JSON events on events:user:{id} (Redis pub/sub); GET /events
+# relays them to the browser as Server-Sent Events. Pub/sub is fire-and-forget:
+# a client that connects after an event was published will not see it, so
+# clients reconcile once with GET /tasks/{id} after subscribing.
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+PROGRESS_EVERY_PAGES = int(os.getenv("EVENTS_PROGRESS_PAGES", "10"))
+RETRY_MS = 5000  # EventSource reconnect delay
+
+try:
+    client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
+    # No socket timeout here: subscribers block in get_message() between events
+    async_client = aioredis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5)
+except Exception as e:
+    log.warning("Redis connection failed", extra={"error": str(e)})
+    client = None
+    async_client = None
+
+
+async def close():
+    """Drops the pooled connections, subscribers' included, on API shutdown."""
+    if async_client is None:
+        return
+    client.close()
+    await async_client.aclose()
+
+
+def channel(user_id) -> str:
+    return f"events:user:{user_id}"
+
+
+def publish(user_id, event_type: str, **data) -> int:
+    """Publishes one event to the user's channel; returns the number of listeners reached."""
+    if client is None:
+        return 0
+    try:
+        return client.publish(channel(user_id), orjson.dumps({"type": event_type, **data}))
+    except redis.RedisError as e:
+        # Progress is best effort: a scan must not fail because nobody could be told about it
+        log.warning("Event publish failed", extra={"user_id": user_id, "error": str(e)})
+        return 0
+
+
+def publish_many(messages) -> None:
+    """Publishes (user_id, event_type, data) triples in one pipelined round trip."""
+    if client is None or not messages:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for user_id, event_type, data in messages:
+            pipe.publish(channel(user_id), orjson.dumps({"type": event_type, **data}))
+        pipe.execute()
+    except redis.RedisError as e:
+        log.warning("Event publish failed", extra={"events": len(messages), "error": str(e)})
+
+
+def format_sse(event_type: str, data: bytes) -> bytes:
+    return b"event: " + event_type.encode() + b"\ndata: " + data + b"\n\n"
+
+
+async def stream(user_id, is_disconnected, keepalive=KEEPALIVE_SECONDS):
+    """
+    Async generator of SSE frames for one user. The subscription is in place
+    before the first frame is yielded, and a comment line is sent every
+    `keepalive` seconds so proxies don't close an idle connection.
+    """
+    pubsub = async_client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(channel(user_id))
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        while not await is_disconnected():
+            message = await pubsub.get_message(timeout=keepalive)
+            if message is None:
+                yield b": keepalive\n\n"
+                continue
+            data = message["data"]
+            yield format_sse(orjson.loads(data).get("type", "message"), data)
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
@@ -0,0 +1,151 @@
+import csv
+import io
+import zlib
+from sqlalchemy import select
+
+from . import database, models
+
+# Column order mirrors the original pandas-based report so existing spreadsheets keep working
+EXPORT_COLUMNS = [
+    ("Name", models.Subscription.name),
+    ("Cost", models.Subscription.cost),
+    ("Category", models.Subscription.category),
+    ("Status", models.Subscription.status),
+    ("Renewal", models.Subscription.renewal_date),
+]
+
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "license_report.csv"),
+    "csv.gz": ("application/gzip", "license_report.csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", "license_report.parquet"),
+}
+
+
+def iter_subscription_batches(db, owner_id=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yields lists of row tuples using a server-side cursor, so only one batch
+    is ever held in memory. owner_id=None exports the whole organisation.
+    """
+    stmt = select(*[col for _, col in EXPORT_COLUMNS]).order_by(models.Subscription.id)
+    if owner_id is not None:
+        stmt = stmt.where(models.Subscription.owner_id == owner_id)
+
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
+
+
+def _format_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def encode_csv(batches):
+    """Incrementally renders CSV text, one chunk per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue().encode("utf-8")
+
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_format_value(v) for v in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_chunks(chunks, level=6):
+    # wbits=31 -> gzip container, so the output is a regular .gz file
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def encode_parquet(batches):
+    """Writes one Parquet row group per batch and yields the bytes as they are produced."""
+    # pyarrow is large; only pay for it when someone actually asks for Parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("Name", pa.string()),
+        ("Cost", pa.float64()),
+        ("Category", pa.string()),
+        ("Status", pa.string()),
+        ("Renewal", pa.timestamp("us")),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            columns = list(zip(*batch))
+            table = pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            )
+            writer.write_table(table)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(fmt, owner_id=None, batch_size=EXPORT_BATCH_SIZE, session_factory=None):
+    """
+    Generator used as the StreamingResponse body. It owns its session because
+    the body is consumed after the request dependencies have been torn down.
+    session_factory picks the engine (routing.session_factory); default is the primary.
+    """
+    db = (session_factory or database.SessionLocal)()
+    try:
+        batches = iter_subscription_batches(db, owner_id=owner_id, batch_size=batch_size)
+        if fmt == "parquet":
+            yield from encode_parquet(batches)
+        elif fmt == "csv.gz":
+            yield from gzip_chunks(encode_csv(batches))
+        else:
+            yield from encode_csv(batches)
+    finally:
+        db.close()
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from . import logs
+
+log = logs.get_logger(__name__)
+
+# Password hashing off the request path.
+#
+# bcrypt and argon2 are slow on purpose (about 0.25s per hash at bcrypt cost
+# 12). Run inline, a login storm ties up every threadpool thread and stalls
+# unrelated endpoints. Here hashes run in a small process pool at a lower CPU
+# priority, and the endpoints await the result without holding a thread. At
+# most HASH_MAX_PENDING hashes may be queued or running; beyond that callers
+# get HashingBusy (503 with Retry-After) instead of an ever longer queue.
+
+# First scheme hashes new passwords; hashes in the others still verify and are replaced on login
+PASSWORD_SCHEMES = [s.strip() for s in os.getenv("PASSWORD_SCHEMES", "bcrypt").split(",") if s.strip()]
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(2, os.cpu_count() or 1))))  # 0 = hash in the request threadpool
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "64"))
+HASH_NICE = int(os.getenv("HASH_NICE", "10"))  # request handling wins the CPU when both want it
+RETRY_AFTER_SECONDS = 1
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def argon2_available() -> bool:
+    try:
+        import argon2  # noqa: F401  (argon2-cffi, optional)
+        return True
+    except ImportError:
+        return False
+
+
+def _schemes():
+    schemes = [s for s in PASSWORD_SCHEMES if s != "argon2" or argon2_available()]
+    if len(schemes) < len(PASSWORD_SCHEMES):
+        log.warning("argon2 requested but argon2-cffi is not installed; falling back to bcrypt")
+    if "bcrypt" not in schemes:
+        schemes.append("bcrypt")  # existing bcrypt hashes must keep verifying
+    return schemes
+
+
+# deprecated="auto": hashes in any scheme but the first, or with a different cost, need an update
+pwd_context = CryptContext(schemes=_schemes(), deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+# --- WORKER FUNCTIONS (run in the pool processes) ---
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update(password: str, hashed):
+    """(valid, new hash or None). Without a stored hash, burns the same time as a real check."""
+    if not hashed:
+        pwd_context.dummy_verify()
+        return False, None
+    return pwd_context.verify_and_update(password, hashed)
+
+
+def _lower_priority(nice):
+    if nice:
+        os.nice(nice)
+
+
+# --- POOL ---
+class HashPool:
+    def __init__(self, workers=HASH_WORKERS, max_pending=HASH_MAX_PENDING, nice=HASH_NICE):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.nice = nice
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"submitted": 0, "completed": 0, "rejected": 0, "failed": 0,
+                       "hash_seconds": 0.0, "peak_pending": 0}
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: forking a server process with live threads and sockets is unsafe
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_lower_priority, initargs=(self.nice,),
+                )
+                log.info("Started hashing processes", extra={"workers": self.workers})
+            return self._executor
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise HashingBusy()
+            self._pending += 1
+            self._stats["submitted"] += 1
+            self._stats["peak_pending"] = max(self._stats["peak_pending"], self._pending)
+        start = time.perf_counter()
+        outcome = "failed"
+        try:
+            if self.workers <= 0:
+                result = await run_in_threadpool(fn, *args)
+            else:
+                result = await asyncio.wrap_future(self._get_executor().submit(fn, *args))
+            outcome = "completed"
+            return result
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._stats[outcome] += 1
+                self._stats["hash_seconds"] += time.perf_counter() - start
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            pending = self._pending
+        done = stats["completed"] + stats["failed"]
+        return {
+            "workers": self.workers, "max_pending": self.max_pending,
+            "in_flight": min(pending, self.workers) if self.workers > 0 else pending,
+            "queued": max(0, pending - self.workers) if self.workers > 0 else 0,
+            **stats,
+            "avg_ms": round(stats["hash_seconds"] / done * 1000, 1) if done else 0.0,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+pool = HashPool()
@@ -0,0 +1,74 @@
+import logging
+import os
+import sys
+import time
+import orjson
+
+from . import tracing
+
+# Structured logging for the API and the workers.
+#
+# Every record is one line on stderr: a JSON object with ts, level, logger, msg,
+# the trace/span ids when a trace is active, and whatever was passed in
+# `extra=` (user_id, task_id, ...), so log pipelines can filter on fields
+# instead of parsing messages. LOG_FORMAT=text gives "time level logger msg
+# key=value" lines for local runs.
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+def _fields(record):
+    fields = {k: v for k, v in vars(record).items() if k not in _STANDARD}
+    fields.update(tracing.current_ids())
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        stamp = time.strftime("%H:%M:%S", time.localtime(record.created))
+        pairs = " ".join(f"{k}={v}" for k, v in _fields(record).items())
+        line = f"{stamp} {record.levelname:<7} {record.name} {record.getMessage()}" + (f" {pairs}" if pairs else "")
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+_configured = False
+
+
+def configure():
+    """Attaches the handler to the "app" logger once; uvicorn's and Celery's own loggers are left alone."""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    root = logging.getLogger("app")
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    # Celery's worker hijacks the root logger; don't print every line twice
+    root.propagate = False
+
+
+def get_logger(name):
+    configure()
+    return logging.getLogger(name)
@@ -1,83 +1,175 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import redis
-import json
-import pandas as pd
-import io
-import shutil
+import tempfile
 import os
 import re # Added for filename sanitization
+import secrets
+import time
 
-from . import models, schemas, auth, database, worker
-from .middleware import RBACMiddleware 
+from . import models, schemas, auth, database, export, crud, cache, async_routes, bulk, catalog, uploads, events, analytics, search, duplicates, hashing, ratelimit, logs, metrics, routing
+from .middleware import RBACMiddleware, require_roles
 
-# Initialize Database Schema
-models.Base.metadata.create_all(bind=database.engine)
+log = logs.get_logger(__name__)
 
-app = FastAPI(title="OfficeWatch API")
+# Importing this module does no I/O: the schema is created by `python -m app.migrate`
+# and connections are opened once per process here, before the first request.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    await database.warm_up()
+    await cache.connect()
+    log.info("API started", extra={"startup_seconds": round(time.perf_counter() - started, 3)})
+    yield
+    hashing.pool.shutdown()
+    await events.close()
+    await cache.close()
+    await database.dispose()
+
+app = FastAPI(title="OfficeWatch API", lifespan=lifespan)
 
 # 1. REGISTER RBAC MIDDLEWARE
 app.add_middleware(RBACMiddleware)
 
-# Setup Redis
-try:
-    redis_client = redis.Redis(host='redis', port=6379, db=0, decode_responses=True)
-except Exception as e:
-    print(f"Warning: Redis connection failed: {e}")
-    redis_client = None
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], 
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Outermost, so request latency includes the RBAC and CORS layers
+if metrics.METRICS_ENABLED:
+    metrics.instrument_engine(database.engine)
+    if database.async_engine is not None:
+        metrics.instrument_engine(database.async_engine.sync_engine)
+    for replica in database.replicas:
+        metrics.instrument_engine(replica.engine)
+        if replica.async_engine is not None:
+            metrics.instrument_engine(replica.async_engine.sync_engine)
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Pin before invalidating: a miss in between would otherwise re-cache a lagging replica's page
 def invalidate_user_cache(user_id: int):
-    if redis_client:
-        key = f"subs_{user_id}"
-        redis_client.delete(key)
-        print(f"[CACHE] Invalidated key: {key}")
+    routing.record_write("subs", user_id)
+    cache.invalidate("subs", user_id)
+    log.debug("Invalidated subscriptions cache", extra={"user_id": user_id})
+
+def invalidate_request_cache(requester_id: int):
+    # The admin view lists every request, so it goes stale with any change
+    for scope in (requester_id, "all"):
+        routing.record_write("requests", scope)
+        cache.invalidate("requests", scope)
+
+def cached_page(namespace, scope, params, loader):
+    """Serves a list page from the cache layer as raw JSON bytes; on a miss loader(db) reads from a routed session."""
+    def load():
+        with routing.read_session(namespace, scope) as db:
+            return loader(db)
+
+    body, headers = cache.get_or_load(namespace, scope, params, load)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # --- AUTH ---
 @app.post("/signup", response_model=schemas.UserOut)
-def signup(user: schemas.UserCreate, role: str = "employee", db: Session = Depends(database.get_db)):
-    if db.query(models.User).filter(models.User.username == user.username).first():
+async def signup(user: schemas.UserCreate, role: str = "employee"):
+    # Hashing runs in the hashing pool and DB work in short threadpool calls, so a
+    # storm of signups/logins never holds request threads for a whole bcrypt round
+    if await run_in_threadpool(auth.find_credentials, user.username) is not None:
+        raise HTTPException(status_code=400, detail="Username already taken")
+    hashed_pw = await auth.hash_password(user.password)
+    new_user = await run_in_threadpool(auth.create_user, user.username, hashed_pw, role)
+    if new_user is None:
         raise HTTPException(status_code=400, detail="Username already taken")
-    hashed_pw = auth.get_password_hash(user.password)
-    new_user = models.User(username=user.username, hashed_password=hashed_pw, role=role)
-    db.add(new_user)
-    db.commit()
     return new_user
 
 @app.post("/token", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()):
+    ip = ratelimit.client_ip(request)
+    retry_after = await ratelimit.check_login(form_data.username, ip)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Too many login attempts. Try again later.", headers={"Retry-After": str(retry_after)})
+    user = await run_in_threadpool(auth.find_credentials, form_data.username)
+    valid, new_hash = await auth.check_password(form_data.password, user.hashed_password if user else None)
+    if not valid:
+        await ratelimit.record_failure(form_data.username, ip)
         raise HTTPException(status_code=400, detail="Incorrect credentials")
-    token = auth.create_access_token(data={"sub": user.username, "role": user.role}) 
+    if new_hash:
+        # Stored with an old scheme or cost factor: upgrade it now that the password is known
+        await run_in_threadpool(auth.replace_password_hash, user.id, user.hashed_password, new_hash)
+    await ratelimit.reset_user(form_data.username)
+    token = auth.create_access_token(data={"sub": user.username, "role": user.role})
     return {"access_token": token, "token_type": "bearer", "role": user.role}
 
+@app.get("/auth/stats")
+@require_roles("admin")
+def auth_stats(current_user: models.User = Depends(auth.get_current_active_admin)):
+    return {"hashing": hashing.pool.stats(), "login_limits": ratelimit.stats()}
+
+@app.put("/users/{user_id}/role", response_model=schemas.UserOut)
+@require_roles("admin")
+def set_user_role(user_id: int, role: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_active_admin)):
+    if role not in ("admin", "employee"):
+        raise HTTPException(status_code=400, detail="role must be 'admin' or 'employee'")
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.role = role
+    db.commit()
+    # Cached principals carry the old role; drop them so the change applies immediately
+    auth.invalidate_principal(user.username)
+    return user
+
 # --- REQUESTS ---
 @app.get("/requests", response_model=List[schemas.RequestOut])
-def get_requests(db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    if current_user.role == "admin":
-        return db.query(models.Request).all()
-    return db.query(models.Request).filter(models.Request.requester_id == current_user.id).all()
+def get_requests(
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    # Admins see every request, employees only their own
+    requester_id = None if current_user.role == "admin" else current_user.id
+    projection = crud.parse_fields(fields, schemas.RequestOut)
+    params = dict(
+        status=status, type=type, created_from=created_from, created_to=created_to,
+        sort=sort, cursor=cursor, limit=limit, fields=projection,
+    )
+
+    def load(db):
+        rows, next_cursor = crud.list_requests(db, requester_id=requester_id, **params)
+        return cache.encode_models(rows, schemas.RequestOut, projection), crud.cursor_headers(next_cursor)
+
+    return cached_page("requests", "all" if requester_id is None else requester_id, params, load)
 
-@app.post("/requests")
+@app.post("/requests", response_model=schemas.RequestOut)
 def create_request(req: schemas.RequestCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
     db_req = models.Request(type=req.type, details=req.details, requester_id=current_user.id)
     db.add(db_req)
+    db.flush()
+    # Serialize before commit: afterwards every attribute is expired and reading one re-selects the row
+    created = schemas.RequestOut.model_validate(db_req)
     db.commit()
-    return db_req
+    invalidate_request_cache(current_user.id)
+    return created
 
 @app.put("/requests/{req_id}/{action}")
+@require_roles("admin")
 def manage_request(
     req_id: int, 
     action: str, 
@@ -85,124 +177,484 @@ def manage_request(
     db: Session = Depends(database.get_db), 
     current_user: models.User = Depends(auth.get_current_active_admin)
 ):
-    req = db.query(models.Request).filter(models.Request.id == req_id).first()
+    changes = {"approve": {"status": "Approved"}, "reject": {"status": "Rejected", "admin_note": note}}.get(action)
+    if changes is None:
+        raise HTTPException(status_code=400, detail="Invalid action. Use approve or reject")
+    # One UPDATE ... RETURNING instead of loading the request and writing it back
+    req = db.execute(
+        update(models.Request).where(models.Request.id == req_id).values(**changes)
+        .returning(models.Request.type, models.Request.details, models.Request.requester_id)
+        .execution_options(synchronize_session=False)
+    ).first()
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
-    
-    if action == "approve":
-        req.status = "Approved"
-        if req.type == 'software':
-            new_sub = models.Subscription(
-                name=req.details.get('name'), 
-                cost=req.details.get('cost'), 
-                category="Approved Request", 
-                owner_id=req.requester_id,
-                status="Active"
-            )
-            db.add(new_sub)
-            invalidate_user_cache(req.requester_id)
-            
-    elif action == "reject":
-        req.status = "Rejected"
-        req.admin_note = note
-        
+
+    approved_software = action == "approve" and req.type == 'software'
+    if approved_software:
+        new_sub = models.Subscription(
+            name=req.details.get('name'),
+            cost=req.details.get('cost'),
+            category="Approved Request",
+            owner_id=req.requester_id,
+            status="Active"
+        )
+        db.add(new_sub)
+        db.flush()
+        analytics.record(db, added=[new_sub])
+
     db.commit()
+    # Invalidate only after commit so a concurrent refill can't cache pre-commit data
+    if approved_software:
+        invalidate_user_cache(req.requester_id)
+    invalidate_request_cache(req.requester_id)
     return {"message": f"Request {action}d successfully"}
 
 # --- SUBSCRIPTIONS ---
 @app.get("/subscriptions", response_model=List[schemas.SubscriptionOut])
-def get_subs(db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    if redis_client:
-        cache_key = f"subs_{current_user.id}"
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            return json.loads(cached_data)
-
-    subs = current_user.subscriptions
-    
-    if redis_client:
-        subs_json = []
-        for s in subs:
-            s_dict = {
-                "id": s.id, "name": s.name, "cost": s.cost, "category": s.category,
-                "status": s.status, "renewal_date": s.renewal_date.isoformat(),
-                "custom_attributes": s.custom_attributes
-            }
-            subs_json.append(s_dict)
-        redis_client.setex(cache_key, 60, json.dumps(subs_json))
-    
-    return subs
+def get_subs(
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    renewal_from: Optional[datetime] = None,
+    renewal_to: Optional[datetime] = None,
+    min_cost: Optional[float] = None,
+    max_cost: Optional[float] = None,
+    sort: str = "id",
+    cursor: Optional[str] = None,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    projection = crud.parse_fields(fields, schemas.SubscriptionOut)
+    params = dict(
+        status=status, category=category, renewal_from=renewal_from, renewal_to=renewal_to,
+        min_cost=min_cost, max_cost=max_cost, sort=sort, cursor=cursor, limit=limit, fields=projection,
+    )
+
+    def load(db):
+        subs, next_cursor = crud.list_subscriptions(db, current_user.id, **params)
+        return cache.encode_models(subs, schemas.SubscriptionOut, projection), crud.cursor_headers(next_cursor)
+
+    return cached_page("subs", current_user.id, params, load)
 
 @app.post("/subscriptions", response_model=schemas.SubscriptionOut)
 def create_sub(sub: schemas.SubscriptionCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_sub = models.Subscription(**sub.dict(), owner_id=current_user.id)
+    # Drop unset values so column defaults (e.g. renewal_date) apply instead of NULL
+    db_sub = models.Subscription(**sub.model_dump(exclude_none=True), owner_id=current_user.id)
     db.add(db_sub)
+    db.flush()
+    analytics.record(db, added=[db_sub])
+    created = schemas.SubscriptionOut.model_validate(db_sub)
     db.commit()
-    db.refresh(db_sub)
     invalidate_user_cache(current_user.id)
-    return db_sub
+    return created
+
+# Bulk routes are registered before /subscriptions/{sub_id} so "bulk" is not parsed as an id
+BULK_UPLOAD_BODY = {
+    "requestBody": {
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/SubscriptionCreate"}}},
+            "text/csv": {"schema": {"type": "string"}},
+            "application/x-ndjson": {"schema": {"type": "string"}},
+            "multipart/form-data": {"schema": {"type": "object", "properties": {"file": {"type": "string", "format": "binary"}}}},
+        }
+    }
+}
+
+@app.post("/subscriptions/bulk", response_model=schemas.BulkImportResult, openapi_extra=BULK_UPLOAD_BODY)
+async def bulk_create_subs(request: Request, format: Optional[str] = None, current_user: models.User = Depends(auth.get_current_user)):
+    content_type = request.headers.get("content-type", "")
+    # Both paths stop receiving at BULK_MAX_BYTES, so nothing oversized is ever buffered or parsed
+    if content_type.startswith("multipart/form-data"):
+        temp_path, filename, _, _ = await uploads.stream_to_disk(request, tempfile.gettempdir(), bulk.BULK_MAX_BYTES)
+        fmt = format or bulk.detect_format(None, filename)
+        spool = open(temp_path, "rb")
+    else:
+        temp_path = None
+        fmt = format or bulk.detect_format(content_type)
+        declared = request.headers.get("content-length", "")
+        if declared.isdigit() and int(declared) > bulk.BULK_MAX_BYTES:
+            raise uploads.too_large(bulk.BULK_MAX_BYTES)
+        # Spool the raw body (in memory up to 1MB, then on disk) so parsing never holds it all
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        received = 0
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > bulk.BULK_MAX_BYTES:
+                    raise uploads.too_large(bulk.BULK_MAX_BYTES)
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            raise
+        spool.seek(0)
+
+    def run():
+        db = database.SessionLocal()
+        try:
+            return bulk.import_subscriptions(db, current_user.id, spool, fmt)
+        finally:
+            db.close()
+
+    try:
+        if fmt not in bulk.FORMATS:
+            raise HTTPException(status_code=415, detail=f"Unsupported bulk format. Use one of: {', '.join(bulk.FORMATS)}")
+        result = await run_in_threadpool(run)
+    except bulk.ImportTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except bulk.ImportAborted as e:
+        # Batches before the unreadable part are committed; report them and drop the stale pages
+        if e.result["inserted"]:
+            invalidate_user_cache(current_user.id)
+        raise HTTPException(status_code=400, detail={"error": str(e), **e.result})
+    finally:
+        spool.close()
+        if temp_path is not None:
+            os.remove(temp_path)
+
+    # One invalidation for the whole upload instead of one per row
+    if result["inserted"]:
+        invalidate_user_cache(current_user.id)
+    return result
+
+@app.put("/subscriptions/bulk", response_model=schemas.BulkMutationResult)
+def bulk_update_subs(payload: schemas.BulkUpdate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+    try:
+        result = bulk.update_subscriptions(db, current_user.id, payload.ids, payload.changes.model_dump(exclude_none=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result["matched"]:
+        invalidate_user_cache(current_user.id)
+    return result
+
+@app.post("/subscriptions/bulk/delete", response_model=schemas.BulkMutationResult)
+def bulk_delete_subs(payload: schemas.BulkIds, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+    try:
+        result = bulk.delete_subscriptions(db, current_user.id, payload.ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result["matched"]:
+        invalidate_user_cache(current_user.id)
+    return result
 
 @app.put("/subscriptions/{sub_id}", response_model=schemas.SubscriptionOut)
 def update_sub(sub_id: int, sub: schemas.SubscriptionCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_sub = db.query(models.Subscription).filter(models.Subscription.id == sub_id, models.Subscription.owner_id == current_user.id).first()
+    db_sub = db.query(models.Subscription).filter(models.Subscription.id == sub_id, models.Subscription.owner_id == current_user.id).with_for_update().first()
     if not db_sub:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
+    before = analytics.snapshot(db_sub)
     db_sub.name = sub.name
     db_sub.cost = sub.cost
     db_sub.category = sub.category
     if sub.renewal_date:
         db_sub.renewal_date = sub.renewal_date
-    
+    analytics.record(db, added=[db_sub], removed=[before])
+    updated = schemas.SubscriptionOut.model_validate(db_sub)
+
     db.commit()
-    db.refresh(db_sub)
     invalidate_user_cache(current_user.id)
-    return db_sub
+    return updated
 
 @app.delete("/subscriptions/{sub_id}")
 def delete_sub(sub_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_sub = db.query(models.Subscription).filter(models.Subscription.id == sub_id, models.Subscription.owner_id == current_user.id).first()
+    db_sub = db.query(models.Subscription).filter(models.Subscription.id == sub_id, models.Subscription.owner_id == current_user.id).with_for_update().first()
     if not db_sub:
         raise HTTPException(status_code=404, detail="Subscription not found")
         
+    analytics.record(db, removed=[db_sub])
     db.delete(db_sub)
     db.commit()
     invalidate_user_cache(current_user.id)
     return {"message": "Deleted successfully"}
 
 # --- INVOICE SCANNING ---
-@app.post("/upload-invoice")
+# The body is read in the handler (uploads.stream_to_disk) rather than through
+# UploadFile, which would spool all of it before the size limit could apply
+INVOICE_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {"schema": {"type": "object", "required": ["file"],
+                                               "properties": {"file": {"type": "string", "format": "binary"}}}},
+        },
+    }
+}
+
+@app.post("/upload-invoice", openapi_extra=INVOICE_UPLOAD_BODY)
 async def upload_invoice(
-    file: UploadFile = File(...), 
+    request: Request,
     current_user: models.User = Depends(auth.get_current_user)
 ):
-    upload_dir = "/app/temp_uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    
+    temp_path, filename, sha256, size = await uploads.stream_to_disk(request, uploads.UPLOAD_DIR, uploads.UPLOAD_MAX_BYTES)
+
     # Sanitize filename (Replace spaces/weird chars with underscores)
-    safe_filename = re.sub(r'[^a-zA-Z0-9_.-]', '_', file.filename)
-    file_path = f"{upload_dir}/{current_user.id}_{safe_filename}"
-    
+    safe_filename = re.sub(r'[^a-zA-Z0-9_.-]', '_', filename or "invoice.pdf")
+    upload, is_new = await run_in_threadpool(uploads.claim_upload, current_user.id, sha256, safe_filename, size)
+
+    if not is_new:
+        # Same bytes as an earlier upload: skip the re-scan and point at the original task
+        await run_in_threadpool(os.remove, temp_path)
+        return {
+            "message": "Invoice already uploaded. Returning the previous scan.",
+            "task_id": upload["task_id"],
+            "status": upload["status"],
+            "result": upload["result"],
+            "duplicate": True,
+        }
+
+    file_path = uploads.content_path(uploads.UPLOAD_DIR, current_user.id, sha256)
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        await run_in_threadpool(os.makedirs, os.path.dirname(file_path), exist_ok=True)
+        await run_in_threadpool(os.replace, temp_path, file_path)
+        await run_in_threadpool(
+            uploads.celery_app().send_task, "scan_invoice",
+            args=[file_path, current_user.id], kwargs={"upload_id": upload["id"]}, task_id=upload["task_id"],
+        )
     except Exception as e:
+        await run_in_threadpool(uploads.finish_upload, upload["id"], "Failed", str(e))
         raise HTTPException(status_code=500, detail=f"Could not save file: {str(e)}")
-        
-    task = worker.celery_app.send_task("scan_invoice", args=[file_path, current_user.id])
-    
-    return {"message": "Invoice uploaded. Processing started in background.", "task_id": task.id}
+
+    return {"message": "Invoice uploaded. Processing started in background.", "task_id": upload["task_id"], "duplicate": False}
+
+@app.get("/tasks/{task_id}", response_model=schemas.TaskStatus)
+def get_task(task_id: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+    # Only tasks the caller started are visible; task ids are not secrets
+    upload = db.query(models.InvoiceUpload).filter(
+        models.InvoiceUpload.task_id == task_id, models.InvoiceUpload.owner_id == current_user.id
+    ).first()
+    if not upload:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return uploads.task_status(upload)
+
+@app.post("/events/token", response_model=schemas.StreamToken)
+def stream_token(current_user: models.User = Depends(auth.get_current_user)):
+    """A token for connecting to GET /events, which is the only place it is valid."""
+    return {"stream_token": auth.create_stream_token(current_user.username), "expires_in": auth.STREAM_TOKEN_SECONDS}
+
+@app.get("/events")
+async def task_events(request: Request, current_user: models.User = Depends(auth.get_stream_user)):
+    """Server-Sent Events: task.progress and task.completed for the caller's scans."""
+    if events.async_client is None:
+        raise HTTPException(status_code=503, detail="Event stream unavailable")
+    return StreamingResponse(
+        events.stream(current_user.id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- VENDOR CATALOG ---
+def _vendor_fields(vendor: schemas.VendorCreate):
+    try:
+        catalog.validate_price_pattern(vendor.price_pattern)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid price_pattern: {e}")
+    return vendor.model_dump()
+
+@app.get("/vendors", response_model=List[schemas.VendorOut])
+@require_roles("admin")
+def list_vendors(db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_active_admin)):
+    return db.query(models.Vendor).order_by(models.Vendor.name).all()
+
+@app.post("/vendors", response_model=schemas.VendorOut)
+@require_roles("admin")
+def create_vendor(vendor: schemas.VendorCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_active_admin)):
+    fields = _vendor_fields(vendor)
+    catalog.seed_defaults(db)
+    if db.query(models.Vendor).filter(models.Vendor.name == vendor.name).first():
+        raise HTTPException(status_code=409, detail="Vendor already exists")
+    db_vendor = models.Vendor(**fields)
+    db.add(db_vendor)
+    catalog.bump_version(db)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another admin created the same name between the check and the commit
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Vendor already exists")
+    db.refresh(db_vendor)
+    return db_vendor
+
+@app.put("/vendors/{vendor_id}", response_model=schemas.VendorOut)
+@require_roles("admin")
+def update_vendor(vendor_id: int, vendor: schemas.VendorCreate, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_active_admin)):
+    fields = _vendor_fields(vendor)
+    db_vendor = db.query(models.Vendor).filter(models.Vendor.id == vendor_id).first()
+    if not db_vendor:
+        raise HTTPException(status_code=404, detail="Vendor not found")
+    for key, value in fields.items():
+        setattr(db_vendor, key, value)
+    catalog.bump_version(db)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Renamed onto another vendor's name
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Vendor already exists")
+    db.refresh(db_vendor)
+    return db_vendor
+
+@app.delete("/vendors/{vendor_id}")
+@require_roles("admin")
+def delete_vendor(vendor_id: int, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_active_admin)):
+    db_vendor = db.query(models.Vendor).filter(models.Vendor.id == vendor_id).first()
+    if not db_vendor:
+        raise HTTPException(status_code=404, detail="Vendor not found")
+    db.delete(db_vendor)
+    catalog.bump_version(db)
+    db.commit()
+    return {"message": "Deleted successfully"}
+
+# --- CACHE ---
+@app.get("/cache/stats")
+@require_roles("admin")
+def cache_stats(current_user: models.User = Depends(auth.get_current_active_admin)):
+    return cache.stats()
+
+@app.get("/db/stats")
+@require_roles("admin")
+def db_stats(current_user: models.User = Depends(auth.get_current_active_admin)):
+    return database.pool_stats()
+
+# --- METRICS ---
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    # Scraped by Prometheus rather than called by users, so it is guarded by METRICS_TOKEN instead of a JWT
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    if not metrics.METRICS_TOKEN:
+        if not metrics.METRICS_ALLOW_UNAUTHENTICATED:
+            raise HTTPException(status_code=403, detail="Metrics require METRICS_TOKEN to be set")
+    elif not secrets.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {metrics.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    metrics.sample_threadpool()
+    body = await run_in_threadpool(metrics.render)
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- ANALYTICS ---
+def scope_owner(scope: str, current_user):
+    """Maps ?scope= onto an owner filter; org-wide reports are admin-only (None = everyone)."""
+    if scope == "org":
+        if current_user.role != "admin":
+            raise HTTPException(status_code=403, detail="Not authorized. Admin access required.")
+        return None
+    if scope == "mine":
+        return current_user.id
+    raise HTTPException(status_code=400, detail="scope must be 'mine' or 'org'")
+
+@app.get("/analytics/spend/by-category", response_model=List[schemas.CategorySpend])
+def spend_by_category(scope: str = "mine", db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
+    return analytics.spend_by_category(db, scope_owner(scope, current_user))
+
+@app.get("/analytics/spend/by-user", response_model=List[schemas.UserSpend])
+@require_roles("admin")
+def spend_by_user(db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_active_admin)):
+    return analytics.spend_by_user(db)
+
+@app.get("/analytics/spend/by-month", response_model=List[schemas.MonthSpend])
+def spend_by_month(
+    scope: str = "mine",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return analytics.spend_by_month(db, scope_owner(scope, current_user), start, end)
+
+@app.get("/analytics/renewals/upcoming", response_model=List[schemas.RenewalOut])
+def upcoming_renewals(
+    scope: str = "mine",
+    days: int = Query(30, ge=1, le=366),
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return analytics.upcoming_renewals(db, scope_owner(scope, current_user), days=days, limit=limit)
+
+@app.get("/renewals/alerts", response_model=List[schemas.RenewalAlertOut])
+def renewal_alerts(
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    # Upcoming renewals first; alerts for renewals that already happened are left out
+    return db.query(models.RenewalAlert).filter(
+        models.RenewalAlert.owner_id == current_user.id, models.RenewalAlert.renewal_date >= datetime.utcnow()
+    ).order_by(models.RenewalAlert.renewal_date, models.RenewalAlert.id).limit(limit).all()
+
+# --- SEARCH ---
+SEARCH_TYPES = ("subscriptions", "requests")
+
+@app.get("/search", response_model=schemas.SearchResults)
+def search_all(
+    q: str = Query(..., min_length=3, max_length=100),
+    scope: str = "mine",
+    types: str = ",".join(SEARCH_TYPES),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    # scope=org lets admins spot the same tool bought by several people (e.g. "Figma" vs "figma pro")
+    owner_id = scope_owner(scope, current_user)
+    wanted = {t.strip() for t in types.split(",") if t.strip()}
+    if not wanted or not wanted <= set(SEARCH_TYPES):
+        raise HTTPException(status_code=400, detail=f"types must be a comma-separated subset of: {', '.join(SEARCH_TYPES)}")
+    results = {}
+    if "subscriptions" in wanted:
+        results["subscriptions"] = search.search_subscriptions(db, q, owner_id, limit)
+    if "requests" in wanted:
+        results["requests"] = search.search_requests(db, q, owner_id, limit)
+    return results
+
+@app.get("/search/autocomplete", response_model=List[schemas.NameSuggestion])
+def search_autocomplete(
+    q: str = Query(..., min_length=1, max_length=100),
+    scope: str = "mine",
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return search.autocomplete(db, q, scope_owner(scope, current_user), limit)
+
+# --- DUPLICATES ---
+@app.get("/duplicates", response_model=List[schemas.VendorGroupOut])
+@require_roles("admin")
+def list_duplicates(
+    min_owners: int = Query(2, ge=1),
+    uncataloged: bool = False,
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_active_admin)
+):
+    # Filled in by the nightly scan_duplicates task; uncataloged=true lists shadow IT only
+    return duplicates.opportunities(db, min_owners=min_owners, uncataloged=uncataloged, limit=limit, offset=offset)
+
+@app.get("/duplicates/{vendor}", response_model=List[schemas.VendorGroupMember])
+@require_roles("admin")
+def duplicate_members(vendor: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_active_admin)):
+    if db.get(models.VendorGroup, vendor) is None:
+        raise HTTPException(status_code=404, detail="Vendor group not found")
+    return duplicates.members(db, vendor)
 
 # --- EXPORT / CHAT ---
 @app.get("/export")
-def export_csv(db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user)):
-    subs = current_user.subscriptions
-    data = [{"Name": s.name, "Cost": s.cost, "Category": s.category, "Status": s.status, "Renewal": s.renewal_date} for s in subs]
-    df = pd.DataFrame(data)
-    stream = io.StringIO()
-    df.to_csv(stream, index=False)
-    response = StreamingResponse(iter([stream.getvalue()]), media_type="text/csv")
-    response.headers["Content-Disposition"] = "attachment; filename=license_report.csv"
+def export_csv(
+    format: str = "csv",
+    scope: str = "mine",
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if format not in export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format. Use one of: {', '.join(export.EXPORT_FORMATS)}")
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow on the server")
+
+    owner_id = scope_owner(scope, current_user)
+    media_type, filename = export.EXPORT_FORMATS[format]
+    # Decided now, while the request's pins apply; the body opens its session later
+    sessions = routing.session_factory("subs", current_user.id)
+    response = StreamingResponse(export.stream_export(format, owner_id=owner_id, session_factory=sessions), media_type=media_type)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
     return response
 
 @app.post("/chat")
@@ -213,4 +665,8 @@ def chat_with_ai(chat_req: schemas.ChatRequest):
     elif "negotiate" in prompt:
         return {"response": "Template: 'Hi Team, we are reviewing our stack. We would love to stay if we can discuss a 15% discount for an annual commitment.'"}
     else:
-        return {"response": "I am your OfficeWatch AI. Ask me how to cancel a tool or negotiate a contract."}
\ No newline at end of file
+        return {"response": "I am your OfficeWatch AI. Ask me how to cancel a tool or negotiate a contract."}
+
+# Opt-in asyncio read path (DB_ASYNC=1): replaces the sync list endpoints above
+if database.ASYNC_ENABLED:
+    async_routes.install(app)
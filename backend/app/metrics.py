@@ -0,0 +1,425 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+import redis
+from anyio import to_thread
+
+from . import tracing
+
+# Prometheus metrics for GET /metrics, rendered in the text exposition format
+# without the client library.
+#
+# HTTP and SQL metrics live in the API process that records them. Celery tasks
+# run in other processes (usually another container), so task metrics are
+# accumulated in Redis hashes under metrics:* and every API process reports
+# the same totals. Recording an observation is one lock and a few additions,
+# cheap enough to leave on; benchmarks/bench_metrics.py measures the cost.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # scrapers must send it as a bearer token
+# Without a token /metrics is refused, unless open access is asked for explicitly
+METRICS_ALLOW_UNAUTHENTICATED = os.getenv("METRICS_ALLOW_UNAUTHENTICATED", "0") == "1"
+PREFIX = "officewatch_"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 100)
+TASK_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0)
+PAGE_RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# --- METRIC TYPES ---
+class _Metric:
+    kind = "untyped"
+    shared = False  # kept in Redis rather than in this process
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def _items(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def lines(self):
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in self._items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class CounterSnapshot(Gauge):
+    """A counter some other component keeps itself (e.g. the pool metrics), copied in at scrape time."""
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        # Per-bucket counts are stored non-cumulative and summed up when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def _render(self, labels, counts, total):
+        lines, running = [], 0
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, counts):
+            running += count
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {running}")
+        suffix = _labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{suffix} {total}")
+        lines.append(f"{self.name}_count{suffix} {running}")
+        return lines
+
+    def lines(self):
+        lines = self._header()
+        for labels, (counts, total) in self._items():
+            lines += self._render(labels, list(counts), total)
+        return lines
+
+
+# --- SHARED (REDIS) METRICS ---
+# Hash metrics:{name}; fields are "<label values joined by \x1f>\x1e<bucket index | sum | value>"
+def _store():
+    from . import cache  # cache records its own metrics through this module
+    return cache.client
+
+
+def _shared_snapshot(names):
+    """{metric name: {label values: {slot: value}}} for every shared metric, in one round trip."""
+    client = _store()
+    if client is None or not names:
+        return {}
+    try:
+        pipe = client.pipeline(transaction=False)
+        for name in names:
+            pipe.hgetall(f"metrics:{name}")
+        replies = pipe.execute()
+    except redis.RedisError:
+        return {}
+    snapshot = {}
+    for name, raw in zip(names, replies):
+        items = snapshot[name] = {}
+        for field, value in raw.items():
+            labels, _, slot = field.decode().rpartition("\x1e")
+            items.setdefault(tuple(labels.split("\x1f")) if labels else (), {})[slot] = float(value)
+    return snapshot
+
+
+def _shared_write(name, ops):
+    client = _store()
+    if client is None:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for method, field, amount in ops:
+            getattr(pipe, method)(f"metrics:{name}", field, amount)
+        pipe.execute()
+    except redis.RedisError:
+        pass  # metrics are best effort; a task must not fail over them
+
+
+def _field(labels, slot):
+    return "\x1f".join(labels) + "\x1e" + slot
+
+
+class SharedCounter(Counter):
+    shared = True
+
+    def inc(self, labels=(), amount=1):
+        _shared_write(self.name, [("hincrbyfloat", _field(labels, "value"), amount)])
+
+    def lines(self, items=None):
+        return self._header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {slots['value']}" for k, slots in (items or {}).items()
+        ]
+
+
+class SharedHistogram(Histogram):
+    shared = True
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        _shared_write(self.name, [("hincrby", _field(labels, str(index)), 1),
+                                  ("hincrbyfloat", _field(labels, "sum"), value)])
+
+    def lines(self, items=None):
+        lines = self._header()
+        for labels, slots in (items or {}).items():
+            counts = [int(slots.get(str(i), 0)) for i in range(len(self.buckets) + 1)]
+            lines += self._render(labels, counts, slots.get("sum", 0.0))
+        return lines
+
+
+# --- METRICS ---
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route"))
+HTTP_DB_QUERIES = Histogram("http_request_db_queries", "SQL statements sent per HTTP request.",
+                            ("method", "route"), QUERY_COUNT_BUCKETS)
+HTTP_DB_SECONDS = Histogram("http_request_db_duration_seconds", "Time per HTTP request spent in SQL statements.",
+                            ("method", "route"), QUERY_BUCKETS)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Duration of each SQL statement sent by this process.",
+                             buckets=QUERY_BUCKETS)
+DB_POOL = Gauge("db_pool_connections", "Database pool connections by state.", ("engine", "state"))
+DB_POOL_WAIT = CounterSnapshot("db_pool_wait_seconds_total", "Total time spent waiting for a pooled connection.", ("engine",))
+DB_POOL_TIMEOUTS = CounterSnapshot("db_pool_timeouts_total", "Pool checkouts that timed out.", ("engine",))
+DB_REPLICA_UP = Gauge("db_replica_up", "1 if the read replica passed its last health check.", ("engine",))
+DB_REPLICA_LAG = Gauge("db_replica_lag_seconds", "Replication lag measured by the last health check.", ("engine",))
+DB_READ_ROUTES = Counter("db_read_routes_total", "Routed read sessions by engine and reason.", ("engine", "reason"))
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Read-through cache lookups by result.", ("namespace", "result"))
+CACHE_LOOKUP_SECONDS = Histogram("cache_lookup_duration_seconds", "Latency of cache lookups served from Redis.",
+                                 ("namespace", "result"), QUERY_BUCKETS)
+CACHE_LOAD_SECONDS = Histogram("cache_load_duration_seconds", "Latency of cache misses, including the database load.",
+                               ("namespace",), LATENCY_BUCKETS)
+
+THREADPOOL_BUSY = Gauge("threadpool_threads_busy", "Threadpool threads running sync endpoints and run_in_threadpool calls.")
+THREADPOOL_LIMIT = Gauge("threadpool_threads_limit", "Threadpool size (anyio default limiter).")
+THREADPOOL_WAITING = Gauge("threadpool_tasks_waiting", "Calls queued for a free threadpool thread.")
+THREADPOOL_SATURATED = Counter("threadpool_saturated_requests_total",
+                               "Requests that arrived while every threadpool thread was busy.")
+
+TASK_SECONDS = SharedHistogram("celery_task_duration_seconds", "Celery task run time by task and final state.",
+                               ("task", "state"), TASK_BUCKETS)
+TASK_QUEUE_WAIT = SharedHistogram("celery_task_queue_wait_seconds", "Time from publishing a task to a worker starting it.",
+                                  ("task",), QUEUE_WAIT_BUCKETS)
+INVOICE_PAGES = SharedCounter("invoice_scan_pages_total", "PDF pages read by invoice scans.")
+INVOICE_PAGE_RATE = SharedHistogram("invoice_scan_pages_per_second", "Page throughput of each invoice scan.",
+                                    buckets=PAGE_RATE_BUCKETS)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text format. Call sample_threadpool() from the event loop first."""
+    from . import database
+    for engine_name, stats in database.pool_stats().items():
+        for state in ("checked_out", "checked_in", "overflow", "size"):
+            if state in stats:
+                DB_POOL.set(stats[state], (engine_name, state))
+        DB_POOL_WAIT.set(stats["wait_seconds_total"], (engine_name,))
+        DB_POOL_TIMEOUTS.set(stats["timeouts"], (engine_name,))
+        if "healthy" in stats:
+            DB_REPLICA_UP.set(int(stats["healthy"]), (engine_name,))
+            if stats["lag_seconds"] is not None:
+                DB_REPLICA_LAG.set(stats["lag_seconds"], (engine_name,))
+    shared = _shared_snapshot([m.name for m in _registry if m.shared])
+    lines = []
+    for metric in _registry:
+        lines += metric.lines(shared.get(metric.name)) if metric.shared else metric.lines()
+    return "\n".join(lines) + "\n"
+
+
+# --- THREADPOOL ---
+def sample_threadpool():
+    """Reads the anyio limiter that backs Starlette's threadpool; must run on the event loop."""
+    limiter = to_thread.current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_LIMIT.set(limiter.total_tokens)
+    THREADPOOL_WAITING.set(limiter.statistics().tasks_waiting)
+
+
+# --- HTTP ---
+# [statements, seconds] for the request being served; threadpool calls inherit the context
+_request_db = contextvars.ContextVar("request_db", default=None)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI: times each request and tallies its SQL statements under the
+    route template (not the raw path, which would explode label cardinality).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = to_thread.current_default_thread_limiter()
+        if limiter.borrowed_tokens >= limiter.total_tokens:
+            THREADPOOL_SATURATED.inc()
+
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        db_stats = [0, 0.0]
+        token = _request_db.set(db_stats)
+        start = time.perf_counter()
+        try:
+            if tracing.enabled():
+                with tracing.span(scope["method"], kind="server", **{"url.path": scope["path"]}) as span:
+                    try:
+                        await self.app(scope, receive, send_status)
+                    finally:
+                        self._name_span(span, scope, status[0])
+            else:
+                await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_db.reset(token)
+            labels = (scope["method"], _route(scope))
+            HTTP_REQUESTS.inc(labels + (str(status[0]),))
+            HTTP_LATENCY.observe(elapsed, labels)
+            HTTP_DB_QUERIES.observe(db_stats[0], labels)
+            HTTP_DB_SECONDS.observe(db_stats[1], labels)
+
+    @staticmethod
+    def _name_span(span, scope, status):
+        route = _route(scope)
+        span.update_name(f"{scope['method']} {route}")
+        span.set_attribute("http.request.method", scope["method"])
+        span.set_attribute("http.route", route)
+        span.set_attribute("http.response.status_code", status)
+
+
+def _route(scope):
+    # The router stores the matched route on the scope
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+# --- SQL ---
+# Statements are timed by subclassing the dialect's execution context rather than
+# with engine events: a single before/after_cursor_execute listener makes
+# SQLAlchemy walk every event collection on each statement, which costs more
+# than the measurement itself. pre_exec()/post_exec() bracket the cursor call.
+def _timed_context(base):
+    class TimedExecutionContext(base):
+        def pre_exec(self):
+            super().pre_exec()
+            self._metrics_span = None
+            if tracing.enabled():
+                self._metrics_span = tracing.start_span("db.query", kind="client", **{"db.statement": self.statement[:500]})
+            self._metrics_start = time.perf_counter()
+
+        def post_exec(self):
+            elapsed = time.perf_counter() - self._metrics_start
+            if self._metrics_span is not None:
+                self._metrics_span.end()
+            DB_QUERY_SECONDS.observe(elapsed)
+            stats = _request_db.get()
+            if stats is not None:
+                stats[0] += 1
+                stats[1] += elapsed
+            super().post_exec()
+    TimedExecutionContext.__name__ = f"Timed{base.__name__}"
+    return TimedExecutionContext
+
+
+def instrument_engine(engine):
+    """Times every SQL statement `engine` sends (pass async_engine.sync_engine for asyncio)."""
+    dialect = engine.dialect
+    if METRICS_ENABLED and not dialect.execution_ctx_cls.__name__.startswith("Timed"):
+        dialect.execution_ctx_cls = _timed_context(dialect.execution_ctx_cls)
+
+
+# --- CACHE ---
+def record_cache(namespace, result, seconds=None):
+    """Called by cache._record for every lookup outcome."""
+    CACHE_REQUESTS.inc((namespace, result))
+    if seconds is None:
+        return
+    if result == "misses":
+        CACHE_LOAD_SECONDS.observe(seconds, (namespace,))
+    else:
+        CACHE_LOOKUP_SECONDS.observe(seconds, (namespace, result))
+
+
+# --- CELERY ---
+_task_starts = {}
+
+
+def _stamp_published(headers=None, **kwargs):
+    # Runs in the publishing process; the worker reads it back as task.request.published_at
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+def _task_started(task_id=None, task=None, **kwargs):
+    published = getattr(task.request, "published_at", None)
+    if published:
+        TASK_QUEUE_WAIT.observe(max(0.0, time.time() - published), (task.name,))
+    span = tracing.start_span(f"celery {task.name}", kind="consumer", **{"celery.task_id": task_id})
+    _task_starts[task_id] = (time.perf_counter(), span)
+
+
+def _task_finished(task_id=None, task=None, state=None, **kwargs):
+    started = _task_starts.pop(task_id, None)
+    if started is None:
+        return
+    TASK_SECONDS.observe(time.perf_counter() - started[0], (task.name, state or "UNKNOWN"))
+    if started[1] is not None:
+        started[1].end()
+
+
+def record_invoice_scan(pages, seconds):
+    INVOICE_PAGES.inc(amount=pages)
+    if pages and seconds > 0:
+        INVOICE_PAGE_RATE.observe(pages / seconds)
+
+
+# --- INSTALL ---
+_celery_instrumented = False
+
+
+def instrument_celery():
+    """Connects the task signals; both the API (publishing) and the workers (running) need them."""
+    global _celery_instrumented
+    if not METRICS_ENABLED or _celery_instrumented:
+        return
+    _celery_instrumented = True
+    from celery import signals
+    signals.before_task_publish.connect(_stamp_published, weak=False)
+    signals.task_prerun.connect(_task_started, weak=False)
+    signals.task_postrun.connect(_task_finished, weak=False)
@@ -1,42 +1,142 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi import Request
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from jose import jwt, JWTError
-import os
-
-SECRET_KEY = os.getenv("SECRET_KEY", "prod_secret_88374_xyz_secure")
-ALGORITHM = "HS256"
-
-class RBACMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # 1. Define sensitive routes that require STRICT 'admin' role
-        # We protect the "approve/reject" endpoint specifically here as a layer of defense
-        # The path matches: /requests/{id}/approve or /requests/{id}/reject
-        path = request.url.path
-        if request.method == "PUT" and "/requests/" in path and ("/approve" in path or "/reject" in path):
-            
-            auth_header = request.headers.get("Authorization")
-            if not auth_header:
-                return JSONResponse(status_code=403, content={"detail": "Missing Authorization Header"})
-            
-            try:
-                # Extract "Bearer <token>"
-                parts = auth_header.split()
-                if len(parts) != 2 or parts[0].lower() != 'bearer':
-                     return JSONResponse(status_code=403, content={"detail": "Invalid Auth Header"})
-                
-                token = parts[1]
-                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-                role = payload.get("role")
-                
-                if role != "admin":
-                    return JSONResponse(
-                        status_code=403, 
-                        content={"detail": "RBAC Enforcement: Admin privileges required."}
-                    )
-                    
-            except (JWTError, ValueError):
-                return JSONResponse(status_code=403, content={"detail": "Invalid or expired credentials"})
-
-        response = await call_next(request)
-        return response
\ No newline at end of file
+from starlette.routing import Route
+from . import auth
+
+
+def require_roles(*roles):
+    """
+    Declares which user roles may call an endpoint. Place it *below* the route decorator:
+
+        @app.put("/requests/{req_id}/{action}")
+        @require_roles("admin")
+        def manage_request(...): ...
+
+    RBACMiddleware enforces it before the request reaches FastAPI, as a layer of
+    defense on top of the endpoint's own dependencies.
+    """
+    def decorator(endpoint):
+        endpoint.rbac_roles = frozenset(roles)
+        return endpoint
+    return decorator
+
+
+class _Node:
+    __slots__ = ("static", "param", "catch_all", "policies")
+
+    def __init__(self):
+        self.static = {}
+        self.param = None
+        self.catch_all = None
+        self.policies = {}
+
+
+class PolicyTable:
+    """
+    Segment trie of protected route templates. Only routes that declare roles are
+    inserted, so a lookup for an unprotected path usually stops at the first segment.
+    """
+
+    def __init__(self, routes):
+        self.root = _Node()
+        self.size = 0
+        for route in routes:
+            roles = getattr(getattr(route, "endpoint", None), "rbac_roles", None)
+            if roles is None or not isinstance(route, Route):
+                continue
+            for method in route.methods or ():
+                self._insert(route.path, method, roles)
+
+    def _insert(self, template, method, roles):
+        node = self.root
+        for segment in template.strip("/").split("/"):
+            if segment.startswith("{") and segment.endswith(":path}"):
+                node.catch_all = node.catch_all or _Node()
+                node = node.catch_all
+                break
+            if segment.startswith("{") and segment.endswith("}"):
+                node.param = node.param or _Node()
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+        node.policies[method] = roles
+        self.size += 1
+
+    def lookup(self, method, path):
+        """Returns the allowed roles for (method, path), or None if the route is unprotected."""
+        return self._match(self.root, path.strip("/").split("/"), 0, method)
+
+    def _match(self, node, segments, index, method):
+        if index == len(segments):
+            return node.policies.get(method)
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1, method)
+            if found is not None:
+                return found
+        if node.param is not None and segment:
+            found = self._match(node.param, segments, index + 1, method)
+            if found is not None:
+                return found
+        if node.catch_all is not None:
+            return node.catch_all.policies.get(method)
+        return None
+
+
+class RBACMiddleware:
+    """
+    Pure ASGI role enforcement. The policy table is compiled once from the app's
+    routes on the first request; unprotected routes cost a single trie lookup and
+    are passed straight through without wrapping the response stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.table = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.table is None:
+            self.table = PolicyTable(scope["app"].routes)
+
+        roles = self.table.lookup(scope["method"], scope["path"])
+        if roles is None:
+            await self.app(scope, receive, send)
+            return
+
+        denied = await self._check(Request(scope), roles)
+        if denied is not None:
+            await denied(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def _check(self, request, roles):
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            return JSONResponse(status_code=403, content={"detail": "Missing Authorization Header"})
+
+        # Extract "Bearer <token>"
+        parts = auth_header.split()
+        if len(parts) != 2 or parts[0].lower() != 'bearer':
+            return JSONResponse(status_code=403, content={"detail": "Invalid Auth Header"})
+
+        # The role comes from the user record (through the principal cache), not the
+        # token's claim, so promotions and demotions apply without a new login.
+        # The principal is cached for auth.get_current_user, so this adds no query.
+        try:
+            cache_key, principal = auth.claims_principal(request, parts[1])
+            if principal is None:
+                principal = await run_in_threadpool(auth.load_principal, cache_key)
+        except HTTPException:
+            return JSONResponse(status_code=403, content={"detail": "Invalid or expired credentials"})
+        if principal.role not in roles:
+            return JSONResponse(
+                status_code=403,
+                content={"detail": f"RBAC Enforcement: {' or '.join(sorted(roles)).capitalize()} privileges required."}
+            )
+        return None
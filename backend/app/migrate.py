@@ -0,0 +1,85 @@
+import re
+import time
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from . import catalog, database, models
+
+# Schema setup, run once per deploy before the API and workers start:
+#
+#     python -m app.migrate
+#
+# Importing app.main used to do this, which cost every uvicorn worker, test run
+# and autoscaled replica a schema round trip at boot.
+#
+# create_all() only creates missing tables, and the search DDL hooks in
+# models.py only fire for tables it creates. So for tables that already existed,
+# run() also adds every index declared on the models that the database lacks,
+# and applies the search DDL (pg_trgm/tsvector indexes on Postgres, FTS5 tables
+# and triggers on SQLite) when any object it creates is missing. Every step is
+# idempotent. Index builds on a large table lock writes to it while they run,
+# so run upgrades outside peak hours. Finally an empty vendor catalog gets the
+# built-in vendors that matching falls back to.
+
+_CREATED_NAME = re.compile(r"IF NOT EXISTS (\w+)")
+
+
+def _existing_objects(conn):
+    if conn.dialect.name == "sqlite":
+        return set(conn.execute(text("SELECT name FROM sqlite_master")).scalars())
+    if conn.dialect.name == "postgresql":
+        return set(conn.execute(text(
+            "SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = current_schema()"
+        )).scalars())
+    return set()
+
+
+def _add_missing_indexes(conn, tables):
+    existing = _existing_objects(conn)
+    created = []
+    for table in tables:
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(conn)
+                created.append(index.name)
+    return created
+
+
+def _apply_search_ddl(conn, tables):
+    existing = _existing_objects(conn)
+    applied = []
+    for table, statements in models.SEARCH_DDL.get(conn.dialect.name, {}).items():
+        if table not in tables:
+            continue
+        names = {name for statement in statements for name in _CREATED_NAME.findall(statement)}
+        if names <= existing:
+            continue
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+        applied.append(table.name)
+    return applied
+
+
+def run(engine=None):
+    """Brings the schema up to date; returns what was added to tables that already existed."""
+    engine = engine or database.engine
+    with engine.begin() as conn:
+        existing_tables = set(inspect(conn).get_table_names())
+        models.Base.metadata.create_all(bind=conn)
+        upgraded = [table for table in models.Base.metadata.sorted_tables if table.name in existing_tables]
+        changes = {
+            "indexes": _add_missing_indexes(conn, upgraded),
+            "search": _apply_search_ddl(conn, upgraded),
+        }
+        with Session(bind=conn) as db:
+            changes["vendors"] = catalog.seed_defaults(db)
+        return changes
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    changes = run()
+    print(f"[MIGRATE] Schema up to date ({time.perf_counter() - started:.2f}s); "
+          f"added {len(changes['indexes'])} indexes, search DDL on {changes['search'] or 'no existing tables'}, "
+          f"{changes['vendors']} default vendors")
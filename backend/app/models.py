@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, JSON, ForeignKey, Index, UniqueConstraint, DDL, event, func
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -10,8 +10,10 @@ class User(Base):
     hashed_password = Column(String)
     role = Column(String, default="employee") # 'admin' or 'employee'
     
-    requests = relationship("Request", back_populates="requester")
-    subscriptions = relationship("Subscription", back_populates="owner")
+    # Relationships never lazy-load: a response that touched one would run a query per
+    # row. Code that needs them asks for selectinload() in its query; anything else raises.
+    requests = relationship("Request", back_populates="requester", lazy="raise_on_sql")
+    subscriptions = relationship("Subscription", back_populates="owner", lazy="raise_on_sql")
 
 class Request(Base):
     __tablename__ = "requests"
@@ -23,7 +25,15 @@ class Request(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     requester_id = Column(Integer, ForeignKey("users.id"))
-    requester = relationship("User", back_populates="requests")
+    requester = relationship("User", back_populates="requests", lazy="raise_on_sql")
+
+    # Keyset pagination indexes for GET /requests (per-user and admin views)
+    __table_args__ = (
+        Index("ix_requests_requester_id_id", "requester_id", "id"),
+        Index("ix_requests_requester_created", "requester_id", "created_at", "id"),
+        Index("ix_requests_status_id", "status", "id"),
+        Index("ix_requests_created_id", "created_at", "id"),
+    )
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
@@ -36,4 +46,208 @@ class Subscription(Base):
     custom_attributes = Column(JSON, default={})
     
     owner_id = Column(Integer, ForeignKey("users.id"))
-    owner = relationship("User", back_populates="subscriptions")
\ No newline at end of file
+    owner = relationship("User", back_populates="subscriptions", lazy="raise_on_sql")
+
+    # Keyset pagination indexes for GET /subscriptions
+    __table_args__ = (
+        Index("ix_subscriptions_owner_id_id", "owner_id", "id"),
+        Index("ix_subscriptions_owner_renewal", "owner_id", "renewal_date", "id"),
+        Index("ix_subscriptions_owner_status_renewal", "owner_id", "status", "renewal_date", "id"),
+        # Org-wide upcoming renewals
+        Index("ix_subscriptions_status_renewal", "status", "renewal_date", "id"),
+        # Case-insensitive prefix range scans for /search/autocomplete
+        Index("ix_subscriptions_name_lower", func.lower(name)),
+    )
+
+class SpendRollup(Base):
+    # Spend totals per (owner, category, renewal month, status), maintained incrementally by analytics.record()
+    __tablename__ = "spend_rollups"
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    category = Column(String)
+    period = Column(String(7)) # Renewal month as YYYY-MM
+    status = Column(String)
+    total_cost = Column(Float, default=0.0)
+    sub_count = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("owner_id", "category", "period", "status", name="uq_spend_rollups_bucket"),
+        Index("ix_spend_rollups_status_period", "status", "period"),
+    )
+
+class RenewalAlert(Base):
+    # One per subscription per renewal date, created by the scan_renewals beat task
+    __tablename__ = "renewal_alerts"
+    id = Column(Integer, primary_key=True, index=True)
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id", ondelete="CASCADE"))
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    name = Column(String)
+    cost = Column(Float)
+    renewal_date = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("subscription_id", "renewal_date", name="uq_renewal_alerts_sub_date"),
+        Index("ix_renewal_alerts_owner_renewal", "owner_id", "renewal_date", "id"),
+    )
+
+class RenewalWindow(Base):
+    # Renewal days already scanned by scan_renewals; lets repeat runs skip them
+    __tablename__ = "renewal_windows"
+    day = Column(Date, primary_key=True)
+    processed_at = Column(DateTime)
+    alerts = Column(Integer, default=0) # Alerts created by the last scan of this day
+
+class SubscriptionVendor(Base):
+    # What the duplicate scan (duplicates.py) last saw of each subscription, plus the vendor it
+    # resolved to; rows that still match their subscription are skipped by the next scan
+    __tablename__ = "subscription_vendors"
+    subscription_id = Column(Integer, ForeignKey("subscriptions.id", ondelete="CASCADE"), primary_key=True)
+    owner_id = Column(Integer)
+    name = Column(String)
+    cost = Column(Float)
+    status = Column(String)
+    vendor = Column(String)
+
+    __table_args__ = (
+        Index("ix_subscription_vendors_vendor_owner", "vendor", "owner_id"),
+    )
+
+class VendorAlias(Base):
+    # Normalized name -> the vendor it belongs to: itself, a catalog vendor or a close spelling of one
+    __tablename__ = "vendor_aliases"
+    key = Column(String, primary_key=True)
+    vendor = Column(String, index=True)
+    name = Column(String) # Spelling first seen, shown for vendors outside the catalog
+
+class VendorGroup(Base):
+    # Org-wide totals per vendor; rows marked dirty are recomputed by the next duplicate scan
+    __tablename__ = "vendor_groups"
+    vendor = Column(String, primary_key=True)
+    name = Column(String)
+    category = Column(String, nullable=True)
+    in_catalog = Column(Boolean, default=False)
+    subscriptions = Column(Integer, default=0) # Active ones
+    owners = Column(Integer, default=0)
+    total_cost = Column(Float, default=0.0)
+    duplicate_cost = Column(Float, default=0.0) # Owners paying more than once for the vendor
+    estimated_savings = Column(Float, default=0.0)
+    dirty = Column(Boolean, default=True)
+    updated_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_vendor_groups_dirty", "dirty"),
+        Index("ix_vendor_groups_owners_savings", "owners", "estimated_savings"),
+    )
+
+class DuplicateScan(Base):
+    __tablename__ = "duplicate_scans"
+    id = Column(Integer, primary_key=True, index=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    catalog_version = Column(Integer, default=0) # A catalog change makes the next scan a full one
+    full = Column(Boolean, default=False)
+    rows_changed = Column(Integer, default=0)
+    vendors_updated = Column(Integer, default=0)
+
+class Vendor(Base):
+    __tablename__ = "vendors"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True)
+    category = Column(String, nullable=True)
+    aliases = Column(JSON, default=list) # Alternate spellings/SKUs, e.g. "Amazon Web Services" for AWS
+    price_pattern = Column(String, nullable=True) # Optional regex with one group capturing this vendor's price
+
+class VendorCatalog(Base):
+    # Single row (id=1) whose version is bumped on every catalog change so workers know to recompile
+    __tablename__ = "vendor_catalog"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0)
+
+class InvoiceUpload(Base):
+    # One row per distinct invoice (by content hash) per user, so re-uploads reuse the first scan
+    __tablename__ = "invoice_uploads"
+    id = Column(Integer, primary_key=True, index=True)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    sha256 = Column(String(64))
+    filename = Column(String)
+    size = Column(Integer)
+    task_id = Column(String, index=True)
+    status = Column(String, default="Queued") # Queued, Done, Failed
+    result = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("owner_id", "sha256", name="uq_invoice_uploads_owner_sha256"),
+    )
+
+
+# --- SEARCH INDEXES ---
+# Postgres: pg_trgm GIN indexes (similarity, word_similarity, LIKE) plus a tsvector
+# index over request details. SQLite (tests/dev): external-content FTS5 trigram
+# tables kept in sync by triggers. See search.py for the queries that use them.
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+_PG_SEARCH_DDL = {
+    Subscription.__table__: [
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_name_trgm ON subscriptions USING gin (lower(name) gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_category_trgm ON subscriptions USING gin (lower(category) gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_attrs_trgm ON subscriptions USING gin (lower(custom_attributes::text) gin_trgm_ops)",
+    ],
+    Request.__table__: [
+        "CREATE INDEX IF NOT EXISTS ix_requests_details_trgm ON requests USING gin (lower(details::text) gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_requests_details_fts ON requests USING gin (to_tsvector('simple', details::text))",
+    ],
+}
+
+
+def _fts5_ddl(table, columns):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    delete = f"INSERT INTO {table}_fts({table}_fts, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    insert = f"INSERT INTO {table}_fts(rowid, {cols}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({cols}, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END",
+        f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+    ]
+
+
+# Distinct lower(name) values with row counts: fuzzy name matching ranks this small
+# dictionary instead of every subscription row
+_SUBSCRIPTION_TERMS_DDL = [
+    "CREATE TABLE IF NOT EXISTS subscription_terms (term TEXT PRIMARY KEY, n INTEGER NOT NULL)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS subscription_terms_fts USING fts5(term, content='subscription_terms', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS subscription_terms_ai AFTER INSERT ON subscription_terms BEGIN "
+    "INSERT INTO subscription_terms_fts(rowid, term) VALUES (new.rowid, new.term); END",
+    "CREATE TRIGGER IF NOT EXISTS subscription_terms_ad AFTER DELETE ON subscription_terms BEGIN "
+    "INSERT INTO subscription_terms_fts(subscription_terms_fts, rowid, term) VALUES ('delete', old.rowid, old.term); END",
+    "CREATE TRIGGER IF NOT EXISTS subscriptions_terms_ai AFTER INSERT ON subscriptions WHEN new.name IS NOT NULL BEGIN "
+    "INSERT INTO subscription_terms(term, n) VALUES (lower(new.name), 1) ON CONFLICT(term) DO UPDATE SET n = n + 1; END",
+    "CREATE TRIGGER IF NOT EXISTS subscriptions_terms_ad AFTER DELETE ON subscriptions WHEN old.name IS NOT NULL BEGIN "
+    "UPDATE subscription_terms SET n = n - 1 WHERE term = lower(old.name); "
+    "DELETE FROM subscription_terms WHERE term = lower(old.name) AND n <= 0; END",
+    "CREATE TRIGGER IF NOT EXISTS subscriptions_terms_au AFTER UPDATE OF name ON subscriptions BEGIN "
+    "UPDATE subscription_terms SET n = n - 1 WHERE term = lower(old.name); "
+    "DELETE FROM subscription_terms WHERE term = lower(old.name) AND n <= 0; "
+    "INSERT INTO subscription_terms(term, n) SELECT lower(new.name), 1 WHERE new.name IS NOT NULL "
+    "ON CONFLICT(term) DO UPDATE SET n = n + 1; END",
+    "INSERT INTO subscription_terms(term, n) SELECT lower(name), count(*) FROM subscriptions "
+    "WHERE name IS NOT NULL GROUP BY lower(name) ON CONFLICT(term) DO NOTHING",
+]
+
+_SQLITE_SEARCH_DDL = {
+    Subscription.__table__: _fts5_ddl("subscriptions", ["name", "category", "custom_attributes"]) + _SUBSCRIPTION_TERMS_DDL,
+    Request.__table__: _fts5_ddl("requests", ["type", "details"]),
+}
+
+# New tables get these from the after_create hooks; migrate.py applies them to tables that already existed
+SEARCH_DDL = {"postgresql": _PG_SEARCH_DDL, "sqlite": _SQLITE_SEARCH_DDL}
+
+for _dialect, _ddl in SEARCH_DDL.items():
+    for _table, _statements in _ddl.items():
+        for _statement in _statements:
+            event.listen(_table, "after_create", DDL(_statement).execute_if(dialect=_dialect))
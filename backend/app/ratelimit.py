@@ -0,0 +1,125 @@
+import ipaddress
+import os
+import threading
+import redis
+
+from . import cache, logs
+
+log = logs.get_logger(__name__)
+
+# Login rate limiting: fixed windows in Redis over *failed* attempts, one counter
+# per username and one per client IP, shared by every API process. Counters live
+# under login:* in the cache Redis. Successful logins never count, so a whole
+# office behind one NAT or proxy can sign in at 9am without filling its IP's
+# bucket. When Redis is unreachable logins are let through (fail open) rather
+# than locking everyone out.
+
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+LOGIN_LIMIT_PER_USER = int(os.getenv("LOGIN_LIMIT_PER_USER", "10"))   # 0 disables
+LOGIN_LIMIT_PER_IP = int(os.getenv("LOGIN_LIMIT_PER_IP", "100"))      # 0 disables
+# Peers whose X-Forwarded-For is believed (load balancers, ingress). Private and
+# loopback ranges by default; set it to "" when the API is exposed directly.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(net.strip())
+    for net in os.getenv("TRUSTED_PROXIES", "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7").split(",")
+    if net.strip()
+]
+
+_stats_lock = threading.Lock()
+_stats = {"checked": 0, "limited": 0, "errors": 0}
+
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in net for net in TRUSTED_PROXIES)
+
+
+def client_ip(request) -> str:
+    """
+    The address the login came from. Behind trusted proxies that is the
+    right-most X-Forwarded-For entry not added by one of them; entries further
+    left were written by the client and could be anything.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not _trusted(peer):
+        return peer
+    hops = [hop.strip() for hop in ",".join(request.headers.getlist("x-forwarded-for")).split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+def _keys(username: str, ip: str):
+    keys = []
+    if LOGIN_LIMIT_PER_USER:
+        keys.append((f"login:user:{username.lower()}", LOGIN_LIMIT_PER_USER))
+    if LOGIN_LIMIT_PER_IP:
+        keys.append((f"login:ip:{ip}", LOGIN_LIMIT_PER_IP))
+    return keys
+
+
+async def check_login(username: str, ip: str) -> int:
+    """Runs before the password check; returns 0 if allowed, else seconds until the window resets."""
+    keys = _keys(username, ip)
+    if not keys or cache.async_client is None:
+        return 0
+    _count("checked")
+    try:
+        pipe = cache.async_client.pipeline(transaction=False)
+        for key, _ in keys:
+            pipe.get(key)
+            pipe.ttl(key)
+        replies = await pipe.execute()
+    except redis.RedisError as e:
+        _count("errors")
+        log.warning("Redis unavailable, not limiting logins", extra={"error": str(e)})
+        return 0
+    retry_after = 0
+    for i, (_, limit) in enumerate(keys):
+        failures, ttl = int(replies[i * 2] or 0), replies[i * 2 + 1]
+        if failures >= limit:
+            retry_after = max(retry_after, ttl if ttl > 0 else LOGIN_WINDOW_SECONDS)
+    if retry_after:
+        _count("limited")
+    return retry_after
+
+
+async def record_failure(username: str, ip: str):
+    """Counts a wrong password against both the username and the IP."""
+    keys = _keys(username, ip)
+    if not keys or cache.async_client is None:
+        return
+    try:
+        pipe = cache.async_client.pipeline(transaction=False)
+        for key, _ in keys:
+            pipe.set(key, 0, ex=LOGIN_WINDOW_SECONDS, nx=True)
+            pipe.incr(key)
+        await pipe.execute()
+    except redis.RedisError as e:
+        _count("errors")
+        log.warning("Could not record failed login", extra={"username": username, "error": str(e)})
+
+
+async def reset_user(username: str):
+    """A successful login clears the user's failed attempts (the IP counter keeps running)."""
+    if not LOGIN_LIMIT_PER_USER or cache.async_client is None:
+        return
+    try:
+        await cache.async_client.delete(f"login:user:{username.lower()}")
+    except redis.RedisError as e:
+        _count("errors")
+        log.warning("Could not reset login counter", extra={"username": username, "error": str(e)})
@@ -0,0 +1,124 @@
+import os
+from datetime import datetime, time, timedelta
+from importlib import import_module
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import events, logs, models
+
+log = logs.get_logger(__name__)
+
+# Renewal scheduler (run by Celery beat, see worker.py).
+#
+# The look-ahead window is split into calendar days. Each day is scanned with
+# keyset batches over the (status, renewal_date, id) index and then recorded in
+# renewal_windows, so the next run skips it. A processed day is scanned again
+# once it is older than RENEWAL_RESCAN_HOURS, which picks up subscriptions
+# created or moved into it since. Alerts are unique per (subscription, renewal
+# date), so a rescan or a run that crashed halfway never creates duplicates.
+# Today's window starts at the time of the run, not at midnight: renewals that
+# already happened earlier today are not upcoming any more.
+
+RENEWAL_WINDOW_DAYS = int(os.getenv("RENEWAL_WINDOW_DAYS", "30"))
+RENEWAL_BATCH_SIZE = int(os.getenv("RENEWAL_BATCH_SIZE", "5000"))
+RENEWAL_RESCAN_HOURS = float(os.getenv("RENEWAL_RESCAN_HOURS", "24"))
+
+
+def iter_due(db: Session, start: datetime, end: datetime, batch_size=RENEWAL_BATCH_SIZE):
+    """Yields batches of Active subscriptions renewing in [start, end), keyset-paginated on (renewal_date, id)."""
+    s = models.Subscription
+    stmt = (
+        select(s.id, s.owner_id, s.name, s.cost, s.renewal_date)
+        .where(s.status == "Active", s.renewal_date >= start, s.renewal_date < end)
+        .order_by(s.renewal_date, s.id)
+        .limit(batch_size)
+    )
+    last = None
+    while True:
+        page = stmt if last is None else stmt.where(tuple_(s.renewal_date, s.id) > last)
+        rows = db.execute(page).all()
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last = (rows[-1].renewal_date, rows[-1].id)
+
+
+def _insert_alerts(db: Session, alerts):
+    table = models.RenewalAlert.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        # A concurrent run may have created some of them in the meantime
+        stmt = import_module(f"sqlalchemy.dialects.{dialect}").insert(table).on_conflict_do_nothing(
+            index_elements=["subscription_id", "renewal_date"]
+        )
+    else:
+        stmt = insert(table)
+    db.execute(stmt, alerts)
+
+
+def create_alerts(db: Session, rows, now: datetime):
+    """Creates alerts for the rows that don't have one for this renewal date yet; returns the new ones. Caller commits."""
+    a = models.RenewalAlert
+    existing = set(db.execute(
+        select(a.subscription_id, a.renewal_date).where(a.subscription_id.in_([r.id for r in rows]))
+    ).all())
+    alerts = [
+        {"subscription_id": r.id, "owner_id": r.owner_id, "name": r.name, "cost": r.cost,
+         "renewal_date": r.renewal_date, "created_at": now}
+        for r in rows if (r.id, r.renewal_date) not in existing
+    ]
+    if alerts:
+        _insert_alerts(db, alerts)
+    return alerts
+
+
+def _notify(alerts):
+    by_owner = {}
+    for alert in alerts:
+        by_owner.setdefault(alert["owner_id"], []).append(alert["subscription_id"])
+    events.publish_many([
+        (owner_id, "renewal.due", {"count": len(ids), "subscription_ids": ids})
+        for owner_id, ids in by_owner.items()
+    ])
+
+
+def scan_renewals(db: Session, days=RENEWAL_WINDOW_DAYS, now: datetime = None,
+                  batch_size=RENEWAL_BATCH_SIZE, rescan_hours=RENEWAL_RESCAN_HOURS):
+    """
+    Creates alerts for Active subscriptions renewing in the next `days` days.
+    Memory is bounded by batch_size; every batch commits on its own.
+    """
+    now = now or datetime.utcnow()
+    today = now.date()
+    w = models.RenewalWindow
+    # Days that have slid into the past are never looked at again
+    db.execute(delete(w).where(w.day < today))
+    processed = dict(db.execute(select(w.day, w.processed_at).where(w.day < today + timedelta(days=days))).all())
+    db.commit()
+
+    fresh_after = now - timedelta(hours=rescan_hours)
+    summary = {"days_scanned": 0, "days_skipped": 0, "subscriptions": 0, "alerts": 0}
+    for offset in range(days):
+        day = today + timedelta(days=offset)
+        if day in processed and processed[day] > fresh_after:
+            summary["days_skipped"] += 1
+            continue
+
+        start = datetime.combine(day, time.min)
+        end = start + timedelta(days=1)
+        created = 0
+        for rows in iter_due(db, max(start, now), end, batch_size):
+            alerts = create_alerts(db, rows, now)
+            db.commit()
+            _notify(alerts)
+            summary["subscriptions"] += len(rows)
+            created += len(alerts)
+
+        db.merge(models.RenewalWindow(day=day, processed_at=now, alerts=created))
+        db.commit()
+        summary["days_scanned"] += 1
+        summary["alerts"] += created
+
+    log.info("Renewal scan finished", extra=summary)
+    return summary
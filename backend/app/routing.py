@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from fastapi.concurrency import run_in_threadpool
+import redis
+
+from . import cache, database, logs, metrics
+
+log = logs.get_logger(__name__)
+
+# Workload-aware session dispatch for the read-only list and export endpoints.
+#
+# With DATABASE_REPLICA_URLS set, /subscriptions, /requests and /export read
+# through session_factory() (async_session_factory() for the DB_ASYNC=1 list
+# routes), which hands out a session on a healthy, caught-up replica
+# (database.pick_replica). Everything else, writes and Celery tasks
+# included, keeps using database.SessionLocal on the primary.
+#
+# Read-your-writes: each write path calls record_write() for the cache scopes
+# it invalidates, and reads of a pinned scope go to the primary for
+# READ_YOUR_WRITES_SECONDS. Pins are Redis keys, so they hold across API
+# processes and for writes made by workers. Because they follow cache scopes
+# and are set before the invalidation, a page re-cached under the new cache
+# generation is always read from the primary, so the cache never stores a
+# lagging replica's copy for its TTL. (A replica read that lands before the pin
+# is cached under the old generation, which the invalidation discards.)
+# Keep the window above DB_REPLICA_MAX_LAG: once it ends, replicas in use are
+# at most that far behind.
+
+READ_YOUR_WRITES_SECONDS = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
+
+# Also kept in-process, so this process's own writes stay pinned if Redis is down
+_local_pins = {}
+_local_lock = threading.Lock()
+
+
+def _pin_key(namespace, scope):
+    return f"db:pin:{namespace}:{scope}"
+
+
+def record_write(namespace, scope):
+    """Pins reads of the scope to the primary; a no-op without replicas."""
+    if not database.replicas:
+        return
+    now = time.monotonic()
+    with _local_lock:
+        if len(_local_pins) > 1024:
+            for key in [key for key, expires in _local_pins.items() if expires <= now]:
+                del _local_pins[key]
+        _local_pins[(namespace, scope)] = now + READ_YOUR_WRITES_SECONDS
+    if cache.client is None:
+        return
+    try:
+        cache.client.set(_pin_key(namespace, scope), 1, ex=READ_YOUR_WRITES_SECONDS)
+    except redis.RedisError as e:
+        log.warning("Could not pin scope to the primary", extra={"namespace": namespace, "scope": scope, "error": str(e)})
+
+
+def pinned(namespace, scope) -> bool:
+    with _local_lock:
+        expires = _local_pins.get((namespace, scope))
+    if expires is not None and expires > time.monotonic():
+        return True
+    if cache.client is None:
+        return False
+    try:
+        return bool(cache.client.exists(_pin_key(namespace, scope)))
+    except redis.RedisError:
+        # Can't tell whether another process just wrote; stay consistent
+        return True
+
+
+def _route(namespace, scope):
+    """The replica a read of this cache scope should use, or None for the primary."""
+    if pinned(namespace, scope):
+        engine_name, reason, replica = "primary", "pinned", None
+    else:
+        replica = database.pick_replica()
+        if replica is None:
+            engine_name, reason = "primary", "no_replica"
+        else:
+            engine_name, reason = replica.name, "replica"
+    metrics.DB_READ_ROUTES.inc((engine_name, reason))
+    return replica
+
+
+def session_factory(namespace, scope):
+    """The sessionmaker a read of this cache scope should use: a replica's, or the primary's."""
+    if not database.replicas:
+        return database.SessionLocal
+    replica = _route(namespace, scope)
+    return database.SessionLocal if replica is None else replica.Session
+
+
+async def async_session_factory(namespace, scope):
+    """asyncio twin of session_factory() for the DB_ASYNC=1 routes."""
+    if not database.replicas:
+        return database.AsyncSessionLocal
+    # The pin lookup and the replica health check block, so keep them off the event loop
+    replica = await run_in_threadpool(_route, namespace, scope)
+    return database.AsyncSessionLocal if replica is None else replica.async_session()
+
+
+@contextmanager
+def read_session(namespace, scope):
+    db = session_factory(namespace, scope)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def async_read_session(namespace, scope):
+    factory = await async_session_factory(namespace, scope)
+    async with factory() as db:
+        yield db
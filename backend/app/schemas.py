@@ -18,6 +18,10 @@ class Token(BaseModel):
     token_type: str
     role: str # Important for Frontend to know if Admin
 
+class StreamToken(BaseModel):
+    stream_token: str
+    expires_in: int
+
 class RequestCreate(BaseModel):
     type: str 
     details: Dict[str, Any]
@@ -46,6 +50,134 @@ class SubscriptionOut(SubscriptionCreate):
     class Config:
         from_attributes = True
 
+class SubscriptionPatch(BaseModel):
+    name: Optional[str] = None
+    cost: Optional[float] = None
+    category: Optional[str] = None
+    renewal_date: Optional[datetime] = None
+    status: Optional[str] = None
+    custom_attributes: Optional[Dict[str, Any]] = None
+
+class BulkIds(BaseModel):
+    ids: List[int]
+
+class BulkUpdate(BulkIds):
+    changes: SubscriptionPatch
+
+class BulkRowError(BaseModel):
+    row: int # 1-based position in the upload (CSV header not counted)
+    error: str
+
+class BulkImportResult(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[BulkRowError]
+
+class BulkMutationResult(BaseModel):
+    matched: int
+    missing_ids: List[int]
+
+class VendorCreate(BaseModel):
+    name: str
+    category: Optional[str] = None
+    aliases: List[str] = []
+    price_pattern: Optional[str] = None
+
+class VendorOut(VendorCreate):
+    id: int
+    class Config:
+        from_attributes = True
+
+class TaskProgress(BaseModel):
+    pages_parsed: int
+    vendors_found: int
+
+class TaskStatus(BaseModel):
+    task_id: str
+    state: str                  # Celery state: PENDING, STARTED, PROGRESS, SUCCESS, FAILURE
+    status: str                 # Upload status: Queued, Done, Failed
+    progress: Optional[TaskProgress] = None
+    result: Optional[str] = None
+
+class CategorySpend(BaseModel):
+    category: str
+    total_cost: float
+    count: int
+
+class UserSpend(BaseModel):
+    owner_id: int
+    username: str
+    total_cost: float
+    count: int
+
+class MonthSpend(BaseModel):
+    month: str  # YYYY-MM
+    total_cost: float
+    count: int
+
+class RenewalOut(BaseModel):
+    id: int
+    name: str
+    cost: Optional[float] = None
+    category: Optional[str] = None
+    renewal_date: datetime
+    owner_id: int
+
+class RenewalAlertOut(BaseModel):
+    id: int
+    subscription_id: int
+    name: Optional[str] = None
+    cost: Optional[float] = None
+    renewal_date: datetime
+    created_at: datetime
+    class Config:
+        from_attributes = True
+
+class VendorGroupOut(BaseModel):
+    vendor: str
+    name: str
+    category: Optional[str] = None
+    in_catalog: bool
+    subscriptions: int
+    owners: int
+    total_cost: float
+    duplicate_cost: float
+    estimated_savings: float
+    updated_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+class VendorGroupMember(BaseModel):
+    id: int
+    name: Optional[str] = None
+    cost: Optional[float] = None
+    status: Optional[str] = None
+    owner_id: Optional[int] = None
+
+class SubscriptionHit(BaseModel):
+    id: int
+    name: str
+    category: Optional[str] = None
+    owner_id: int
+    score: float
+
+class RequestHit(BaseModel):
+    id: int
+    type: str
+    status: str
+    requester_id: int
+    details: Dict[str, Any]
+    score: float
+
+class SearchResults(BaseModel):
+    subscriptions: List[SubscriptionHit] = []
+    requests: List[RequestHit] = []
+
+class NameSuggestion(BaseModel):
+    name: str
+    count: int
+
 class ChatRequest(BaseModel):
     message: str
     context: Optional[str] = None
\ No newline at end of file
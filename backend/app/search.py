@@ -0,0 +1,314 @@
+import os
+import re
+import orjson
+from sqlalchemy import Text, cast, func, literal, literal_column, or_, select, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .catalog import normalize
+
+# Fuzzy search over subscriptions and requests.
+#
+# Candidates come from an index: pg_trgm/tsvector on Postgres, the FTS5
+# trigram tables on SQLite (both declared in models.py). Subscription names
+# (and categories on Postgres) match with typos; attributes and the rest match
+# as substrings. On SQLite, typo matching ranks the small dictionary of
+# distinct names (subscription_terms) and then fetches rows through the
+# lower(name) index; ranking trigram overlap across every row would cost time
+# proportional to the table. Candidates are scored here with the same trigram
+# similarity pg_trgm uses, which gives one ranking on both backends and
+# tolerates typos ("figam") and extra words ("figma pro"). Databases created
+# before these indexes existed get them from `python -m app.migrate`.
+
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "1000"))
+FUZZY_TERMS = int(os.getenv("SEARCH_FUZZY_TERMS", "200"))   # dictionary names ranked per query (SQLite)
+MAX_FUZZY_TERMS = 50                                        # of which the best are expanded to rows
+MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", "0.3"))
+MAX_FIELD_CHARS = 500
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+# --- SCORING ---
+def trigrams(value: str) -> set:
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing."""
+    grams = set()
+    for word in _WORD.findall(value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def similarity(a: str, b: str) -> float:
+    return _jaccard(trigrams(a), trigrams(b))
+
+
+class Scorer:
+    """
+    Scores field values against one query: 1.0 for an exact match, 0.9 when the
+    query is a substring, otherwise the best trigram similarity between the query
+    and the whole value or any run of consecutive words in it (cf. pg_trgm
+    word_similarity). Anything below MIN_SCORE scores 0. Memoized: candidate
+    rows repeat the same values a lot.
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.grams = trigrams(query)
+        words = len(_WORD.findall(query))
+        self.widths = sorted({max(1, words - 1), words, words + 1})
+        self.needed = MIN_SCORE * len(self.grams)
+        self._memo = {}
+
+    def _similarity(self, lowered: str) -> float:
+        words = _WORD.findall(lowered)
+        # Upper bound first: no run of words can share more trigrams with the
+        # query than the whole value does, and most candidates fall short
+        padded = "".join(f"  {word} " for word in words)
+        if sum(gram in padded for gram in self.grams) < self.needed:
+            return 0.0
+        word_grams = [trigrams(word) for word in words]
+        whole = set().union(*word_grams)
+        if not whole & self.grams:
+            return 0.0
+        best = _jaccard(self.grams, whole)
+        for width in self.widths:
+            for start in range(len(word_grams) - width + 1):
+                best = max(best, _jaccard(self.grams, set().union(*word_grams[start:start + width])))
+        return best
+
+    def __call__(self, *values) -> float:
+        lowered = [value[:MAX_FIELD_CHARS].lower() for value in values if value]
+        # Substring hits are cheap to spot and outrank any fuzzy score
+        for value in lowered:
+            if self.query in value:
+                return 1.0 if value == self.query else 0.9
+        best = 0.0
+        for value in lowered:
+            score = self._memo.get(value)
+            if score is None:
+                score = self._memo[value] = self._similarity(value)
+            best = max(best, score)
+        return best
+
+
+def json_text(value) -> str:
+    """Searchable text of a JSON column (decoded, or as stored): the scalar values, keys left out."""
+    if isinstance(value, (str, bytes)):
+        try:
+            value = orjson.loads(value)
+        except orjson.JSONDecodeError:
+            return value if isinstance(value, str) else value.decode()
+    return _scalars_text(value)
+
+
+def _scalars_text(value) -> str:
+    if isinstance(value, dict):
+        return " ".join(_scalars_text(v) for v in value.values())
+    if isinstance(value, list):
+        return " ".join(_scalars_text(v) for v in value)
+    return "" if value is None else str(value)
+
+
+def _ranked(hits, limit):
+    hits = [hit for hit in hits if hit["score"] >= MIN_SCORE]
+    hits.sort(key=lambda hit: (-hit["score"], hit["id"]))
+    return hits[:limit]
+
+
+# --- CANDIDATES ---
+def _contains(query: str) -> str:
+    """LIKE pattern for query as a literal substring; use with escape="\\"."""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _fts_phrase(query: str, columns=None) -> str:
+    # A quoted string on a trigram table is an indexed substring match
+    phrase = '"' + query.replace('"', '""') + '"'
+    return phrase if not columns else "{" + " ".join(columns) + "}: " + phrase
+
+
+def _fts_any_trigram(query: str) -> str:
+    # Any shared trigram makes a row a candidate; FTS5 ranks rows sharing more of them first
+    grams = {query[i:i + 3] for i in range(len(query) - 2)} or {query}
+    return " OR ".join('"' + gram.replace('"', '""') + '"' for gram in sorted(grams))
+
+
+def _fuzzy_terms(db: Session, query: str, score):
+    """Best-scoring distinct subscription names (lowercased) from the SQLite term dictionary."""
+    terms = db.execute(text(
+        "SELECT t.term FROM subscription_terms_fts f JOIN subscription_terms t ON t.rowid = f.rowid "
+        "WHERE subscription_terms_fts MATCH :match ORDER BY f.rank LIMIT :n"
+    ), {"match": _fts_any_trigram(query), "n": FUZZY_TERMS}).scalars()
+    scored = sorted(((score(term), term) for term in terms), reverse=True)
+    return [term for value, term in scored[:MAX_FUZZY_TERMS] if value >= MIN_SCORE]
+
+
+def _sqlite_subscription_candidates(db: Session, query: str, owner_id, limit):
+    s = models.Subscription
+    # Attributes as stored JSON text: json_text() parses it faster than the JSON type would
+    columns = select(s.id, s.name, s.category, s.owner_id, cast(s.custom_attributes, Text).label("custom_attributes"))
+    if owner_id is None:
+        # Org-wide substring matches come straight from the FTS index
+        rows = db.execute(text(
+            "SELECT t.id, t.name, t.category, t.owner_id, t.custom_attributes FROM subscriptions_fts f "
+            "JOIN subscriptions t ON t.id = f.rowid WHERE subscriptions_fts MATCH :match LIMIT :n"
+        ), {"match": _fts_phrase(query, ["name", "category", "custom_attributes"]), "n": SEARCH_CANDIDATES}).mappings().all()
+    else:
+        # One user's rows are few: filter them through the owner index
+        like = _contains(query)
+        rows = db.execute(columns.where(s.owner_id == owner_id, or_(
+            func.lower(s.name).like(like, escape="\\"), func.lower(s.category).like(like, escape="\\"),
+            func.lower(cast(s.custom_attributes, Text)).like(like, escape="\\"),
+        )).limit(SEARCH_CANDIDATES)).mappings().all()
+    if len(rows) >= limit:
+        # Substring hits score at least 0.9, which no typo match outranks
+        return rows
+
+    terms = _fuzzy_terms(db, query, Scorer(query))
+    if terms:
+        stmt = columns.where(func.lower(s.name).in_(terms))
+        if owner_id is not None:
+            stmt = stmt.where(s.owner_id == owner_id)
+        rows += db.execute(stmt.limit(SEARCH_CANDIDATES)).mappings().all()
+    return rows
+
+
+def _sqlite_request_candidates(db: Session, query: str, owner_id):
+    if owner_id is not None:
+        # One user's requests: read them through the requester index and let the scorer judge
+        r = models.Request
+        return db.execute(
+            select(r.id, r.type, r.status, r.requester_id, cast(r.details, Text).label("details"))
+            .where(r.requester_id == owner_id).order_by(r.id.desc()).limit(SEARCH_CANDIDATES)
+        ).mappings().all()
+    select_list = "SELECT t.id, t.type, t.status, t.requester_id, t.details FROM requests_fts f JOIN requests t ON t.id = f.rowid"
+    rows = db.execute(text(f"{select_list} WHERE requests_fts MATCH :match LIMIT :n"),
+                      {"match": _fts_phrase(query), "n": SEARCH_CANDIDATES}).mappings().all()
+    if not rows:
+        # No exact substring anywhere: fall back to ranked trigram overlap for typos
+        rows = db.execute(text(f"{select_list} WHERE requests_fts MATCH :match ORDER BY f.rank LIMIT :n"),
+                          {"match": _fts_any_trigram(query), "n": SEARCH_CANDIDATES}).mappings().all()
+    return rows
+
+
+def _pg_subscription_candidates(db: Session, query: str, owner_id):
+    s = models.Subscription
+    name, category = func.lower(s.name), func.lower(s.category)
+    attrs = func.lower(cast(s.custom_attributes, Text))
+    q = literal(query)
+    stmt = (
+        select(s.id, s.name, s.category, s.owner_id, s.custom_attributes)
+        .where(or_(q.op("<%")(name), q.op("<%")(category), attrs.like(_contains(query), escape="\\")))
+        .order_by(func.word_similarity(q, name).desc())
+        .limit(SEARCH_CANDIDATES)
+    )
+    if owner_id is not None:
+        stmt = stmt.where(s.owner_id == owner_id)
+    return db.execute(stmt).mappings().all()
+
+
+def _pg_request_candidates(db: Session, query: str, owner_id):
+    r = models.Request
+    details = cast(r.details, Text)
+    document = func.to_tsvector(literal_column("'simple'"), details)
+    q = literal(query)
+    stmt = (
+        select(r.id, r.type, r.status, r.requester_id, r.details)
+        .where(or_(q.op("<%")(func.lower(details)), document.op("@@")(func.plainto_tsquery(literal_column("'simple'"), q))))
+        .order_by(func.word_similarity(q, func.lower(details)).desc())
+        .limit(SEARCH_CANDIDATES)
+    )
+    if owner_id is not None:
+        stmt = stmt.where(r.requester_id == owner_id)
+    return db.execute(stmt).mappings().all()
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+# --- QUERIES ---
+def search_subscriptions(db: Session, query: str, owner_id=None, limit=20):
+    query = normalize(query)
+    if not query:
+        return []
+    if _is_postgres(db):
+        rows = _pg_subscription_candidates(db, query, owner_id)
+    else:
+        rows = _sqlite_subscription_candidates(db, query, owner_id, limit)
+    score = Scorer(query)
+    # Both candidate passes can return the same row
+    rows = {row["id"]: row for row in rows}.values()
+    return _ranked([
+        {"id": row["id"], "name": row["name"], "category": row["category"], "owner_id": row["owner_id"],
+         "score": round(score(row["name"], row["category"], json_text(row["custom_attributes"])), 3)}
+        for row in rows
+    ], limit)
+
+
+def search_requests(db: Session, query: str, owner_id=None, limit=20):
+    query = normalize(query)
+    if not query:
+        return []
+    if _is_postgres(db):
+        rows = _pg_request_candidates(db, query, owner_id)
+    else:
+        rows = _sqlite_request_candidates(db, query, owner_id)
+    score = Scorer(query)
+    hits = []
+    for row in rows:
+        details = row["details"]
+        if isinstance(details, (str, bytes)):
+            details = orjson.loads(details)
+        hits.append({"id": row["id"], "type": row["type"], "status": row["status"], "requester_id": row["requester_id"],
+                     "details": details, "score": round(score(json_text(details), row["type"]), 3)})
+    return _ranked(hits, limit)
+
+
+def _sqlite_top_terms(db: Session, prefix: str, upper: str, limit: int):
+    # The name dictionary holds one row per distinct name, so "f" ranges over a
+    # few hundred terms rather than every subscription named f...
+    terms = db.execute(text(
+        "SELECT term, n FROM subscription_terms WHERE term >= :prefix AND term < :upper ORDER BY n DESC, term LIMIT :n"
+    ), {"prefix": prefix, "upper": upper, "n": limit}).all()
+    if not terms:
+        return []
+    # One spelling as users typed it per term: an index probe each, in one statement
+    s = models.Subscription
+    names = db.execute(select(*[
+        select(s.name).where(func.lower(s.name) == term).limit(1).scalar_subquery() for term, _ in terms
+    ])).one()
+    return [{"name": name or term, "count": n} for (term, n), name in zip(terms, names)]
+
+
+def autocomplete(db: Session, prefix: str, owner_id=None, limit=10):
+    """
+    Distinct subscription names starting with prefix (case-insensitive), most
+    common first. A range scan on the lower(name) index (org-wide on SQLite: on
+    the name dictionary) or, for one user, on their rows.
+    """
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    if owner_id is None and not _is_postgres(db):
+        return _sqlite_top_terms(db, prefix, upper, limit)
+    s = models.Subscription
+    lowered = func.lower(s.name)
+    count = func.count()
+    stmt = (
+        select(func.min(s.name), count)
+        .where(lowered >= prefix, lowered < upper)
+        .group_by(lowered)
+        .order_by(count.desc(), lowered)
+        .limit(limit)
+    )
+    if owner_id is not None:
+        stmt = stmt.where(s.owner_id == owner_id)
+    return [{"name": name, "count": n} for name, n in db.execute(stmt)]
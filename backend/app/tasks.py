@@ -1,100 +1,226 @@
 from .worker import celery_app
 from .database import SessionLocal
 from .models import Subscription
+from . import analytics, cache, catalog, duplicates, events, logs, metrics, renewals, routing, uploads
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import insert, select
+import multiprocessing
 import os
-import re
+import threading
+import time
+from datetime import datetime
 from pypdf import PdfReader
 
-@celery_app.task(name="scan_invoice")
-def scan_invoice(file_path: str, user_id: int):
+# Documents with more pages than this are split across a process pool
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("SCAN_PARALLEL_PAGES", "20"))
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+log = logs.get_logger(__name__)
+
+# --- PDF EXTRACTION ---
+def _extract_range(file_path, start, stop):
+    # Runs in a pool process: each one opens its own reader
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+# One extraction pool per worker process, created on first use and shared by
+# every task it runs. Celery's prefork children are daemonic and may not start
+# processes, which is why worker.py selects the threads pool.
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_unavailable = False
+
+
+def _scan_pool(workers):
+    with _pools_lock:
+        if _pools_unavailable:
+            return None
+        if workers not in _pools:
+            # spawn, not fork: forking a process with live worker threads is unsafe
+            _pools[workers] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pools[workers]
+
+
+def _drop_pool(workers, error):
+    global _pools_unavailable
+    with _pools_lock:
+        pool = _pools.pop(workers, None)
+        if isinstance(error, AssertionError):
+            # Daemonic process: this will never work here, so stop trying (and warning)
+            _pools_unavailable = True
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_page_texts(file_path, workers=SCAN_WORKERS, threshold=PARALLEL_PAGE_THRESHOLD):
+    """Yields page texts in order; large documents are extracted in parallel chunks."""
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+    done = 0
+
+    pool = _scan_pool(workers) if workers > 1 and page_count > threshold else None
+    if pool is not None:
+        chunk = max(1, -(-page_count // (workers * 4)))
+        futures = []
+        try:
+            for start in range(0, page_count, chunk):
+                futures.append(pool.submit(_extract_range, file_path, start, min(start + chunk, page_count)))
+            for future in futures:
+                for text in future.result():
+                    yield text
+                    done += 1
+        except (AssertionError, OSError, BrokenProcessPool) as e:
+            _drop_pool(workers, e)
+            log.warning("Parallel extraction failed; reading the remaining pages serially",
+                        extra={"error": repr(e), "file_path": file_path, "resume_page": done})
+        finally:
+            for future in futures:
+                future.cancel()
+
+    # Serial path, or the rest of the document after a pool failure
+    for i in range(done, page_count):
+        yield reader.pages[i].extract_text() or ""
+
+
+# --- PERSISTENCE ---
+def save_found_apps(db, user_id, found_apps, file_path):
+    """Skips names the user already has (one IN query) and bulk-inserts the rest."""
+    if not found_apps:
+        return 0
+    existing = set(db.execute(
+        select(Subscription.name).where(
+            Subscription.owner_id == user_id,
+            Subscription.name.in_([app["name"] for app in found_apps]),
+        )
+    ).scalars())
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "name": app["name"],
+            "cost": app["cost"],
+            "category": app["category"],
+            "owner_id": user_id,
+            "status": "Active",
+            "renewal_date": now,
+            "custom_attributes": {"source": "invoice_scan", "original_file": os.path.basename(file_path)},
+        }
+        for app in found_apps if app["name"] not in existing
+    ]
+    if rows:
+        db.execute(insert(Subscription), rows)
+        analytics.record(db, added=rows)
+        # Pinned before the commit, so no read of the new rows can go to a replica
+        routing.record_write("subs", user_id)
+    db.commit()
+    return len(rows)
+
+
+# --- PROGRESS ---
+def progress_reporter(task, user_id, every=events.PROGRESS_EVERY_PAGES):
+    """
+    Builds the on_page callback for VendorMatcher.scan: every `every` pages (and
+    whenever a new vendor shows up) it stores PROGRESS in the result backend and
+    pushes a task.progress event to the user's channel.
+    """
+    task_id = task.request.id
+    last = {"vendors": 0}
+
+    def report(pages, vendors):
+        if pages % every and vendors == last["vendors"]:
+            return
+        last["vendors"] = vendors
+        meta = {"pages_parsed": pages, "vendors_found": vendors}
+        if task_id:
+            task.update_state(state="PROGRESS", meta=meta)
+        events.publish(user_id, "task.progress", task_id=task_id, **meta)
+
+    return report
+
+
+@celery_app.task(name="scan_invoice", bind=True)
+def scan_invoice(self, file_path: str, user_id: int, upload_id: int = None):
     """
     Parses a PDF invoice to detect software names and costs.
     """
+    result = _scan_invoice(file_path, user_id, progress_reporter(self, user_id))
+    failed = result == "File missing" or result.startswith("Error")
+    if upload_id is not None:
+        # Recorded on the upload so duplicate uploads can return it without re-scanning
+        uploads.finish_upload(upload_id, "Failed" if failed else "Done", result)
+    events.publish(user_id, "task.completed", task_id=self.request.id,
+                   status="Failed" if failed else "Done", result=result)
+    return result
+
+
+def _scan_invoice(file_path, user_id, on_page=None):
     db = SessionLocal()
-    print(f"--- WORKER: Processing Invoice {file_path} for User {user_id} ---")
-    
-    extracted_text = ""
+    log.info("Processing invoice", extra={"file_path": file_path, "user_id": user_id})
+
     try:
         # Check if file exists (thanks to shared volume)
         if not os.path.exists(file_path):
-            print(f"[WORKER] Error: File not found at {file_path}")
+            log.error("Invoice file not found", extra={"file_path": file_path, "user_id": user_id})
             return "File missing"
 
-        # 1. READ PDF
-        reader = PdfReader(file_path)
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                extracted_text += text + "\n"
-        
-        print(f"[WORKER] Extracted {len(extracted_text)} characters.")
-
-        # 2. PATTERN MATCHING (Shadow IT Detection)
-        # Simple dictionary mapping Tool Name -> Category
-        keywords = {
-            "Zoom": "Communication",
-            "Slack": "Communication",
-            "Salesforce": "CRM",
-            "GitHub": "DevTools",
-            "Adobe": "Design",
-            "AWS": "Cloud",
-            "DigitalOcean": "Cloud",
-            "Figma": "Design",
-            "Notion": "Productivity"
-        }
-        
-        found_apps = []
-        
-        # Regex to find currency (e.g., $14.99, $ 20.00, 15.50 USD)
-        # This is a basic regex, production would use stronger patterns
-        price_pattern = r'\$\s?(\d+\.\d{2})'
-        
-        for app_name, category in keywords.items():
-            if app_name.lower() in extracted_text.lower():
-                # Try to find a price nearby, or default to 0
-                prices = re.findall(price_pattern, extracted_text)
-                cost = 0.0
-                if prices:
-                    # Heuristic: Take the highest value found in the doc as the total
-                    cost = max([float(p) for p in prices])
-                
-                found_apps.append({
-                    "name": app_name, 
-                    "cost": cost, 
-                    "category": category
-                })
+        # 1. READ PDF + 2. PATTERN MATCHING (Shadow IT Detection), streamed page by page
+        matcher = catalog.current_matcher(db)
+        pages = 0
+        started = time.perf_counter()
+
+        def counted(texts):
+            nonlocal pages
+            for text in texts:
+                pages += 1
+                yield text
+
+        found, hinted, max_price, chars = matcher.scan(counted(iter_page_texts(file_path)), on_page=on_page)
+        metrics.record_invoice_scan(pages, time.perf_counter() - started)
+        log.info("Extracted invoice text", extra={"pages": pages, "chars": chars, "user_id": user_id})
+
+        # Vendor price hints win; otherwise take the highest value found in the doc as the total
+        found_apps = [
+            {"name": name, "cost": hinted.get(name, max_price or 0.0), "category": category}
+            for name, category in found.items()
+        ]
 
         # 3. SAVE TO DB
         if not found_apps:
             return "Scan complete. No known apps detected."
 
-        count = 0
-        for app in found_apps:
-            # Prevent duplicates
-            exists = db.query(Subscription).filter(
-                Subscription.owner_id == user_id,
-                Subscription.name == app["name"]
-            ).first()
-            
-            if not exists:
-                new_sub = Subscription(
-                    name=app["name"],
-                    cost=app["cost"],
-                    category=app["category"],
-                    owner_id=user_id,
-                    custom_attributes={"source": "invoice_scan", "original_file": os.path.basename(file_path)}
-                )
-                db.add(new_sub)
-                count += 1
-        
-        db.commit()
+        count = save_found_apps(db, user_id, found_apps, file_path)
+        if count:
+            cache.invalidate("subs", user_id)
         return f"Success: Added {count} new subscriptions from invoice."
 
     except Exception as e:
-        print(f"[WORKER] Crash: {e}")
+        log.exception("Invoice scan crashed", extra={"file_path": file_path, "user_id": user_id})
         return f"Error: {str(e)}"
     finally:
         # Cleanup: Delete the temp file
         if os.path.exists(file_path):
             os.remove(file_path)
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- SCHEDULED ---
+@celery_app.task(name="scan_renewals")
+def scan_renewals(days: int = None):
+    """Beat task: creates alerts for subscriptions renewing in the next `days` days."""
+    db = SessionLocal()
+    try:
+        return renewals.scan_renewals(db, days or renewals.RENEWAL_WINDOW_DAYS)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="scan_duplicates")
+def scan_duplicates(full: bool = False):
+    """Nightly beat task: regroups the subscriptions changed since the last run by vendor."""
+    db = SessionLocal()
+    try:
+        return duplicates.scan_duplicates(db, full=full)
+    finally:
+        db.close()
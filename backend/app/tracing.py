@@ -0,0 +1,67 @@
+import logging
+import os
+from contextlib import contextmanager
+
+# Optional OpenTelemetry spans. With OTEL_ENABLED=1 and opentelemetry-api
+# installed, requests, SQL statements and Celery tasks become spans on the
+# global tracer provider. Exporting them needs an SDK and exporter, e.g.
+# opentelemetry-sdk with OTLP, configured by `opentelemetry-instrument` or the
+# OTEL_* environment variables. Otherwise every helper here is a no-op.
+
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "0") == "1"
+TRACER_NAME = "officewatch"
+
+# logs imports this module for trace ids, so the logger is fetched directly
+log = logging.getLogger(__name__)
+
+_tracer = None
+_trace = None
+_unavailable = False
+
+
+def _load():
+    global _tracer, _trace, _unavailable
+    if not OTEL_ENABLED or _tracer is not None or _unavailable:
+        return _tracer
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        _unavailable = True
+        log.warning("OTEL_ENABLED=1 but opentelemetry-api is not installed; tracing is off")
+        return None
+    _trace = trace
+    _tracer = trace.get_tracer(TRACER_NAME)
+    return _tracer
+
+
+def enabled() -> bool:
+    return _load() is not None
+
+
+def start_span(name, kind="internal", **attributes):
+    """Starts a span under the current one without making it current; the caller must end() it."""
+    tracer = _load()
+    if tracer is None:
+        return None
+    return tracer.start_span(name, kind=getattr(_trace.SpanKind, kind.upper()), attributes=attributes)
+
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """`with span(...)` makes a current span for the block; yields None when tracing is off."""
+    tracer = _load()
+    if tracer is None:
+        yield None
+        return
+    with tracer.start_as_current_span(name, kind=getattr(_trace.SpanKind, kind.upper()), attributes=attributes) as current:
+        yield current
+
+
+def current_ids() -> dict:
+    """trace_id/span_id of the active span, for log records; empty when there is none."""
+    if _tracer is None:
+        return {}
+    context = _trace.get_current_span().get_span_context()
+    if not context.is_valid:
+        return {}
+    return {"trace_id": format(context.trace_id, "032x"), "span_id": format(context.span_id, "016x")}
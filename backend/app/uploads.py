@@ -0,0 +1,195 @@
+import hashlib
+import os
+import uuid
+import anyio
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from python_multipart.exceptions import MultipartParseError
+from sqlalchemy.exc import IntegrityError
+
+from . import database, logs, models
+
+log = logs.get_logger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "/app/temp_uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # boundaries, part headers and small fields around the file
+
+
+def too_large(max_bytes):
+    return HTTPException(status_code=413, detail=f"File too large. Limit is {max_bytes // (1024 * 1024)}MB")
+
+
+class _FilePart:
+    """python-multipart callbacks that collect the data of one form field's file."""
+
+    def __init__(self, field: bytes):
+        self.field = field
+        self.found = False
+        self.filename = None
+        self.pending = []
+        self._current = False
+        self._headers = {}
+        self._name = self._value = b""
+
+    def on_part_begin(self):
+        self._current, self._headers = False, {}
+
+    def on_header_field(self, data, start, end):
+        self._name += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._name.lower()] = self._value
+        self._name = self._value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name") == self.field and b"filename" in options and not self.found:
+            self._current = self.found = True
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+
+    def on_part_data(self, data, start, end):
+        if self._current:
+            self.pending.append(data[start:end])
+
+    def callbacks(self):
+        names = ("on_part_begin", "on_header_field", "on_header_value", "on_header_end", "on_headers_finished", "on_part_data")
+        return {name: getattr(self, name) for name in names}
+
+
+async def stream_to_disk(request: Request, directory: str, max_bytes: int = UPLOAD_MAX_BYTES, field: str = "file"):
+    """
+    Streams the `field` file of a multipart request straight from the socket to
+    a temp file, hashing as it goes. A Content-Length over the limit is refused
+    before any of the body is read, and reading stops at the first chunk past
+    the limit, so an oversized upload is never fully received or written.
+    Disk writes run on worker threads, so the event loop is never blocked.
+    Returns (temp_path, filename, sha256 hex digest, size in bytes).
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise HTTPException(status_code=400, detail=f"Expected a multipart/form-data upload with a '{field}' file")
+    body_limit = max_bytes + MULTIPART_OVERHEAD_BYTES
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > body_limit:
+        raise too_large(max_bytes)
+
+    part = _FilePart(field.encode())
+    parser = MultipartParser(options[b"boundary"], part.callbacks())
+    await anyio.to_thread.run_sync(lambda: os.makedirs(directory, exist_ok=True))
+    temp_path = os.path.join(directory, f".incoming-{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    received = size = 0
+    try:
+        async with await anyio.open_file(temp_path, "wb") as out:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > body_limit:
+                    raise too_large(max_bytes)
+                try:
+                    parser.write(chunk)
+                except MultipartParseError as e:
+                    raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e}")
+                for data in part.pending:
+                    size += len(data)
+                    if size > max_bytes:
+                        raise too_large(max_bytes)
+                    digest.update(data)
+                    await out.write(data)
+                part.pending.clear()
+        if not part.found:
+            raise HTTPException(status_code=400, detail=f"Expected a '{field}' file upload")
+    except BaseException:
+        await anyio.to_thread.run_sync(_remove, temp_path)
+        raise
+    return temp_path, part.filename, digest.hexdigest(), size
+
+
+def content_path(directory: str, owner_id: int, sha256: str) -> str:
+    # Namespaced per user: each user's scan deletes its own copy when done
+    return os.path.join(directory, str(owner_id), f"{sha256}.pdf")
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def claim_upload(owner_id: int, sha256: str, filename: str, size: int):
+    """
+    Registers an upload by content hash. Returns (record, is_new). A previous
+    upload that failed to scan is re-claimed with a fresh task id.
+    """
+    db = database.SessionLocal()
+    try:
+        record = db.query(models.InvoiceUpload).filter(
+            models.InvoiceUpload.owner_id == owner_id, models.InvoiceUpload.sha256 == sha256
+        ).first()
+        if record is not None and record.status != "Failed":
+            return _snapshot(record), False
+
+        if record is None:
+            record = models.InvoiceUpload(owner_id=owner_id, sha256=sha256)
+            db.add(record)
+        record.filename = filename
+        record.size = size
+        record.task_id = str(uuid.uuid4())
+        record.status = "Queued"
+        record.result = None
+        try:
+            db.commit()
+        except IntegrityError:
+            # The same invoice was claimed concurrently; defer to that upload
+            db.rollback()
+            return claim_upload(owner_id, sha256, filename, size)
+        return _snapshot(record), True
+    finally:
+        db.close()
+
+
+def finish_upload(upload_id: int, status: str, result: str):
+    db = database.SessionLocal()
+    try:
+        db.query(models.InvoiceUpload).filter(models.InvoiceUpload.id == upload_id).update(
+            {"status": status, "result": result}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def celery_app():
+    """The Celery client, imported on first use: loading Celery adds ~100ms to API startup."""
+    from .worker import celery_app
+    return celery_app
+
+
+def task_status(record):
+    """
+    Combines the Celery result backend with the upload row. The backend knows
+    about in-flight progress; the row outlives the backend's result expiry and
+    also records scans that returned an error message instead of raising.
+    """
+    async_result = celery_app().AsyncResult(record.task_id)
+    try:
+        state, info = async_result.state, async_result.info
+    except Exception as e:
+        log.warning("Result backend unavailable", extra={"task_id": record.task_id, "error": str(e)})
+        state, info = "UNKNOWN", None
+
+    progress = info if state == "PROGRESS" and isinstance(info, dict) else None
+    result = record.result
+    if record.status != "Queued":
+        state = "SUCCESS" if record.status == "Done" else "FAILURE"
+    elif state == "SUCCESS":
+        result = str(info)
+    elif state == "FAILURE":
+        result = f"Error: {info}"
+    return {"task_id": record.task_id, "state": state, "status": record.status, "progress": progress, "result": result}
+
+
+def _snapshot(record):
+    return {"id": record.id, "task_id": record.task_id, "status": record.status, "result": record.result}
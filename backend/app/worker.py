@@ -1,8 +1,31 @@
 from celery import Celery
+from celery.schedules import crontab
 import os
 
+from . import metrics
+
 # Use Environment Variables for Redis (Upstash) in Production
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
 
-celery_app = Celery("worker", broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
\ No newline at end of file
+# Periodic renewal scan; the beat process only enqueues it, a worker runs it
+RENEWAL_SCAN_INTERVAL = float(os.getenv("RENEWAL_SCAN_INTERVAL", "3600"))
+# Nightly duplicate/shadow-IT scan, at this hour (UTC)
+DUPLICATE_SCAN_HOUR = int(os.getenv("DUPLICATE_SCAN_HOUR", "2"))
+
+celery_app = Celery("worker", broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND, include=["app.tasks"])
+
+# Report STARTED so GET /tasks/{id} can tell "queued" from "running"
+celery_app.conf.task_track_started = True
+
+# Threads, not prefork: prefork children are daemonic and cannot start the process
+# pool that scan_invoice extracts large PDFs with (tasks.iter_page_texts)
+celery_app.conf.worker_pool = os.getenv("CELERY_WORKER_POOL", "threads")
+
+# Publishers stamp each task, workers record duration and queue wait for GET /metrics
+metrics.instrument_celery()
+
+celery_app.conf.beat_schedule = {
+    "scan-renewals": {"task": "scan_renewals", "schedule": RENEWAL_SCAN_INTERVAL},
+    "scan-duplicates": {"task": "scan_duplicates", "schedule": crontab(hour=DUPLICATE_SCAN_HOUR, minute=0)},
+}
@@ -0,0 +1,107 @@
+"""
+Admin dashboard analytics as the subscription table grows.
+
+"legacy" is what the dashboard did before: load every subscription as an ORM
+object and sum in Python. "group-by" aggregates the subscriptions table in SQL.
+"rollup" is app/analytics.py, which reads only the spend_rollups table.
+
+    python benchmarks/bench_analytics.py --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app import analytics, models
+
+USERS = 200
+CATEGORIES = ["Communication", "CRM", "DevTools", "Design", "Cloud", "Productivity", "Security", "HR", "Finance", "Legal"]
+LEGACY_MAX_ROWS = 1_000_000
+
+
+def seed(db, rows, rng, batch=20000):
+    db.execute(insert(models.User), [{"id": i, "username": f"user{i}", "hashed_password": "x"} for i in range(1, USERS + 1)])
+    start = datetime(2025, 1, 1)
+    for offset in range(0, rows, batch):
+        db.execute(insert(models.Subscription), [
+            {
+                "name": f"app{rng.randrange(5000)}",
+                "cost": round(rng.uniform(1, 500), 2),
+                "category": rng.choice(CATEGORIES),
+                "renewal_date": start + timedelta(days=rng.randrange(730)),
+                "status": "Active" if rng.random() < 0.9 else "Cancelled",
+                "custom_attributes": {},
+                "owner_id": rng.randint(1, USERS),
+            }
+            for _ in range(min(batch, rows - offset))
+        ])
+    db.commit()
+
+
+def legacy(db):
+    by_category, by_user = defaultdict(float), defaultdict(float)
+    for sub in db.query(models.Subscription).all():
+        if sub.status == "Active":
+            by_category[sub.category] += sub.cost
+            by_user[sub.owner_id] += sub.cost
+    return by_category, by_user
+
+
+def group_by(db):
+    s = models.Subscription
+    active = s.status == "Active"
+    by_category = db.execute(select(s.category, func.sum(s.cost)).where(active).group_by(s.category)).all()
+    by_user = db.execute(select(s.owner_id, func.sum(s.cost)).where(active).group_by(s.owner_id)).all()
+    return by_category, by_user
+
+
+def rollup(db):
+    return analytics.spend_by_category(db), analytics.spend_by_user(db), analytics.spend_by_month(db)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+    rng = random.Random(11)
+
+    print(f"Admin analytics ({USERS} users, {len(CATEGORIES)} categories, 24 renewal months, SQLite file)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, f'analytics_{rows}.db')}")
+            models.Base.metadata.create_all(bind=engine)
+            db = sessionmaker(bind=engine)()
+            seed(db, rows, rng)
+            rebuild_ms, buckets = timed(analytics.rebuild, db)
+
+            legacy_ms = timed(legacy, db)[0] if rows <= LEGACY_MAX_ROWS else float("nan")
+            db.expunge_all()
+            group_ms, (grouped, _) = timed(group_by, db)
+            rollup_ms, (categories, _, _) = timed(rollup, db)
+            assert {c: round(t, 2) for c, t in grouped} == {r["category"]: r["total_cost"] for r in categories}
+
+            print(f"{rows:>9} subs  legacy={legacy_ms:9.1f}ms  group-by={group_ms:8.1f}ms  "
+                  f"rollup={rollup_ms:6.1f}ms ({buckets} buckets, rebuild {rebuild_ms:.0f}ms)")
+            db.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
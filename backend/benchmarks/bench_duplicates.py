@@ -0,0 +1,110 @@
+"""
+Duplicate/shadow-IT scan over 1M subscriptions on a seeded SQLite stand-in.
+
+Names are drawn from the built-in vendor catalog (with plan suffixes), a long
+tail of 20k made-up vendors and misspellings of them. "full" is the first
+scan; "incremental" follows edits to 1% of the rows; "no-op" is the next night
+with nothing changed. "fuzzy comparisons" is what blocking leaves of the
+all-pairs comparison between distinct names.
+
+    python benchmarks/bench_duplicates.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import bindparam, create_engine, func, insert, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app import catalog, duplicates, models
+
+USERS = 5000
+SUFFIXES = ["", " Pro", " Business", " Team", ", Inc.", " (annual)"]
+
+
+def names(rng):
+    tail = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))).title() for _ in range(20000)]
+    known = [v["name"] for v in catalog.DEFAULT_VENDORS]
+
+    def pick():
+        roll = rng.random()
+        if roll < 0.3:
+            return rng.choice(known) + rng.choice(SUFFIXES)
+        name = rng.choice(tail)
+        if roll < 0.35:
+            i = rng.randrange(len(name))
+            name = name[:i] + name[i + 1:]  # misspelt
+        return name + rng.choice(SUFFIXES)
+    return pick
+
+
+def seed(db, rows, rng, batch=50000):
+    pick = names(rng)
+    db.execute(insert(models.User), [{"id": i, "username": f"user{i}", "hashed_password": "x"} for i in range(1, USERS + 1)])
+    for offset in range(0, rows, batch):
+        db.execute(insert(models.Subscription), [
+            {"name": pick(), "cost": round(rng.uniform(5, 100), 2), "category": "Bench",
+             "status": "Active", "owner_id": rng.randint(1, USERS), "custom_attributes": {}}
+            for _ in range(min(batch, rows - offset))
+        ])
+    db.commit()
+    return pick
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--batch-size", type=int, default=duplicates.DUPLICATE_BATCH_SIZE)
+    args = parser.parse_args()
+    rng = random.Random(15)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'duplicates.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        pick = seed(db, args.rows, rng)
+
+        full_s, full = timed(duplicates.scan_duplicates, db, full=True, batch_size=args.batch_size)
+        keys = db.execute(select(func.count()).select_from(models.VendorAlias)).scalar()
+        groups = db.execute(select(func.count()).select_from(models.VendorGroup)).scalar()
+        print(f"{args.rows} subscriptions, {USERS} users: {keys} distinct name keys -> {groups} vendors")
+        print(f"  full        {full_s:7.1f}s  ({full['rows_changed'] / full_s:,.0f} rows/s, "
+              f"{full['comparisons']:,} fuzzy comparisons vs {keys * (keys - 1) // 2:,} all-pairs)")
+
+        # Edit 1%: rename half of them, reprice the other half
+        s = models.Subscription.__table__
+        edited = rng.sample(range(1, args.rows + 1), args.rows // 100)
+        half = len(edited) // 2
+        db.connection().execute(update(s).where(s.c.id == bindparam("b_id")).values(name=bindparam("b_name")),
+                   [{"b_id": i, "b_name": pick()} for i in edited[:half]])
+        db.connection().execute(update(s).where(s.c.id == bindparam("b_id")).values(cost=bindparam("b_cost")),
+                   [{"b_id": i, "b_cost": 1.0} for i in edited[half:]])
+        db.commit()
+        inc_s, inc = timed(duplicates.scan_duplicates, db, batch_size=args.batch_size)
+        print(f"  incremental {inc_s:7.1f}s  ({inc['rows_changed']} changed rows, {inc['vendors_updated']} vendors updated)")
+        noop_s, noop = timed(duplicates.scan_duplicates, db, batch_size=args.batch_size)
+        print(f"  no-op       {noop_s:7.1f}s  ({noop['rows_changed']} changed rows)")
+
+        top = duplicates.opportunities(db, limit=3)
+        print("  top consolidation opportunities:", "; ".join(
+            f"{g.name}: {g.owners} owners, {g.subscriptions} subscriptions, saves {g.estimated_savings:,.0f}" for g in top))
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
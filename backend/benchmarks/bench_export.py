@@ -0,0 +1,113 @@
+"""
+Export benchmark: peak RSS and time-to-first-byte for /export.
+
+Compares the old "load everything -> pandas -> StringIO" path with the
+streaming exporter in app/export.py. Each mode runs in its own process so
+peak RSS is not polluted by the other run.
+
+    python benchmarks/bench_export.py --rows 100000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(rows):
+    from app import database, models
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    if db.query(models.Subscription).count() >= rows:
+        db.close()
+        return
+    user = models.User(username="bench_export", hashed_password="x", role="admin")
+    db.add(user)
+    db.commit()
+    batch = []
+    for i in range(rows):
+        batch.append({"name": f"Vendor {i % 500}", "cost": float(i % 300), "category": "Bench",
+                      "status": "Active", "owner_id": user.id, "custom_attributes": {}})
+        if len(batch) == 10000:
+            db.bulk_insert_mappings(models.Subscription, batch)
+            batch = []
+    if batch:
+        db.bulk_insert_mappings(models.Subscription, batch)
+    db.commit()
+    db.close()
+
+
+def run_legacy():
+    import io
+    import pandas as pd
+    from app import database, models
+    db = database.SessionLocal()
+    start = time.perf_counter()
+    subs = db.query(models.Subscription).all()
+    data = [{"Name": s.name, "Cost": s.cost, "Category": s.category, "Status": s.status, "Renewal": s.renewal_date} for s in subs]
+    stream = io.StringIO()
+    pd.DataFrame(data).to_csv(stream, index=False)
+    body = iter([stream.getvalue()])
+    first = next(body)
+    ttfb = time.perf_counter() - start
+    total = len(first)
+    for chunk in body:
+        total += len(chunk)
+    return ttfb, time.perf_counter() - start, total
+
+
+def run_stream(fmt):
+    from app import export
+    start = time.perf_counter()
+    body = export.stream_export(fmt)
+    first = next(body)
+    ttfb = time.perf_counter() - start
+    total = len(first)
+    for chunk in body:
+        total += len(chunk)
+    return ttfb, time.perf_counter() - start, total
+
+
+def child(mode):
+    if mode == "legacy":
+        ttfb, elapsed, size = run_legacy()
+    else:
+        ttfb, elapsed, size = run_stream(mode)
+    print(f"{mode:<10} ttfb={ttfb * 1000:8.1f}ms total={elapsed:6.2f}s bytes={size:>11} peak_rss={peak_rss_mb():7.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--db", default=os.path.join(BACKEND_DIR, "bench_export.db"))
+    parser.add_argument("--mode")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{args.db}")
+    if args.mode:
+        child(args.mode)
+        return
+
+    seed(args.rows)
+    print(f"Export benchmark over {args.rows} rows ({os.environ['DATABASE_URL']})")
+    modes = ["legacy", "csv", "csv.gz"]
+    try:
+        import pyarrow  # noqa: F401
+        modes.append("parquet")
+    except ImportError:
+        pass
+    for mode in modes:
+        subprocess.run([sys.executable, __file__, "--rows", str(args.rows), "--db", args.db, "--mode", mode],
+                       env=os.environ, check=True)
+
+
+if __name__ == "__main__":
+    main()
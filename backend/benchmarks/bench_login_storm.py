@@ -0,0 +1,130 @@
+"""
+Login storm load test: latency of a non-auth endpoint while many users log in.
+
+Starts the API under uvicorn (one worker, SQLite, no Redis) once per mode:
+"inline" hashes in the request threadpool (HASH_WORKERS=0, like the old sync
+/token endpoint); "pool" uses the hashing process pool. A probe client calls
+GET /subscriptions back to back, first alone and then while --concurrency
+clients keep posting to /token. Per-IP login limiting is off so the storm is
+not simply turned away.
+
+    python benchmarks/bench_login_storm.py --concurrency 64 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+USERS = 20
+PASSWORD = "storm-password"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, db_path, hash_workers):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        REDIS_URL="redis://127.0.0.1:1/0",  # nothing listens: cache and rate limits fail open at once
+        CELERY_BROKER_URL="memory://",
+        CELERY_RESULT_BACKEND="cache+memory://",
+        HASH_WORKERS=str(hash_workers),
+        LOGIN_LIMIT_PER_IP="0",
+        LOGIN_LIMIT_PER_USER="0",
+    )
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, check=True)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(client):
+    for _ in range(200):
+        try:
+            await client.get("/docs")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def probe(client, headers, seconds):
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        res = await client.get("/subscriptions?limit=10", headers=headers)
+        res.raise_for_status()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def storm(client, stop, counts, worker):
+    while not stop.is_set():
+        res = await client.post("/token", data={"username": f"storm{worker % USERS}", "password": PASSWORD})
+        counts[res.status_code] = counts.get(res.status_code, 0) + 1
+
+
+def summary(samples):
+    ordered = sorted(samples)
+    pct = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+    return f"p50={statistics.median(ordered):7.1f}ms p95={pct(0.95):7.1f}ms p99={pct(0.99):7.1f}ms"
+
+
+async def run_mode(name, hash_workers, args, tmp):
+    port = free_port()
+    server = start_server(port, os.path.join(tmp, f"{name}.db"), hash_workers)
+    limits = httpx.Limits(max_connections=args.concurrency + 8)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+            await wait_ready(client)
+            for i in range(USERS):
+                await client.post("/signup", json={"username": f"storm{i}", "password": PASSWORD})
+            token = (await client.post("/token", data={"username": "storm0", "password": PASSWORD})).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+
+            idle = await probe(client, headers, 3)
+            stop, counts = asyncio.Event(), {}
+            started = time.perf_counter()
+            workers = [asyncio.create_task(storm(client, stop, counts, i)) for i in range(args.concurrency)]
+            await asyncio.sleep(0.5)  # let the storm build up
+            loaded = await probe(client, headers, args.seconds)
+            stop.set()
+            await asyncio.gather(*workers)
+            elapsed = time.perf_counter() - started
+
+            print(f"  {name:<7} idle      {summary(idle)}")
+            print(f"  {name:<7} in storm  {summary(loaded)}  logins={counts.get(200, 0) / elapsed:5.1f}/s "
+                  f"busy(503)={counts.get(503, 0)} other={sum(v for k, v in counts.items() if k not in (200, 503))}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+    print(f"GET /subscriptions latency, {args.concurrency} clients logging in concurrently ({os.cpu_count()} CPUs)")
+    with tempfile.TemporaryDirectory() as tmp:
+        await run_mode("inline", 0, args, tmp)
+        await run_mode("pool", min(2, os.cpu_count() or 1), args, tmp)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""
+Instrumentation overhead: requests/sec with and without app/metrics.py.
+
+Both variants serve the same minimal FastAPI app in-process through httpx's
+ASGI transport: a sync endpoint that runs three SQL statements on an
+in-memory SQLite engine, which is roughly what a cache miss on a list route
+costs. "off" has no middleware and no SQL timing. "on" adds MetricsMiddleware
+and per-statement SQL timing, as the API runs by default. "on+otel" also
+creates spans (OTEL_ENABLED=1, needs opentelemetry-api; with no SDK configured
+the spans are no-ops, so this is the floor of tracing cost). It also times a
+single histogram observation and one /metrics render.
+
+    python benchmarks/bench_metrics.py --requests 5000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app import cache, metrics, tracing
+
+
+def make_engine(instrumented):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    if instrumented:
+        metrics.instrument_engine(engine)
+    return engine
+
+
+def build_app(instrumented):
+    app = FastAPI()
+    engine = make_engine(instrumented)
+    if instrumented:
+        app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/subscriptions/{sub_id}")
+    def read(sub_id: int):
+        with engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("SELECT :id"), {"id": sub_id}).scalar()
+        return {"id": sub_id, "name": "Zoom"}
+
+    return app
+
+
+async def drive(app, total, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(total))
+
+        async def worker():
+            for i in remaining:
+                response = await client.get(f"/subscriptions/{i}")
+                assert response.status_code == 200, response.text
+
+        await client.get("/subscriptions/0")  # warm up
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return total / (time.perf_counter() - start)
+
+
+def per_call(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def middleware_cost(iterations):
+    """us per request added by MetricsMiddleware around an ASGI app that does nothing."""
+    scope = {"type": "http", "method": "GET", "path": "/subscriptions/1", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    wrapped = metrics.MetricsMiddleware(bare_app)
+    timings = {}
+    for name, app in (("bare", bare_app), ("wrapped", wrapped)):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await app(dict(scope), receive, send)
+        timings[name] = (time.perf_counter() - start) / iterations * 1e6
+    return timings["wrapped"] - timings["bare"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+    cache.client = None  # no Redis here; shared task metrics are left out of the render
+
+    print("Component costs:")
+    timings = {}
+    for instrumented in (False, True):
+        with make_engine(instrumented).connect() as conn:
+            statement = lambda: conn.execute(text("SELECT 1")).scalar()
+            timings[instrumented] = min(per_call(statement, args.iterations // 5) for _ in range(3))
+    bare, timed = timings[False], timings[True]
+    print(f"  SQL timing           {timed - bare:6.2f}us per statement ({bare:.1f}us -> {timed:.1f}us for SELECT 1)")
+    print(f"  MetricsMiddleware    {min(asyncio.run(middleware_cost(args.iterations // 5)) for _ in range(3)):6.2f}us per request")
+    histogram = metrics.Histogram("bench_observe_seconds", "benchmark only", ("route",))
+    observe = lambda: histogram.observe(0.003, ("/subscriptions",))
+    print(f"  Histogram.observe    {per_call(observe, args.iterations) * 1000:6.0f}ns")
+    for i in range(60):
+        metrics.HTTP_LATENCY.observe(0.01, ("GET", f"/route/{i}"))
+    metrics.render()  # first call imports app.database
+    start = time.perf_counter()
+    body = metrics.render()
+    print(f"  render               {(time.perf_counter() - start) * 1000:6.2f}ms for {len(body.splitlines())} lines")
+
+    # End to end. Each round runs every variant, starting with a different one each
+    # time, so no variant always runs first (or last) and picks up the machine's drift.
+    print(f"End to end: {args.requests} requests, concurrency {args.concurrency}, best of {args.rounds} rounds")
+    variants = [("off", False, False), ("on", True, False)]
+    tracing.OTEL_ENABLED = True
+    if tracing.enabled():
+        variants.append(("on+otel", True, True))
+    tracing.OTEL_ENABLED = False
+    apps = {name: build_app(instrumented) for name, instrumented, _ in variants}
+    best = {name: 0.0 for name, _, _ in variants}
+    for round_no in range(args.rounds):
+        shift = round_no % len(variants)
+        for name, instrumented, otel in variants[shift:] + variants[:shift]:
+            tracing.OTEL_ENABLED = otel
+            best[name] = max(best[name], asyncio.run(drive(apps[name], args.requests, args.concurrency)))
+    for name, rate in best.items():
+        overhead = (1 / rate - 1 / best["off"]) * 1e6
+        print(f"  {name:<8} {rate:8.0f} req/s  {1e6 / rate:7.1f}us/request  overhead {overhead:+6.1f}us "
+              f"({(best['off'] / rate - 1) * 100:+5.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+RBAC middleware load test: requests/sec through the legacy BaseHTTPMiddleware
+versus the pure ASGI policy-table middleware in app/middleware.py.
+
+Both variants wrap an identical minimal FastAPI app and are driven in-process
+through httpx's ASGI transport, so the numbers isolate middleware overhead.
+
+    python benchmarks/bench_rbac.py --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from jose import jwt, JWTError
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app import auth
+from app.middleware import RBACMiddleware, require_roles
+
+
+class LegacyRBACMiddleware(BaseHTTPMiddleware):
+    """The substring-matching middleware this benchmark replaces, kept verbatim for comparison."""
+
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        if request.method == "PUT" and "/requests/" in path and ("/approve" in path or "/reject" in path):
+            auth_header = request.headers.get("Authorization")
+            if not auth_header:
+                return JSONResponse(status_code=403, content={"detail": "Missing Authorization Header"})
+            try:
+                parts = auth_header.split()
+                if len(parts) != 2 or parts[0].lower() != 'bearer':
+                    return JSONResponse(status_code=403, content={"detail": "Invalid Auth Header"})
+                payload = jwt.decode(parts[1], auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+                if payload.get("role") != "admin":
+                    return JSONResponse(status_code=403, content={"detail": "RBAC Enforcement: Admin privileges required."})
+            except (JWTError, ValueError):
+                return JSONResponse(status_code=403, content={"detail": "Invalid or expired credentials"})
+        return await call_next(request)
+
+
+def build_app(middleware):
+    app = FastAPI()
+    app.add_middleware(middleware)
+
+    @app.get("/subscriptions")
+    def list_subs():
+        return [{"id": 1, "name": "Zoom"}]
+
+    @app.put("/requests/{req_id}/{action}")
+    @require_roles("admin")
+    def manage(req_id: int, action: str):
+        return {"message": f"Request {action}d successfully"}
+
+    return app
+
+
+async def drive(app, method, url, headers, total, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(total))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.request(method, url, headers=headers)
+                assert response.status_code == 200, response.text
+
+        await client.request(method, url, headers=headers)  # compile policy table / warm up
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    token = auth.create_access_token({"sub": "bench", "role": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+    scenarios = [
+        ("unprotected GET /subscriptions", "GET", "/subscriptions", {}),
+        ("protected PUT /requests/1/approve", "PUT", "/requests/1/approve", headers),
+    ]
+
+    print(f"RBAC middleware load test: {args.requests} requests, concurrency {args.concurrency}")
+    for label, method, url, hdrs in scenarios:
+        results = {}
+        for name, middleware in (("legacy", LegacyRBACMiddleware), ("asgi", RBACMiddleware)):
+            results[name] = asyncio.run(drive(build_app(middleware), method, url, hdrs, args.requests, args.concurrency))
+        print(f"{label:<36} legacy={results['legacy']:8.0f} req/s  asgi={results['asgi']:8.0f} req/s  "
+              f"speedup={results['asgi'] / results['legacy']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Renewal scheduler over a seeded SQLite stand-in.
+
+"full-scan" is the ad-hoc approach: read every subscription and filter in
+Python. "first run" is app/renewals.scan_renewals over an empty
+renewal_windows table; "repeat run" is the next beat tick, which skips the
+already processed days. Notifications go to an in-process fakeredis. Peak
+memory of the first run is measured with tracemalloc in a separate pass.
+
+    python benchmarks/bench_renewals.py --rows 1000000 --days 30
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import fakeredis
+from sqlalchemy import create_engine, delete, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app import events, models, renewals
+
+events.client = fakeredis.FakeRedis()
+
+USERS = 500
+
+
+def seed(db, rows, now, rng, batch=20000):
+    db.execute(insert(models.User), [{"id": i, "username": f"user{i}", "hashed_password": "x"} for i in range(1, USERS + 1)])
+    for offset in range(0, rows, batch):
+        db.execute(insert(models.Subscription), [
+            {
+                "name": f"app{rng.randrange(5000)}",
+                "cost": round(rng.uniform(1, 500), 2),
+                "category": "Bench",
+                "renewal_date": now + timedelta(minutes=rng.randrange(-365 * 1440, 365 * 1440)),
+                "status": "Active" if rng.random() < 0.9 else "Cancelled",
+                "custom_attributes": {},
+                "owner_id": rng.randint(1, USERS),
+            }
+            for _ in range(min(batch, rows - offset))
+        ])
+    db.commit()
+
+
+def full_scan(db, now, days):
+    # Same whole-day window as scan_renewals
+    start = datetime.combine(now.date(), datetime.min.time())
+    end = start + timedelta(days=days)
+    return [s for s in db.query(models.Subscription).all()
+            if s.status == "Active" and s.renewal_date and start <= s.renewal_date < end]
+
+
+def reset(db):
+    db.execute(delete(models.RenewalAlert))
+    db.execute(delete(models.RenewalWindow))
+    db.commit()
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=renewals.RENEWAL_BATCH_SIZE)
+    args = parser.parse_args()
+    rng = random.Random(5)
+    now = datetime(2030, 6, 1, 12, 0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'renewals.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        seed(db, args.rows, now, rng)
+        db.execute(text("ANALYZE"))
+
+        s = models.Subscription
+        probe = select(s.id).where(s.status == "Active", s.renewal_date >= now).order_by(s.renewal_date, s.id).limit(1)
+        plan = db.execute(text("EXPLAIN QUERY PLAN " + str(probe.compile(engine, compile_kwargs={"literal_binds": True})))).all()
+        print(f"{args.rows} subscriptions, {args.days}-day window, batch size {args.batch_size}")
+        print("  keyset query plan:", "; ".join(row[-1] for row in plan))
+
+        full_ms, due = timed(full_scan, db, now, args.days)
+        db.expunge_all()
+        first_ms, first = timed(renewals.scan_renewals, db, days=args.days, now=now, batch_size=args.batch_size)
+        repeat_ms, repeat = timed(renewals.scan_renewals, db, days=args.days, now=now + timedelta(minutes=5), batch_size=args.batch_size)
+        assert first["alerts"] == len(due) and repeat["alerts"] == 0
+
+        reset(db)
+        tracemalloc.start()
+        renewals.scan_renewals(db, days=args.days, now=now, batch_size=args.batch_size)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+        print(f"  full-scan={full_ms:9.1f}ms  ({len(due)} due)")
+        print(f"  first run={first_ms:9.1f}ms  ({first['alerts']} alerts, peak traced memory {peak_mb:.1f}MB)")
+        print(f"  repeat   ={repeat_ms:9.1f}ms  ({repeat['days_skipped']} days skipped)")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+/search latency over 1M subscriptions (plus 100k requests).
+
+Runs app/search.py against a seeded SQLite file (FTS5 trigram tables) or, with
+DATABASE_URL pointing at Postgres, against the pg_trgm/tsvector indexes.
+"like-scan" is the unindexed alternative: lower(name) LIKE '%q%' over the table.
+
+    python benchmarks/bench_search.py --rows 1000000 --repeat 20
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app import models, search
+
+BUDGET_MS = 50
+USERS = 500
+KNOWN = ["Figma", "Figma Pro", "Adobe Creative Cloud", "Adobe Sign", "Slack", "Zoom", "Notion", "GitHub",
+         "GitLab", "Jira", "Confluence", "Miro", "Canva", "Dropbox", "Asana", "Trello", "Linear", "Salesforce"]
+QUERIES = [("exact", "figma"), ("typo", "figam"), ("two words", "adobe sign"), ("attribute", "procurement"),
+           ("request details", "acrobat"), ("request typo", "acrobt")]
+
+
+def seed(db, rows, rng, batch=50000):
+    vocab = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))).title()
+             + rng.choice(["", " Pro", " Cloud", " Team"]) for _ in range(20000)]
+    # A fifth of the rows are well-known products, the rest a long tail of 20k names
+    name = lambda extra=(): rng.choice(KNOWN + list(extra)) if rng.random() < 0.2 else rng.choice(vocab)
+    db.execute(insert(models.User), [{"id": i, "username": f"user{i}", "hashed_password": "x"} for i in range(1, USERS + 1)])
+    for offset in range(0, rows, batch):
+        db.execute(insert(models.Subscription), [
+            {"name": name(), "cost": 10.0, "category": rng.choice(["Design", "Cloud", "CRM", "DevTools"]),
+             "status": "Active", "owner_id": rng.randint(1, USERS),
+             "custom_attributes": {"team": rng.choice(["engineering", "sales", "ops", "procurement"])}}
+            for _ in range(min(batch, rows - offset))
+        ])
+    db.execute(insert(models.Request), [
+        {"type": "software", "status": "Pending", "requester_id": rng.randint(1, USERS),
+         "details": {"name": name(["Adobe Acrobat"]), "cost": 20}}
+        for _ in range(rows // 10)
+    ])
+    db.commit()
+
+
+def percentiles(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    rng = random.Random(9)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = os.environ["DATABASE_URL"]
+        if url.startswith("sqlite"):
+            url = f"sqlite:///{os.path.join(tmp, 'search.db')}"
+        engine = create_engine(url)
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        start = time.perf_counter()
+        seed(db, args.rows, rng)
+        print(f"{args.rows} subscriptions + {args.rows // 10} requests on {engine.dialect.name} "
+              f"(seeded with index maintenance in {time.perf_counter() - start:.0f}s)")
+
+        scan = select(func.count()).where(func.lower(models.Subscription.name).like("%figma%"))
+        scan_p50, _ = percentiles(lambda: db.execute(scan).scalar(), 3)
+        print(f"  {'like-scan (unindexed)':<28} p50={scan_p50:8.1f}ms")
+
+        worst = 0.0
+        for label, query in QUERIES:
+            for scope, owner_id in (("org", None), ("mine", 42)):
+                fn = (lambda q=query, o=owner_id: search.search_requests(db, q, o)) if label.startswith("request") \
+                    else (lambda q=query, o=owner_id: search.search_subscriptions(db, q, o))
+                hits = len(fn())
+                p50, p95 = percentiles(fn, args.repeat)
+                worst = max(worst, p95)
+                print(f"  {label + ' (' + scope + ')':<28} p50={p50:8.1f}ms p95={p95:8.1f}ms  hits={hits}")
+        for prefix in ("f", "fig", "adobe s"):
+            p50, p95 = percentiles(lambda p=prefix: search.autocomplete(db, p), args.repeat)
+            worst = max(worst, p95)
+            print(f"  {'autocomplete ' + repr(prefix):<28} p50={p50:8.1f}ms p95={p95:8.1f}ms")
+
+        print(f"worst p95 {worst:.1f}ms: {'within' if worst <= BUDGET_MS else 'OVER'} the {BUDGET_MS}ms budget")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+List serialization throughput: turning a 10k-row page into response bytes.
+
+"response_model" is what FastAPI does when an endpoint returns ORM objects:
+validate each one into the response model, dump it to JSON-compatible data
+and encode that with the json module. "validated" is the default listing path
+(column-projected rows, one model_validate per row, orjson). "fast" is
+FAST_SERIALIZATION=1: row tuples straight to orjson. For cache hits,
+"re-validate" decodes the cached JSON, validates and re-encodes it; "verbatim"
+is what cached_page serves, the stored bytes unchanged.
+
+    python benchmarks/bench_serialization.py --items 10000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import cache, crud, models, schemas
+
+
+def seed(db, items):
+    db.execute(insert(models.User), [{"id": 1, "username": "bench", "hashed_password": "x"}])
+    start = datetime(2030, 1, 1)
+    db.execute(insert(models.Subscription), [
+        {"name": f"Tool {i}", "cost": 10.0 + i % 90, "category": "Bench", "status": "Active", "owner_id": 1,
+         "renewal_date": start + timedelta(hours=i), "custom_attributes": {"seats": i % 50, "team": "ops"}}
+        for i in range(items)
+    ])
+    db.execute(insert(models.Request), [
+        {"type": "software", "status": "Pending", "requester_id": 1, "created_at": start,
+         "details": {"name": f"Tool {i}", "cost": i % 90, "reason": "bench"}}
+        for i in range(items)
+    ])
+    db.commit()
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), body
+
+
+def run(name, schema, orm_rows, rows, repeat):
+    adapter = TypeAdapter(List[schema])
+    cached = cache.encode_models(rows, schema)
+
+    def response_model():
+        data = adapter.dump_python(adapter.validate_python(orm_rows, from_attributes=True), mode="json")
+        return json.dumps(data, separators=(",", ":")).encode()
+
+    def revalidate():
+        return cache.dumps(adapter.dump_python(adapter.validate_python(cache.orjson.loads(cached))))
+
+    cases = [
+        ("response_model", response_model),
+        ("validated", lambda: cache.encode_models(rows, schema)),
+        ("fast", lambda: cache.encode_rows(rows, list(schema.model_fields))),
+        ("hit re-validate", revalidate),
+        ("hit verbatim", lambda: cache._unpack(cache._pack(cached, {}, 0))[0]),
+    ]
+    print(f"{name}: {len(rows)} items, {len(cached) / 1024:.0f} KiB")
+    baseline = None
+    for label, fn in cases:
+        seconds, body = best_of(fn, repeat)
+        assert json.loads(body) == json.loads(cached), label
+        baseline = baseline or seconds
+        print(f"  {label:<16} {seconds * 1000:8.2f}ms  {len(rows) / seconds:>12,.0f} items/s  {baseline / seconds:6.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'serialization.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        seed(db, args.items)
+        for name, model, schema, list_page in (
+            ("GET /subscriptions", models.Subscription, schemas.SubscriptionOut,
+             lambda: crud.list_subscriptions(db, 1, limit=args.items)),
+            ("GET /requests", models.Request, schemas.RequestOut,
+             lambda: crud.list_requests(db, requester_id=1, limit=args.items)),
+        ):
+            orm_rows = db.query(model).limit(args.items).all()
+            rows, _ = list_page()
+            run(name, schema, orm_rows, rows, args.repeat)
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+API cold start: import time and time-to-first-request.
+
+Each run uses a fresh interpreter and an empty SQLite file, with no Redis (the
+cache fails open at once). Three measurements:
+
+  import     `import app.main`, plus which heavy optional modules it pulled in
+  migrate    `python -m app.migrate` creating the schema (was part of the import)
+  first req  uvicorn spawned -> first 200 from POST /chat, lifespan included
+
+tests/test_main.py::test_startup_budget enforces a budget on the same path
+(import, lifespan, first request), driven through TestClient instead of uvicorn.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+HEAVY = ("pandas", "pyarrow", "pypdf", "celery", "sqlalchemy.dialects.postgresql")
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+print(json.dumps({{"seconds": time.perf_counter() - started,
+                  "heavy": [m for m in {HEAVY!r} if m in sys.modules]}}))
+"""
+
+
+def env_for(db_path):
+    return dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        REDIS_URL="redis://127.0.0.1:1/0",  # nothing listens
+        CELERY_BROKER_URL="memory://",
+        CELERY_RESULT_BACKEND="cache+memory://",
+        PYTHONPATH=BACKEND_DIR,
+    )
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env):
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def measure_migrate(env):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=BACKEND_DIR, env=env,
+                   stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+
+def measure_first_request(env):
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=10) as client:
+            while True:
+                try:
+                    if client.post("/chat", json={"message": "hello"}).status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None:
+                    raise RuntimeError("server exited during startup")
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summary(samples):
+    return f"median={statistics.median(samples) * 1000:7.1f}ms  min={min(samples) * 1000:7.1f}ms  max={max(samples) * 1000:7.1f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    imports, migrations, first = [], [], []
+    heavy = set()
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(args.runs):
+            env = env_for(os.path.join(tmp, f"run{run}.db"))
+            result = measure_import(env)
+            imports.append(result["seconds"])
+            heavy.update(result["heavy"])
+            migrations.append(measure_migrate(env))
+            first.append(measure_first_request(env))
+
+    print(f"API cold start, {args.runs} runs ({os.cpu_count()} CPUs)")
+    print(f"  import app.main   {summary(imports)}")
+    print(f"  python -m migrate {summary(migrations)}  (process start included)")
+    print(f"  spawn -> 1st 200  {summary(first)}")
+    print(f"  heavy modules loaded on import: {', '.join(sorted(heavy)) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Vendor matcher scaling: scan time for a fixed document as the catalog grows.
+
+Compares the original per-vendor substring loop, a flat regex alternation, and
+the trie-shaped pattern used by app/catalog.VendorMatcher.
+
+    python benchmarks/bench_vendor_matcher.py --vendors 10 100 1000 5000 --kb 512
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app import catalog
+
+
+def vendor_names(count, rng):
+    names = set()
+    while len(names) < count:
+        words = rng.randint(1, 3)
+        names.add(" ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(words)))
+    return sorted(names)
+
+
+def make_pages(names, kb, rng):
+    filler = "invoice line item qty unit price subtotal tax total due net thirty ".split()
+    pages, size = [], 0
+    while size < kb * 1024:
+        words = [rng.choice(filler) for _ in range(400)]
+        for _ in range(3):
+            words[rng.randrange(len(words))] = rng.choice(names)
+        words.append(f"${rng.randint(1, 999)}.{rng.randint(0, 99):02d}")
+        page = " ".join(words)
+        pages.append(page)
+        size += len(page)
+    return pages
+
+
+def legacy(names, pages):
+    text = "\n".join(pages).lower()
+    return {n for n in names if n in text}
+
+
+def flat(names, pages):
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True)) + r")\b")
+    found = set()
+    for page in pages:
+        found.update(pattern.findall(page.lower()))
+    return found
+
+
+def trie(matcher, pages):
+    return set(matcher.scan(pages)[0])
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vendors", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--kb", type=int, default=512)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print(f"Vendor matcher scaling over a {args.kb}KB document")
+    for count in args.vendors:
+        names = vendor_names(count, rng)
+        pages = make_pages(names, args.kb, rng)
+        start = time.perf_counter()
+        matcher = catalog.VendorMatcher([{"name": n, "category": "Bench"} for n in names])
+        compile_ms = (time.perf_counter() - start) * 1000
+        print(f"{count:>6} vendors  legacy={timed(legacy, names, pages):9.1f}ms  "
+              f"flat-regex={timed(flat, names, pages):9.1f}ms  trie={timed(trie, matcher, pages):9.1f}ms  "
+              f"(trie compile {compile_ms:.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+# Run against a throwaway SQLite file unless a real database is configured
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+# In-memory Celery broker/result backend: tasks are queued but no worker is needed
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "officewatch_test_uploads"))
+
+import contextlib
+import fakeredis
+import pytest
+from sqlalchemy import event
+from app import cache, database, events, migrate
+
+# The API no longer creates the schema on import
+migrate.run()
+
+# Shared in-memory Redis stand-in for the cache layer (sync and asyncio clients see the same data)
+redis_server = fakeredis.FakeServer()
+cache.client = fakeredis.FakeRedis(server=redis_server)
+cache.async_client = fakeredis.FakeAsyncRedis(server=redis_server)
+# Task events use pub/sub on the same server, so worker-side publishes reach async subscribers
+events.client = fakeredis.FakeRedis(server=redis_server)
+events.async_client = fakeredis.FakeAsyncRedis(server=redis_server)
+
+
+@pytest.fixture(autouse=True)
+def _flush_cache():
+    cache.client.flushall()
+    cache.reset_stats()
+    yield
+
+
+@pytest.fixture
+def count_queries():
+    """`with count_queries() as statements:` records every SQL statement the app engine sends."""
+    @contextlib.contextmanager
+    def counting():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(database.engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(database.engine, "before_cursor_execute", record)
+    return counting
@@ -1,3 +1,5 @@
+import os
+import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -25,4 +27,898 @@ def test_signup_login_flow():
 def test_unauthorized_access():
     # Attempt to access protected route without token
     response = client.get("/subscriptions")
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+
+def _login(username, password="password123", role="employee"):
+    client.post(f"/signup?role={role}", json={"username": username, "password": password})
+    token = client.post("/token", data={"username": username, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_export_streams_csv():
+    from app import database, models
+    headers = _login("test_export_user")
+
+    db = database.SessionLocal()
+    user = db.query(models.User).filter(models.User.username == "test_export_user").first()
+    db.query(models.Subscription).filter(models.Subscription.owner_id == user.id).delete()
+    db.add_all([models.Subscription(name=f"Tool {i}", cost=10.0 + i, category="QA", owner_id=user.id) for i in range(5)])
+    db.commit()
+    db.close()
+
+    res = client.get("/export", headers=headers)
+    assert res.status_code == 200
+    lines = res.text.strip().splitlines()
+    assert lines[0] == "Name,Cost,Category,Status,Renewal"
+    assert len(lines) == 6
+
+    import gzip
+    res = client.get("/export?format=csv.gz", headers=headers)
+    assert res.status_code == 200
+    assert gzip.decompress(res.content).decode().splitlines()[0] == "Name,Cost,Category,Status,Renewal"
+
+def test_org_export_requires_admin():
+    headers = _login("test_export_user")
+    res = client.get("/export?scope=org", headers=headers)
+    assert res.status_code == 403
+
+def test_subscriptions_keyset_pagination_and_projection():
+    from app import database, models
+    headers = _login("test_page_user")
+
+    db = database.SessionLocal()
+    user = db.query(models.User).filter(models.User.username == "test_page_user").first()
+    db.query(models.Subscription).filter(models.Subscription.owner_id == user.id).delete()
+    db.add_all([models.Subscription(name=f"Tool {i}", cost=float(i), category="QA" if i % 2 else "Ops", owner_id=user.id) for i in range(5)])
+    db.commit()
+    db.close()
+
+    seen, cursor = [], None
+    while True:
+        url = "/subscriptions?limit=2" + (f"&cursor={cursor}" if cursor else "")
+        res = client.get(url, headers=headers)
+        assert res.status_code == 200
+        seen += [s["name"] for s in res.json()]
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [f"Tool {i}" for i in range(5)]
+
+    res = client.get("/subscriptions?limit=10&category=QA&sort=-renewal_date&fields=id,name", headers=headers)
+    assert res.status_code == 200
+    assert all(set(s) == {"id", "name"} for s in res.json())
+    assert len(res.json()) == 2
+
+    assert client.get("/subscriptions?limit=10&fields=password", headers=headers).status_code == 400
+    assert client.get("/subscriptions?limit=10&cursor=garbage", headers=headers).status_code == 400
+
+def test_subscription_cache_hits_and_invalidates_on_write():
+    from app import cache
+    headers = _login("test_cache_user")
+
+    first = client.get("/subscriptions", headers=headers)
+    second = client.get("/subscriptions", headers=headers)
+    assert first.json() == second.json()
+    assert cache.stats()["subs"]["hits"] == 1
+
+    created = client.post("/subscriptions", json={"name": "Cached Tool", "cost": 9.5}, headers=headers)
+    assert created.status_code == 200
+    names = [s["name"] for s in client.get("/subscriptions", headers=headers).json()]
+    assert "Cached Tool" in names
+
+def test_cache_generation_blocks_late_writes():
+    from app import cache
+    calls = []
+
+    def loader():
+        calls.append(1)
+        # A write lands (and invalidates) while this page is being computed
+        cache.invalidate("subs", 42)
+        return b"[]", {}
+
+    cache.get_or_load("subs", 42, {"limit": 1}, loader)
+    cache.get_or_load("subs", 42, {"limit": 1}, lambda: (b'["fresh"]', {}))
+    body, _ = cache.get_or_load("subs", 42, {"limit": 1}, loader)
+    assert body == b'["fresh"]'
+
+def test_principal_cache_invalidated_on_role_change():
+    from app import auth, database, models
+    headers = _login("test_role_user", role="admin")
+    admin_headers = _login("test_role_admin", role="admin")
+
+    db = database.SessionLocal()
+    user = db.query(models.User).filter(models.User.username == "test_role_user").first()
+    user.role = "admin"
+    db.commit()
+    user_id = user.id
+    db.close()
+    auth.invalidate_principal("test_role_user")
+
+    assert client.get("/cache/stats", headers=headers).status_code == 200
+    assert any(key[0] == "test_role_user" for key in auth.principal_cache._data)
+
+    # Demote: the old token still claims admin, so only a fresh principal lookup can refuse it
+    res = client.put(f"/users/{user_id}/role?role=employee", headers=admin_headers)
+    assert res.status_code == 200
+    assert not any(key[0] == "test_role_user" for key in auth.principal_cache._data)
+    assert client.get("/cache/stats", headers=headers).status_code == 403
+
+    # Promote: a token issued while they were an employee claims so, and the
+    # RBAC middleware has to go by the stored role to let it through
+    employee_headers = _login("test_role_user")
+    assert client.get("/cache/stats", headers=employee_headers).status_code == 403
+    res = client.put(f"/users/{user_id}/role?role=admin", headers=admin_headers)
+    assert res.status_code == 200
+    assert client.get("/cache/stats", headers=employee_headers).status_code == 200
+
+def test_rbac_policy_table():
+    from app.middleware import PolicyTable
+    from app.main import app
+    table = PolicyTable(app.routes)
+    assert table.lookup("PUT", "/requests/7/approve") == {"admin"}
+    assert table.lookup("GET", "/requests") is None
+    assert table.lookup("PUT", "/subscriptions/7") is None
+
+    employee = _login("test_export_user")
+    res = client.put("/requests/1/approve", headers=employee)
+    assert res.status_code == 403
+    assert res.json()["detail"] == "RBAC Enforcement: Admin privileges required."
+
+def test_async_listing_matches_sync():
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from app import crud, database, models
+
+    assert database.async_url("postgresql://u:p@db/x") == "postgresql+asyncpg://u:p@db/x"
+    assert database.async_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+
+    headers = _login("test_async_crud_user")
+    for name in ("Airtable", "Bitbucket", "Calendly"):
+        client.post("/subscriptions", json={"name": name, "cost": 10}, headers=headers)
+    db = database.SessionLocal()
+    owner_id = db.query(models.User.id).filter(models.User.username == "test_async_crud_user").scalar()
+    sync_rows, sync_cursor = crud.list_subscriptions(db, owner_id, limit=2)
+    db.close()
+    assert len(sync_rows) == 2 and sync_cursor
+
+    async def run():
+        engine = create_async_engine(database.async_url(database.SQLALCHEMY_DATABASE_URL))
+        async with AsyncSession(engine) as session:
+            rows, cursor = await crud.alist_subscriptions(session, owner_id, limit=2)
+        await engine.dispose()
+        return [r.id for r in rows], cursor
+
+    assert asyncio.run(run()) == ([r.id for r in sync_rows], sync_cursor)
+
+def _async_app(monkeypatch):
+    from fastapi import FastAPI
+    from app import async_routes, database
+    # What DB_ASYNC=1 does at import, on a copy of the app so the other tests keep the sync routes
+    monkeypatch.setattr(database, "async_engine", None)
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+    database.init_async_engine()
+    async_app = FastAPI()
+    async_app.router.routes = list(app.router.routes)
+    async_routes.install(async_app)
+    return async_app
+
+def test_async_routes_installed(monkeypatch):
+    import asyncio
+    from app import cache, crud, database
+    async_app = _async_app(monkeypatch)
+
+    headers = _login("test_async_route_user")
+    for name in ("Asana", "Basecamp", "Canva"):
+        client.post("/subscriptions", json={"name": name, "cost": 12}, headers=headers)
+    client.post("/requests", json={"type": "software", "details": {"name": "Dovetail"}}, headers=headers)
+    async_client = TestClient(async_app)
+    try:
+        for path in ("/subscriptions?limit=2", "/subscriptions?sort=-renewal_date&fields=name", "/requests"):
+            cache.client.flushall()
+            expected = client.get(path, headers=headers)
+            cache.client.flushall()
+            served = async_client.get(path, headers=headers)
+            assert served.status_code == 200, (path, served.text)
+            assert served.json() == expected.json()
+            assert served.headers.get("X-Next-Cursor") == expected.headers.get("X-Next-Cursor")
+        cursor = async_client.get("/subscriptions?limit=2", headers=headers).headers["X-Next-Cursor"]
+        assert [s["name"] for s in async_client.get(f"/subscriptions?limit=2&cursor={cursor}", headers=headers).json()] == ["Canva"]
+
+        # The installed routes list through the async crud functions only; writes stay sync
+        calls = []
+        for name in ("list_subscriptions", "list_requests", "alist_subscriptions", "alist_requests"):
+            def spy(*args, _name=name, _real=getattr(crud, name), **kwargs):
+                calls.append(_name)
+                return _real(*args, **kwargs)
+            monkeypatch.setattr(crud, name, spy)
+        cache.client.flushall()
+        assert async_client.get("/subscriptions", headers=headers).status_code == 200
+        assert async_client.get("/requests", headers=headers).status_code == 200
+        assert async_client.post("/subscriptions", json={"name": "Dropbox", "cost": 5}, headers=headers).status_code == 200
+        assert calls == ["alist_subscriptions", "alist_requests"]
+    finally:
+        asyncio.run(database.async_engine.dispose())
+
+def test_bulk_import_update_delete():
+    headers = _login("test_bulk_user")
+    listing = lambda: client.get("/subscriptions?limit=1000", headers=headers).json()
+    existing = [s["id"] for s in listing()]
+    if existing:
+        client.post("/subscriptions/bulk/delete", json={"ids": existing}, headers=headers)
+
+    res = client.post("/subscriptions/bulk", json=[
+        {"name": "Slack", "cost": 8.75, "category": "Communication"},
+        {"name": "Broken"},
+        {"name": "Zoom", "cost": "14.99"},
+    ], headers=headers)
+    assert res.status_code == 200
+    assert res.json()["inserted"] == 2
+    assert res.json()["errors"][0]["row"] == 2
+
+    csv_body = "name,cost,category,custom_attributes\nFigma,12,Design,\"{\"\"seats\"\": 3}\"\nNotion,,Productivity,\n"
+    res = client.post("/subscriptions/bulk", files={"file": ("subs.csv", csv_body, "text/csv")}, headers=headers)
+    assert res.json()["inserted"] == 1 and res.json()["failed"] == 1
+
+    ndjson_body = b'{"name": "GitHub", "cost": 4}\nnot json\n'
+    res = client.post("/subscriptions/bulk", content=ndjson_body, headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert res.json()["inserted"] == 1 and res.json()["failed"] == 1
+
+    subs = {s["name"]: s for s in listing()}
+    assert set(subs) == {"Slack", "Zoom", "Figma", "GitHub"}
+    assert subs["Figma"]["custom_attributes"] == {"seats": 3}
+
+    ids = [subs["Slack"]["id"], subs["Zoom"]["id"], 999999]
+    res = client.put("/subscriptions/bulk", json={"ids": ids, "changes": {"status": "Cancelled"}}, headers=headers)
+    assert res.json() == {"matched": 2, "missing_ids": [999999]}
+    assert {s["name"] for s in listing() if s["status"] == "Cancelled"} == {"Slack", "Zoom"}
+
+    res = client.post("/subscriptions/bulk/delete", json={"ids": ids}, headers=headers)
+    assert res.json()["matched"] == 2
+    assert {s["name"] for s in listing()} == {"Figma", "GitHub"}
+
+def test_bulk_import_reports_rows_committed_before_abort():
+    from app import bulk
+    headers = _login("test_bulk_abort_user")
+    assert client.get("/subscriptions?limit=1", headers=headers).json() == []  # cached empty page
+
+    # The first batch commits before decoding reaches the bad bytes
+    rows = "".join(f"Tool {i},{i}\n" for i in range(bulk.BULK_BATCH_SIZE + 500))
+    body = b"name,cost\n" + rows.encode() + b"Caf\xe9,3\n"
+    res = client.post("/subscriptions/bulk", files={"file": ("subs.csv", body, "text/csv")}, headers=headers)
+    assert res.status_code == 400
+    detail = res.json()["detail"]
+    assert "utf-8" in detail["error"] and detail["inserted"] == bulk.BULK_BATCH_SIZE
+    assert [s["name"] for s in client.get("/subscriptions?limit=1", headers=headers).json()] == ["Tool 0"]
+
+def test_bulk_import_refuses_oversized_uploads(monkeypatch):
+    from app import bulk
+    headers = _login("test_bulk_limits_user")
+    monkeypatch.setattr(bulk, "BULK_MAX_BYTES", 1024)
+    monkeypatch.setattr(bulk, "BULK_MAX_ROWS", 3)
+    count = lambda: len(client.get("/subscriptions", headers=headers).json())
+    before = count()
+
+    # Too many bytes: refused on the declared length, and on the running count when it is absent
+    big = b"name,cost\n" + b"".join(b"Tool %d,1\n" % i for i in range(200))
+    res = client.post("/subscriptions/bulk", content=big, headers={**headers, "Content-Type": "text/csv"})
+    assert res.status_code == 413
+    res = client.post("/subscriptions/bulk", content=iter([big[:600], big[600:]]), headers={**headers, "Content-Type": "text/csv"})
+    assert res.status_code == 413
+    res = client.post("/subscriptions/bulk", files={"file": ("subs.csv", big, "text/csv")}, headers=headers)
+    assert res.status_code == 413
+
+    # Too many rows: refused before any row is inserted
+    rows = [{"name": f"Tool {i}", "cost": 1} for i in range(4)]
+    assert client.post("/subscriptions/bulk", json=rows, headers=headers).status_code == 413
+    ndjson = b"".join(b'{"name": "Tool %d", "cost": 1}\n' % i for i in range(4))
+    res = client.post("/subscriptions/bulk", content=ndjson, headers={**headers, "Content-Type": "application/x-ndjson"})
+    assert res.status_code == 413
+    assert count() == before
+
+    assert client.post("/subscriptions/bulk", json=rows[:3], headers=headers).json()["inserted"] == 3
+
+def test_vendor_catalog_admin_endpoints(monkeypatch):
+    admin = _login("test_catalog_admin", role="admin")
+    employee = _login("test_export_user")
+    assert client.get("/vendors", headers=employee).status_code == 403
+
+    # migrate.py seeds the built-in vendors matching uses, so they are listed before any edit
+    assert {"Zoom", "AWS"} <= {v["name"] for v in client.get("/vendors", headers=admin).json()}
+
+    bad = client.post("/vendors", json={"name": "Miro", "price_pattern": "Miro (unclosed"}, headers=admin)
+    assert bad.status_code == 400
+
+    res = client.post("/vendors", json={"name": "Miro", "category": "Design", "aliases": ["RealtimeBoard"]}, headers=admin)
+    assert res.status_code in (200, 409)
+    vendors = {v["name"]: v for v in client.get("/vendors", headers=admin).json()}
+    assert {"Miro", "Zoom", "AWS"} <= set(vendors)
+
+    # Creating or renaming onto another vendor's name is a conflict, not a server error
+    assert client.post("/vendors", json={"name": "Zoom"}, headers=admin).status_code == 409
+    res = client.put(f"/vendors/{vendors['Miro']['id']}", json={"name": "Zoom"}, headers=admin)
+    assert res.status_code == 409
+    assert client.get("/vendors", headers=admin).json() == list(vendors.values())
+
+    # A concurrent create of the same name gets past the check and hits the unique constraint
+    from app import catalog, models
+    bump_version = catalog.bump_version
+    def racing_bump(db):
+        db.add(models.Vendor(name="Loom"))
+        bump_version(db)
+    monkeypatch.setattr(catalog, "bump_version", racing_bump)
+    assert client.post("/vendors", json={"name": "Loom"}, headers=admin).status_code == 409
+    monkeypatch.undo()
+    assert client.get("/vendors", headers=admin).json() == list(vendors.values())
+
+    assert client.delete(f"/vendors/{vendors['Miro']['id']}", headers=admin).status_code == 200
+
+def test_invoice_upload_dedup_and_size_limit():
+    import os, uuid
+    from app import uploads
+    headers = _login("test_upload_user")
+    content = b"%PDF-1.4 fake invoice " + uuid.uuid4().hex.encode()
+
+    first = client.post("/upload-invoice", files={"file": ("inv 1.pdf", content, "application/pdf")}, headers=headers)
+    assert first.status_code == 200
+    assert first.json()["duplicate"] is False
+
+    again = client.post("/upload-invoice", files={"file": ("renamed.pdf", content, "application/pdf")}, headers=headers)
+    assert again.json()["duplicate"] is True
+    assert again.json()["task_id"] == first.json()["task_id"]
+    assert not any(name.startswith(".incoming-") for name in os.listdir(uploads.UPLOAD_DIR))
+
+    # Oversized bodies, sent through ASGI directly: TestClient reads a whole body before sending it
+    def post_raw(extra_headers):
+        import asyncio
+        megabyte = b"0" * (1024 * 1024)
+        chunks = [b'--bound\r\nContent-Disposition: form-data; name="file"; filename="big.pdf"\r\n\r\n']
+        chunks += [megabyte] * (uploads.UPLOAD_MAX_BYTES // len(megabyte) * 3)
+        pulled, sent = [], []
+
+        async def receive():
+            if len(pulled) == len(chunks):
+                return {"type": "http.request", "body": b"--bound--\r\n", "more_body": False}
+            pulled.append(chunks[len(pulled)])
+            return {"type": "http.request", "body": pulled[-1], "more_body": True}
+
+        async def send(message):
+            sent.append(message)
+
+        request_headers = {**headers, "content-type": "multipart/form-data; boundary=bound", **extra_headers}
+        asyncio.run(app({
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+            "path": "/upload-invoice", "raw_path": b"/upload-invoice", "query_string": b"", "root_path": "",
+            "headers": [(k.lower().encode(), v.encode()) for k, v in request_headers.items()],
+            "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+        }, receive, send))
+        return sent[0]["status"], sum(map(len, pulled))
+
+    # A declared length over the limit is refused before any of the body is read
+    assert post_raw({"content-length": str(uploads.UPLOAD_MAX_BYTES * 3)}) == (413, 0)
+    # Without one, reading stops at the first chunk past the limit
+    status, read = post_raw({})
+    assert status == 413 and read <= uploads.UPLOAD_MAX_BYTES + uploads.MULTIPART_OVERHEAD_BYTES + 1024 * 1024
+    assert not any(name.startswith(".incoming-") for name in os.listdir(uploads.UPLOAD_DIR))
+
+def test_task_status_endpoint():
+    import uuid
+    from app import database, models, uploads, worker
+    headers = _login("test_task_status_user")
+    content = b"%PDF-1.4 status check " + uuid.uuid4().hex.encode()
+    task_id = client.post("/upload-invoice", files={"file": ("inv.pdf", content, "application/pdf")}, headers=headers).json()["task_id"]
+
+    res = client.get(f"/tasks/{task_id}", headers=headers)
+    assert res.status_code == 200
+    assert res.json()["state"] == "PENDING" and res.json()["status"] == "Queued"
+
+    # What a running worker writes through update_state()
+    worker.celery_app.backend.store_result(task_id, {"pages_parsed": 12, "vendors_found": 3}, "PROGRESS")
+    assert client.get(f"/tasks/{task_id}", headers=headers).json()["progress"] == {"pages_parsed": 12, "vendors_found": 3}
+
+    db = database.SessionLocal()
+    upload_id = db.query(models.InvoiceUpload.id).filter(models.InvoiceUpload.task_id == task_id).scalar()
+    db.close()
+    uploads.finish_upload(upload_id, "Done", "Success: Added 3 new subscriptions from invoice.")
+    done = client.get(f"/tasks/{task_id}", headers=headers).json()
+    assert done["state"] == "SUCCESS" and done["result"].startswith("Success")
+
+    # Other users can't see it
+    assert client.get(f"/tasks/{task_id}", headers=_login("test_task_status_other")).status_code == 404
+
+def test_event_stream_relays_published_events():
+    import asyncio, json
+    from app import events
+
+    async def scenario():
+        async def connected():
+            return False
+        stream = events.stream(626262, connected, keepalive=0.05)
+        assert (await stream.__anext__()).startswith(b"retry:")
+        events.publish(626262, "task.completed", task_id="t-1", status="Done", result="ok")
+        frames = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        return [f for f in frames if not f.startswith(b":")]
+
+    frame = asyncio.run(scenario())[0]
+    head, data = frame.decode().strip().split("\n")
+    assert head == "event: task.completed"
+    assert json.loads(data[len("data: "):])["task_id"] == "t-1"
+
+    assert client.get("/events").status_code == 401
+
+def test_event_stream_token_is_short_lived_and_stream_only():
+    from fastapi import HTTPException
+    from starlette.requests import Request
+    from app import auth
+    headers = _login("test_stream_token_user")
+    access_token = headers["Authorization"].split()[1]
+    request = lambda: Request({"type": "http", "headers": []})
+
+    res = client.post("/events/token", headers=headers)
+    assert res.status_code == 200 and res.json()["expires_in"] == auth.STREAM_TOKEN_SECONDS
+    stream_token = res.json()["stream_token"]
+    assert auth.get_stream_user(request(), stream_token=stream_token, token=None).username == "test_stream_token_user"
+
+    # The login token is not accepted in the URL, and the stream token opens nothing else
+    with pytest.raises(HTTPException) as denied:
+        auth.get_stream_user(request(), stream_token=access_token, token=None)
+    assert denied.value.status_code == 401
+    assert client.get(f"/events?access_token={access_token}").status_code == 401
+    assert client.get("/subscriptions", headers={"Authorization": f"Bearer {stream_token}"}).status_code == 401
+
+def test_analytics_rollups_track_writes():
+    import uuid
+    from app import analytics, database
+    headers = _login(f"test_analytics_{uuid.uuid4().hex[:8]}")
+    admin = _login("test_analytics_admin", role="admin")
+    by_category = lambda: {r["category"]: (r["total_cost"], r["count"]) for r in client.get("/analytics/spend/by-category", headers=headers).json()}
+
+    zoom = client.post("/subscriptions", json={"name": "Zoom", "cost": 15.0, "category": "Communication", "renewal_date": "2031-01-10T00:00:00"}, headers=headers).json()
+    client.post("/subscriptions", json={"name": "Slack", "cost": 8.5, "category": "Communication", "renewal_date": "2031-02-10T00:00:00"}, headers=headers)
+    client.post("/subscriptions/bulk", json=[{"name": "Figma", "cost": 12, "category": "Design"}, {"name": "Misc", "cost": 1}], headers=headers)
+    assert by_category() == {"Communication": (23.5, 2), "Design": (12.0, 1), "Uncategorized": (1.0, 1)}
+
+    # Moving Zoom to another category and month shifts its spend between buckets
+    client.put(f"/subscriptions/{zoom['id']}", json={"name": "Zoom", "cost": 20.0, "category": "Video", "renewal_date": "2031-02-01T00:00:00"}, headers=headers)
+    months = client.get("/analytics/spend/by-month?start=2031-01-01T00:00:00", headers=headers).json()
+    assert months == [{"month": "2031-02", "total_cost": 28.5, "count": 2}]
+
+    subs = {s["name"]: s["id"] for s in client.get("/subscriptions", headers=headers).json()}
+    client.put("/subscriptions/bulk", json={"ids": [subs["Misc"]], "changes": {"status": "Cancelled"}}, headers=headers)
+    client.post("/subscriptions/bulk/delete", json={"ids": [subs["Figma"]]}, headers=headers)
+    client.delete(f"/subscriptions/{subs['Slack']}", headers=headers)
+
+    # An approved software request becomes a subscription and counts immediately
+    client.post("/requests", json={"type": "software", "details": {"name": "Linear", "cost": 7.0}}, headers=headers)
+    req = client.get("/requests", headers=headers).json()[0]
+    assert client.put(f"/requests/{req['id']}/approve", headers=admin).status_code == 200
+    assert by_category() == {"Video": (20.0, 1), "Approved Request": (7.0, 1)}
+
+    # The incrementally maintained rollups agree with a full recomputation
+    incremental = by_category()
+    db = database.SessionLocal()
+    analytics.rebuild(db)
+    db.close()
+    assert by_category() == incremental
+
+    renewals = client.get("/analytics/renewals/upcoming?days=366", headers=headers).json()
+    assert "Zoom" not in {r["name"] for r in renewals}  # renews in 2031
+    assert client.get("/analytics/spend/by-user", headers=headers).status_code == 403
+    assert client.get("/analytics/spend/by-category?scope=org", headers=headers).status_code == 403
+    assert client.get("/analytics/spend/by-user", headers=admin).status_code == 200
+
+def test_search_fuzzy_prefix_and_scopes():
+    import uuid
+    suffix = uuid.uuid4().hex[:6]
+    alice = _login(f"test_search_alice_{suffix}")
+    bob = _login(f"test_search_bob_{suffix}")
+    admin = _login("test_search_admin", role="admin")
+    client.post("/subscriptions", json={"name": "Figma", "cost": 15, "category": "Design"}, headers=alice)
+    sign = client.post("/subscriptions", json={"name": "Adobe Sign", "cost": 10, "category": "Legal",
+                                               "custom_attributes": {"team": "procurement"}}, headers=alice).json()
+    client.post("/subscriptions", json={"name": "figma pro", "cost": 45, "category": "Design"}, headers=bob)
+    client.post("/requests", json={"type": "software", "details": {"name": "Adobe Acrobat", "cost": 20}}, headers=alice)
+
+    def names(params, headers):
+        res = client.get("/search", params=params, headers=headers)
+        assert res.status_code == 200
+        return res.json()
+
+    # Typo tolerance, own rows only
+    hits = names({"q": "figam", "types": "subscriptions"}, alice)["subscriptions"]
+    assert [h["name"] for h in hits] == ["Figma"]
+    # Org scope finds the same tool bought under another name by another user
+    org = {(h["name"], h["owner_id"]) for h in names({"q": "figma", "scope": "org", "types": "subscriptions"}, admin)["subscriptions"]}
+    assert {"Figma", "figma pro"} <= {name for name, _ in org}
+    assert client.get("/search", params={"q": "figma", "scope": "org"}, headers=alice).status_code == 403
+
+    # Custom attributes and request details are searchable
+    assert [h["name"] for h in names({"q": "procurement"}, alice)["subscriptions"]] == ["Adobe Sign"]
+    requests = names({"q": "acrobat", "types": "requests"}, alice)["requests"]
+    assert [r["details"]["name"] for r in requests] == ["Adobe Acrobat"]
+
+    # The index follows updates
+    client.put(f"/subscriptions/{sign['id']}", json={"name": "DocuSign", "cost": 10, "category": "Legal"}, headers=alice)
+    assert [h["name"] for h in names({"q": "adobe", "types": "subscriptions"}, alice)["subscriptions"]] == []
+
+    suggestions = client.get("/search/autocomplete", params={"q": "FI", "scope": "org"}, headers=admin).json()
+    assert {"Figma", "figma pro"} <= {s["name"] for s in suggestions}
+    assert client.get("/search", params={"q": "fi"}, headers=alice).status_code == 422
+
+def test_search_like_wildcards_are_literal():
+    from app import database, models, search
+    headers = _login("test_search_wildcard_user")
+    for name in ("abc", "a_c", "50% off"):
+        client.post("/subscriptions", json={"name": name, "cost": 1}, headers=headers)
+    with database.SessionLocal() as db:
+        owner_id = db.query(models.User.id).filter(models.User.username == "test_search_wildcard_user").scalar()
+        # limit=1 stops after the LIKE pass, so these are the substring candidates only
+        assert [row["name"] for row in search._sqlite_subscription_candidates(db, "a_c", owner_id, 1)] == ["a_c"]
+        assert [row["name"] for row in search._sqlite_subscription_candidates(db, "%", owner_id, 1)] == ["50% off"]
+
+def test_search_postgres_candidate_sql():
+    # The pg_trgm/tsvector path, compiled for Postgres (on an existing database
+    # `python -m app.migrate` creates the indexes it relies on)
+    from sqlalchemy.dialects import postgresql
+    from app import search
+
+    class Capture:
+        def __init__(self):
+            self.statements = []
+        def get_bind(self):
+            return type("Bind", (), {"dialect": postgresql.dialect()})()
+        def execute(self, stmt):
+            self.statements.append(stmt.compile(dialect=postgresql.dialect()))
+            return type("Result", (), {"mappings": lambda self: type("Rows", (), {"all": lambda self: []})()})()
+
+    db = Capture()
+    assert search.search_subscriptions(db, "50%_off", owner_id=7) == []
+    assert search.search_requests(db, "Figma", owner_id=None) == []
+    subs, requests = db.statements
+    sql = str(subs)
+    assert "<%% lower(subscriptions.name)" in sql and "word_similarity" in sql  # pyformat doubles the %
+    assert "LIKE" in sql and "ESCAPE '\\'" in sql
+    assert "%50\\%\\_off%" in subs.params.values() and 7 in subs.params.values()
+    sql = str(requests)
+    assert "to_tsvector('simple'" in sql and "@@ plainto_tsquery('simple'" in sql and "requester_id" not in sql.split("WHERE")[1]
+
+def test_duplicate_scan_groups_vendors_across_users():
+    import uuid
+    from app import catalog, database, duplicates
+    tag = uuid.uuid4().hex[:6]
+    vendor = f"quillbot{tag}"
+    alice, bob, carol = (_login(f"test_dup_{name}_{tag}") for name in ("alice", "bob", "carol"))
+    admin = _login("test_dup_admin", role="admin")
+
+    # Plan suffixes, company suffixes and a misspelling all resolve to one vendor
+    ids = [client.post("/subscriptions", json={"name": name, "cost": cost}, headers=headers).json()["id"] for name, cost, headers in [
+        (f"Quillbot{tag} Premium", 10.0, alice), (f"quillbot{tag}", 6.0, alice),
+        (f"Quillbot{tag}, Inc.", 10.0, bob), (f"Quilbot{tag}", 10.0, carol),
+    ]]
+    resolver = duplicates.VendorResolver(catalog.VendorMatcher(catalog.DEFAULT_VENDORS), {})
+    assert [resolver.resolve(n) for n in ("Amazon Web Services", "Adobe Sign", "Slack Pro")] == ["aws", "adobe", "slack"]
+
+    db = database.SessionLocal()
+    run = lambda: duplicates.scan_duplicates(db, batch_size=3)
+    run()
+    group = lambda: next((g for g in client.get("/duplicates?limit=1000", headers=admin).json() if g["vendor"] == vendor), None)
+    # Alice pays twice (6.0 is duplicate spend); the other 30.0 earns the consolidation discount
+    assert {k: group()[k] for k in ("owners", "subscriptions", "total_cost", "duplicate_cost", "estimated_savings")} == \
+        {"owners": 3, "subscriptions": 4, "total_cost": 36.0, "duplicate_cost": 6.0, "estimated_savings": 12.0}
+    assert group()["in_catalog"] is False
+
+    # Nothing changed: nothing is reprocessed
+    assert (run()["rows_changed"], run()["vendors_updated"]) == (0, 0)
+
+    # Only the changed rows and the vendor they belong to are recomputed
+    client.put("/subscriptions/bulk", json={"ids": [ids[1]], "changes": {"status": "Cancelled"}}, headers=alice)
+    client.delete(f"/subscriptions/{ids[3]}", headers=carol)
+    summary = run()
+    assert (summary["full"], summary["rows_changed"], summary["vendors_updated"]) == (False, 1, 1)
+    assert (group()["owners"], group()["subscriptions"], group()["estimated_savings"]) == (2, 2, 4.0)
+    db.close()
+
+    members = client.get(f"/duplicates/{vendor}", headers=admin).json()
+    assert sorted(m["id"] for m in members) == sorted(ids[:3])
+    assert client.get("/duplicates", headers=alice).status_code == 403
+    assert client.get("/duplicates/no-such-vendor", headers=admin).status_code == 404
+
+def test_login_rehash_rate_limit_and_backpressure(monkeypatch):
+    import uuid
+    from passlib.context import CryptContext
+    from app import database, hashing, models, ratelimit
+    username = f"test_rehash_{uuid.uuid4().hex[:8]}"
+    login = lambda password: client.post("/token", data={"username": username, "password": password})
+
+    # A hash made with a cheaper cost factor is replaced transparently on the next login
+    db = database.SessionLocal()
+    db.add(models.User(username=username, hashed_password=CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("pw123456")))
+    db.commit()
+    assert login("pw123456").status_code == 200
+    db.expire_all()
+    stored = db.query(models.User).filter(models.User.username == username).first().hashed_password
+    db.close()
+    assert stored.startswith(f"$2b${hashing.BCRYPT_ROUNDS:02d}$") and hashing.pwd_context.verify("pw123456", stored)
+
+    # Failed attempts per username are capped; the response says when to come back
+    monkeypatch.setattr(ratelimit, "LOGIN_LIMIT_PER_USER", 3)
+    assert [login("wrong").status_code for _ in range(4)] == [400, 400, 400, 429]
+    assert 0 < int(login("pw123456").headers["Retry-After"]) <= ratelimit.LOGIN_WINDOW_SECONDS
+
+    # A full hashing queue sheds load instead of queueing without bound
+    monkeypatch.setattr(ratelimit, "LOGIN_LIMIT_PER_USER", 0)
+    monkeypatch.setattr(hashing.pool, "max_pending", 0)
+    busy = login("pw123456")
+    assert busy.status_code == 503 and busy.headers["Retry-After"] == str(hashing.RETRY_AFTER_SECONDS)
+    monkeypatch.undo()
+
+    stats = client.get("/auth/stats", headers=_login("test_rehash_admin", role="admin")).json()
+    assert stats["hashing"]["completed"] > 0 and stats["hashing"]["rejected"] >= 1
+    assert stats["login_limits"]["limited"] >= 1
+
+def test_login_limit_per_ip_counts_failures_only(monkeypatch):
+    from starlette.requests import Request
+    from app import ratelimit
+    monkeypatch.setattr(ratelimit, "LOGIN_LIMIT_PER_USER", 0)
+    monkeypatch.setattr(ratelimit, "LOGIN_LIMIT_PER_IP", 3)
+    users = [f"test_office_user_{i}" for i in range(5)]
+    for username in users:
+        _login(username)
+    # Everyone comes through the office proxy (a trusted private address)
+    office = TestClient(app, client=("10.0.0.2", 50000))
+    login = lambda username, password, ip: office.post(
+        "/token", data={"username": username, "password": password}, headers={"X-Forwarded-For": ip}
+    ).status_code
+
+    # More successful logins from one IP than its limit: none of them count
+    assert [login(u, "password123", "198.51.100.7") for u in users] == [200] * 5
+    # Wrong passwords do, per client IP taken from X-Forwarded-For, not per proxy
+    assert [login(users[0], "wrong", "203.0.113.9") for _ in range(3)] == [400] * 3
+    assert login(users[1], "password123", "203.0.113.9") == 429
+    assert login(users[1], "password123", "198.51.100.7") == 200
+
+    def ip_of(peer, forwarded):
+        return ratelimit.client_ip(Request({"type": "http", "client": (peer, 1), "headers": [(b"x-forwarded-for", forwarded.encode())]}))
+    # An untrusted peer can't pick its bucket; behind a proxy chain the right-most untrusted hop wins
+    assert ip_of("198.51.100.20", "1.2.3.4") == "198.51.100.20"
+    assert ip_of("10.0.0.2", "1.2.3.4, 198.51.100.20, 10.0.0.9") == "198.51.100.20"
+
+# SQL statements each endpoint may send, cold principal cache included. A lazy load
+# during serialization adds a query per row, so listings are seeded with 30 rows each.
+QUERY_BUDGETS = [
+    ("employee", "GET", "/subscriptions", None, 2),
+    ("employee", "GET", "/subscriptions?fields=name,cost&sort=-renewal_date", None, 2),
+    ("employee", "GET", "/requests", None, 2),
+    ("admin", "GET", "/requests?status=Pending", None, 2),
+    ("employee", "GET", "/export", None, 2),
+    ("employee", "POST", "/requests", {"type": "software", "details": {"name": "Budget Tool", "cost": 5}}, 2),
+    ("employee", "POST", "/subscriptions", {"name": "Budget Sub", "cost": 5, "category": "QA"}, 3),
+    ("employee", "PUT", "/subscriptions/{sub_id}", {"name": "Budget Sub 2", "cost": 6, "category": "QA"}, 4),
+    ("admin", "PUT", "/requests/{req_id}/approve", None, 4),
+    ("admin", "PUT", "/requests/{other_req_id}/reject?note=no", None, 2),
+    ("employee", "GET", "/search?q=budget", None, 3),
+    ("employee", "GET", "/analytics/spend/by-category", None, 2),
+    ("employee", "GET", "/renewals/alerts", None, 2),
+]
+
+def test_endpoint_query_budgets(count_queries):
+    from app import auth, cache, database, models
+    tokens = {"employee": _login("test_budget_user"), "admin": _login("test_budget_admin", role="admin")}
+    db = database.SessionLocal()
+    user = db.query(models.User).filter(models.User.username == "test_budget_user").first()
+    db.query(models.Subscription).filter(models.Subscription.owner_id == user.id).delete()
+    db.query(models.Request).filter(models.Request.requester_id == user.id).delete()
+    subs = [models.Subscription(name=f"Budget {i}", cost=1.0 + i, category="QA", owner_id=user.id) for i in range(30)]
+    reqs = [models.Request(type="software", details={"name": f"Budget {i}", "cost": i}, requester_id=user.id) for i in range(30)]
+    db.add_all(subs + reqs)
+    db.commit()
+    ids = {"sub_id": subs[0].id, "req_id": reqs[0].id, "other_req_id": reqs[1].id}
+    db.close()
+
+    over = []
+    for role, method, path, body, budget in QUERY_BUDGETS:
+        auth.principal_cache.clear()
+        cache.client.flushall()
+        with count_queries() as statements:
+            res = client.request(method, path.format(**ids), json=body, headers=tokens[role])
+        assert res.status_code == 200, (method, path, res.text)
+        if len(statements) > budget:
+            over.append(f"{method} {path}: {len(statements)} > {budget}\n  " + "\n  ".join(statements))
+    assert not over, "Query budget exceeded:\n" + "\n".join(over)
+
+def test_fast_serialization_matches_validated_output(monkeypatch):
+    from app import cache
+    headers = _login("test_fast_serialization_user")
+    client.post("/subscriptions", json={"name": "Fast Sub", "cost": 12, "category": "QA",
+                                        "renewal_date": "2031-05-01T08:30:00", "custom_attributes": {"seats": 3}}, headers=headers)
+    client.post("/requests", json={"type": "software", "details": {"name": "Fast Tool", "cost": 7.5}}, headers=headers)
+
+    def pages():
+        cache.client.flushall()
+        return [client.get(path, headers=headers).content
+                for path in ("/subscriptions?sort=-renewal_date", "/requests", "/requests?fields=status,id&sort=created_at")]
+
+    validated = pages()
+    monkeypatch.setattr(cache, "FAST_SERIALIZATION", True)
+    assert pages() == validated
+
+    # Responses bypass the models, but the documented schemas are still the response models
+    paths = client.get("/openapi.json").json()["paths"]
+    assert paths["/subscriptions"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]["items"]["$ref"].endswith("/SubscriptionOut")
+    assert paths["/requests"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]["items"]["$ref"].endswith("/RequestOut")
+
+def _samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+def test_metrics_endpoint(monkeypatch):
+    from app import auth, metrics
+    headers = _login("test_metrics_user")
+    # Fails closed: no token and no explicit opt-in means no metrics
+    assert client.get("/metrics").status_code == 403
+    monkeypatch.setattr(metrics, "METRICS_ALLOW_UNAUTHENTICATED", True)
+    auth.principal_cache.clear()
+    before = _samples(client.get("/metrics").text)
+    client.get("/subscriptions", headers=headers)
+    client.get("/subscriptions", headers=headers)
+    client.get("/tasks/not-a-task", headers=headers)
+
+    res = client.get("/metrics")
+    assert res.status_code == 200 and res.headers["content-type"].startswith("text/plain")
+    after = _samples(res.text)
+    delta = lambda name: after.get(name, 0) - before.get(name, 0)
+    # Labelled by route template, not raw path
+    assert delta('officewatch_http_requests_total{method="GET",route="/subscriptions",status="200"}') == 2
+    assert delta('officewatch_http_requests_total{method="GET",route="/tasks/{task_id}",status="404"}') == 1
+    assert delta('officewatch_http_request_duration_seconds_count{method="GET",route="/subscriptions"}') == 2
+    # The first request looked up the user and loaded the page; the cache hit sent nothing
+    assert delta('officewatch_http_request_db_queries_sum{method="GET",route="/subscriptions"}') == 2
+    assert delta('officewatch_cache_requests_total{namespace="subs",result="hits"}') == 1
+    assert delta('officewatch_cache_load_duration_seconds_count{namespace="subs"}') == 1
+    assert after["officewatch_threadpool_threads_limit"] > 0
+    assert "officewatch_db_query_duration_seconds_bucket{le=\"+Inf\"}" in after
+
+    # A token is required once set, opt-in or not
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+# Fresh-interpreter cold start (import + lifespan + first request). This box
+# does it in ~1s; the budget leaves room for slow CI runners.
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "3"))
+STARTUP_PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+schema_touched = os.path.exists(os.environ["DATABASE_URL"][len("sqlite:///"):])
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    assert client.post("/chat", json={"message": "hello"}).status_code == 200
+    first_request = time.perf_counter()
+heavy = [m for m in ("pandas", "pyarrow", "pypdf", "celery") if m in sys.modules]
+print(json.dumps({"import": imported - started, "total": first_request - started,
+                  "schema_touched": schema_touched, "heavy": heavy}))
+"""
+
+def test_startup_budget(tmp_path):
+    import json
+    import subprocess
+    import sys
+    probe = tmp_path / "startup_probe.py"
+    probe.write_text(STARTUP_PROBE)
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'cold.db'}", REDIS_URL="redis://127.0.0.1:1/0", PYTHONPATH=backend)
+    out = subprocess.run([sys.executable, str(probe)], cwd=backend, env=env, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    startup = json.loads(out.stdout.splitlines()[-1])
+    # Importing the app neither opens the database nor loads worker/export-only libraries
+    assert not startup["schema_touched"]
+    assert startup["heavy"] == []
+    assert startup["total"] < STARTUP_BUDGET_SECONDS, startup
+
+@pytest.mark.parametrize("async_reads", [False, True], ids=["sync", "async"])
+def test_read_replica_routing(tmp_path, monkeypatch, async_reads):
+    import asyncio
+    from app import cache, database, metrics, migrate, models, routing
+    reader = TestClient(_async_app(monkeypatch)) if async_reads else client
+    username = f"test_replica_user_{'async' if async_reads else 'sync'}"
+    # Second SQLite file as the replica. It never receives the rows written
+    # below, which is what a replica that has not caught up yet looks like.
+    replica = database.Replica("replica0", f"sqlite:///{tmp_path / 'replica.db'}")
+    migrate.run(replica.engine)
+    down = database.Replica("replica1", f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    monkeypatch.setattr(database, "replicas", [down, replica])
+    monkeypatch.setattr(routing, "_local_pins", {})
+    routes = lambda reason, engine="primary": metrics.DB_READ_ROUTES._values.get((engine, reason), 0)
+    before = {reason: routes(reason) for reason in ("pinned", "no_replica")}
+    headers = _login(username)
+    names = lambda: [s["name"] for s in reader.get("/subscriptions", headers=headers).json()]
+
+    # Read-your-writes: right after the write, this user's list comes from the primary
+    client.post("/subscriptions", json={"name": "Linear", "cost": 8}, headers=headers)
+    assert names() == ["Linear"]
+    assert routes("pinned") == before["pinned"] + 1
+
+    # Once the pin expires, reads go to the healthy replica (the missing file is skipped)
+    routing._local_pins.clear()
+    cache.client.flushall()
+    assert names() == []
+    assert routes("replica", "replica0") >= 1
+    assert not down.healthy and replica.healthy
+    assert client.get("/export", headers=headers).text.strip().splitlines() == ["Name,Cost,Category,Status,Renewal"]
+
+    # A cache miss between pinning a write and invalidating its pages reads the primary
+    seen = []
+    invalidate = cache.invalidate
+    def read_then_invalidate(namespace, scope):
+        seen.append(names())
+        invalidate(namespace, scope)
+    cache.client.flushall()
+    monkeypatch.setattr(cache, "invalidate", read_then_invalidate)
+    client.post("/subscriptions", json={"name": "Notion", "cost": 4}, headers=headers)
+    monkeypatch.setattr(cache, "invalidate", invalidate)
+    assert seen == [["Linear", "Notion"]]
+    routing._local_pins.clear()
+
+    # Replication catches up
+    with database.SessionLocal() as db:
+        owner_id = db.query(models.User.id).filter(models.User.username == username).scalar()
+    with replica.Session() as db:
+        db.add(models.User(id=owner_id, username=username, hashed_password="x", role="employee"))
+        db.add(models.Subscription(name="Linear", cost=8, owner_id=owner_id))
+        db.commit()
+    cache.client.flushall()
+    assert names() == ["Linear"]
+
+    # A replica that falls too far behind is skipped until a later check sees it caught up
+    monkeypatch.setattr(database, "replication_lag", lambda conn: database.REPLICA_MAX_LAG + 30)
+    replica.checked_at = None
+    with replica.Session() as db:
+        db.query(models.Subscription).delete()
+        db.commit()
+    cache.client.flushall()
+    assert names() == ["Linear", "Notion"]
+    assert routes("no_replica") == before["no_replica"] + 1
+    assert database.pool_stats()["replica0"]["lag_seconds"] == database.REPLICA_MAX_LAG + 30
+
+    async def close():
+        for engine in (replica.async_engine, down.async_engine, async_reads and database.async_engine):
+            if engine:
+                await engine.dispose()
+    replica.engine.dispose()
+    down.engine.dispose()
+    asyncio.run(close())
+
+def test_migrate_upgrades_existing_schema(tmp_path):
+    from sqlalchemy import create_engine, text
+    from app import migrate, models
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    migrate.run(engine)
+    # Roll back to what the baseline schema had: tables with their single-column
+    # indexes only, no keyset indexes and no search tables
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO subscriptions (id, name, cost, status) VALUES (1, 'Figma Professional', 15, 'Active')"))
+        for name, kind in conn.execute(text("SELECT name, type FROM sqlite_master WHERE type IN ('index', 'trigger', 'table')")).all():
+            if kind == "trigger" or name.endswith("_fts") or name.startswith("subscription_terms"):
+                conn.execute(text(f"DROP {kind.upper()} IF EXISTS {name}"))
+        for table in ("subscriptions", "requests"):
+            for index in models.Base.metadata.tables[table].indexes:
+                if len(index.expressions) > 1 or index.name == "ix_subscriptions_name_lower":
+                    conn.execute(text(f"DROP INDEX {index.name}"))
+
+    changes = migrate.run(engine)
+    assert "ix_subscriptions_owner_renewal" in changes["indexes"] and "ix_requests_created_id" in changes["indexes"]
+    assert sorted(changes["search"]) == ["requests", "subscriptions"]
+    with engine.connect() as conn:
+        existing = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        assert {index.name for table in models.Base.metadata.sorted_tables for index in table.indexes} <= existing
+        # The FTS table was rebuilt from the existing rows, and the sync triggers are back
+        assert conn.execute(text("SELECT rowid FROM subscriptions_fts WHERE subscriptions_fts MATCH 'figma'")).scalars().all() == [1]
+        assert conn.execute(text("SELECT n FROM subscription_terms WHERE term = 'figma professional'")).scalar() == 1
+    # Running it again changes nothing
+    assert migrate.run(engine) == {"indexes": [], "search": [], "vendors": 0}
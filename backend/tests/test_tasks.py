@@ -0,0 +1,202 @@
+import json
+from app import catalog, database, events, models, tasks
+
+def test_matcher_single_pass():
+    pages = ["Invoice #1\nZoom Pro $ 14.99\n", "slack seats $120.00, laws and github.com"]
+    found, _, max_price, chars = catalog.VendorMatcher(catalog.DEFAULT_VENDORS).scan(iter(pages))
+    assert found == {"Zoom": "Communication", "Slack": "Communication", "GitHub": "DevTools"}
+    assert max_price == 120.00
+    assert chars == sum(len(p) for p in pages)
+
+def test_save_found_apps_skips_existing():
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    user = models.User(username="test_scan_user", hashed_password="x")
+    db.add(user)
+    db.commit()
+    db.add(models.Subscription(name="Zoom", cost=1.0, owner_id=user.id))
+    db.commit()
+
+    apps = [{"name": "Zoom", "cost": 9.0, "category": "Communication"},
+            {"name": "Figma", "cost": 9.0, "category": "Design"}]
+    assert tasks.save_found_apps(db, user.id, apps, "/tmp/invoice.pdf") == 1
+    names = sorted(s.name for s in db.query(models.Subscription).filter(models.Subscription.owner_id == user.id))
+    assert names == ["Figma", "Zoom"]
+
+    db.query(models.Subscription).filter(models.Subscription.owner_id == user.id).delete()
+    db.delete(user)
+    db.commit()
+    db.close()
+
+def test_trie_matcher_aliases_and_price_hints():
+    matcher = catalog.VendorMatcher([
+        {"name": "AWS", "category": "Cloud", "aliases": ["Amazon Web Services"]},
+        {"name": "Adobe", "category": "Design"},
+        {"name": "Adobe Sign", "category": "Legal", "price_pattern": r"Sign plan\s*\$(\d+\.\d{2})"},
+        {"name": "GitHub", "category": "DevTools", "aliases": ["GH-ENT-SEAT"]},
+    ])
+    pages = ["Amazon  Web\nServices usage $310.00", "Adobe Sign plan $25.00 and adobe signals", "SKU gh-ent-seat x 10 $210.00"]
+    found, hinted, max_price, _ = matcher.scan(pages)
+    assert found == {"AWS": "Cloud", "Adobe Sign": "Legal", "Adobe": "Design", "GitHub": "DevTools"}
+    assert hinted == {"Adobe Sign": 25.0}
+    assert max_price == 310.0
+
+def test_catalog_hot_reload():
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    catalog.seed_defaults(db)
+    db.add(models.Vendor(name="Linear", category="DevTools", aliases=["linear.app"]))
+    catalog.bump_version(db)
+    db.commit()
+
+    matcher = catalog.current_matcher(db)
+    assert matcher.scan(["Linear.app subscription"])[0] == {"Linear": "DevTools"}
+    # Unchanged version -> the same compiled object is reused
+    assert catalog.current_matcher(db) is matcher
+
+    db.query(models.Vendor).filter(models.Vendor.name == "Linear").delete()
+    catalog.bump_version(db)
+    db.commit()
+    assert catalog.current_matcher(db).scan(["Linear.app subscription"])[0] == {}
+    db.close()
+
+def test_scan_result_recorded_on_upload():
+    from app import uploads
+    models.Base.metadata.create_all(bind=database.engine)
+    upload, is_new = uploads.claim_upload(424242, "ab" * 32, "missing.pdf", 10)
+    assert is_new
+    assert tasks.scan_invoice("/nonexistent/missing.pdf", 424242, upload_id=upload["id"]) == "File missing"
+
+    # A failed scan does not block a retry of the same content
+    retry, is_new = uploads.claim_upload(424242, "ab" * 32, "missing.pdf", 10)
+    assert is_new and retry["task_id"] != upload["task_id"]
+
+def test_scan_publishes_progress_and_completion():
+    pubsub = events.client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(events.channel(515151))
+
+    report = tasks.progress_reporter(tasks.scan_invoice, 515151, every=2)
+    pages = ["cover page", "Zoom Pro $14.99", "terms", "more terms", "Slack $8.00"]
+    catalog.VendorMatcher(catalog.DEFAULT_VENDORS).scan(pages, on_page=report)
+    tasks.scan_invoice.apply(args=["/nonexistent/missing.pdf", 515151], task_id="scan-events-test")
+
+    received = []
+    for _ in range(20):
+        # get_message() also returns None for the swallowed subscribe confirmation
+        message = pubsub.get_message(timeout=0.05)
+        if message is not None:
+            received.append(json.loads(message["data"]))
+    pubsub.close()
+    # Every 2nd page, plus each page where a new vendor appeared
+    assert [(e["pages_parsed"], e["vendors_found"]) for e in received if e["type"] == "task.progress"] == [(2, 1), (4, 1), (5, 2)]
+    assert received[-1] == {"type": "task.completed", "task_id": "scan-events-test", "status": "Failed", "result": "File missing"}
+
+def test_scan_renewals_incremental_and_idempotent():
+    from datetime import datetime, timedelta
+    from app import renewals
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    db.query(models.RenewalWindow).delete()
+    user = models.User(username="test_renewal_user", hashed_password="x")
+    db.add(user)
+    db.commit()
+    now = datetime(2040, 1, 1, 9, 0)
+    due = now + timedelta(days=2)
+    db.add_all([models.Subscription(name=f"Tool {i}", cost=5.0, renewal_date=due, owner_id=user.id) for i in range(3)] + [
+        models.Subscription(name="Cancelled", cost=5.0, renewal_date=due, owner_id=user.id, status="Cancelled"),
+        models.Subscription(name="Later", cost=5.0, renewal_date=now + timedelta(days=45), owner_id=user.id),
+        # Today's window starts now: the renewal two hours ago is past, the one in two hours is due
+        models.Subscription(name="Earlier today", cost=5.0, renewal_date=now - timedelta(hours=2), owner_id=user.id),
+        models.Subscription(name="Later today", cost=5.0, renewal_date=now + timedelta(hours=2), owner_id=user.id),
+    ])
+    db.commit()
+
+    # batch_size=2 makes the three subscriptions due on one day span two keyset pages
+    first = renewals.scan_renewals(db, days=30, now=now, batch_size=2)
+    assert (first["days_scanned"], first["subscriptions"], first["alerts"]) == (30, 4, 4)
+    again = renewals.scan_renewals(db, days=30, now=now + timedelta(hours=1), batch_size=2)
+    assert (again["days_scanned"], again["alerts"]) == (0, 0)
+
+    # Once a processed day goes stale it is rescanned: only the newcomer gets an alert
+    db.add(models.Subscription(name="Late addition", cost=5.0, renewal_date=due, owner_id=user.id))
+    db.commit()
+    later = renewals.scan_renewals(db, days=30, now=now + timedelta(hours=25), batch_size=2)
+    assert (later["subscriptions"], later["alerts"]) == (4, 1)
+    names = sorted(a.name for a in db.query(models.RenewalAlert).filter(models.RenewalAlert.owner_id == user.id))
+    assert names == ["Late addition", "Later today", "Tool 0", "Tool 1", "Tool 2"]
+
+    db.query(models.RenewalAlert).filter(models.RenewalAlert.owner_id == user.id).delete()
+    db.query(models.Subscription).filter(models.Subscription.owner_id == user.id).delete()
+    db.delete(user)
+    db.commit()
+    db.close()
+
+def test_task_metrics_shared_through_redis(tmp_path):
+    import time
+    from celery import signals
+    from pypdf import PdfWriter
+    from app import metrics
+
+    writer = PdfWriter()
+    for _ in range(3):
+        writer.add_blank_page(width=200, height=200)
+    pdf = tmp_path / "blank.pdf"
+    with open(pdf, "wb") as f:
+        writer.write(f)
+    tasks.scan_invoice.apply(args=[str(pdf), 737373])
+
+    # What a worker sees for a task published two seconds earlier
+    task = tasks.scan_renewals
+    task.push_request(published_at=time.time() - 2)
+    try:
+        signals.task_prerun.send(sender=task, task_id="metrics-1", task=task)
+    finally:
+        task.pop_request()
+    signals.task_postrun.send(sender=task, task_id="metrics-1", task=task, state="SUCCESS")
+
+    text = metrics.render()
+    assert 'officewatch_celery_task_duration_seconds_count{task="scan_invoice",state="SUCCESS"} 1' in text
+    assert 'officewatch_celery_task_queue_wait_seconds_count{task="scan_renewals"} 1' in text
+    assert 'officewatch_celery_task_queue_wait_seconds_bucket{task="scan_renewals",le="1.0"} 0' in text
+    assert "officewatch_invoice_scan_pages_total 3.0" in text
+    assert "officewatch_invoice_scan_pages_per_second_count 1" in text
+
+def test_page_extraction_resumes_after_pool_failure(tmp_path, monkeypatch):
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(8):
+        writer.add_blank_page(width=200, height=200)
+    pdf = tmp_path / "blank.pdf"
+    with open(pdf, "wb") as f:
+        writer.write(f)
+
+    class DyingPool:
+        # The first chunk (page 0) comes back, then the pool breaks
+        def submit(self, fn, path, start, stop):
+            future = Future()
+            if start == 0:
+                future.set_result([f"page {i}" for i in range(start, stop)])
+            else:
+                future.set_exception(BrokenProcessPool("a worker died"))
+            return future
+
+        def shutdown(self, **kwargs):
+            pass
+
+    class DaemonicPool(DyingPool):
+        def submit(self, *args):
+            raise AssertionError("daemonic processes are not allowed to have children")
+
+    monkeypatch.setattr(tasks, "_pools", {2: DyingPool()})
+    monkeypatch.setattr(tasks, "_pools_unavailable", False)
+    # Serial extraction picks up after the last page yielded; nothing is read twice
+    assert list(tasks.iter_page_texts(str(pdf), workers=2, threshold=1)) == ["page 0"] + [""] * 7
+    assert 2 not in tasks._pools
+
+    # Where processes can't be started at all, later scans stop trying
+    tasks._pools[2] = DaemonicPool()
+    assert list(tasks.iter_page_texts(str(pdf), workers=2, threshold=1)) == [""] * 8
+    assert tasks._scan_pool(2) is None
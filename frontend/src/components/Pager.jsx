@@ -0,0 +1,52 @@
+import { useCallback, useEffect, useRef, useState } from 'react';
+import api from '../api';
+
+// List endpoints are keyset-paginated: each response holds one page and, if
+// there are more rows, an X-Next-Cursor header to pass back as ?cursor=.
+// Pages are loaded one at a time; the cursors that opened the pages already
+// visited are kept so "Previous" can go back.
+export function useCursorPages(path, pageSize = 50) {
+    const [rows, setRows] = useState([]);
+    const [cursors, setCursors] = useState([null]);
+    const [page, setPage] = useState(0);
+    const [nextCursor, setNextCursor] = useState(null);
+    // For reload() from callbacks registered once, e.g. an EventSource listener
+    const current = useRef({ index: 0, history: [null] });
+
+    const load = useCallback(async (index, history) => {
+        try {
+            const cursor = history[index];
+            const res = await api.get(path, { params: { limit: pageSize, ...(cursor && { cursor }) } });
+            setRows(res.data);
+            setNextCursor(res.headers['x-next-cursor'] || null);
+            setCursors(history);
+            setPage(index);
+            current.current = { index, history };
+        } catch (e) { console.error(e); }
+    }, [path, pageSize]);
+
+    useEffect(() => { load(0, [null]); }, [load]);
+    const reload = useCallback(() => load(current.current.index, current.current.history), [load]);
+
+    return {
+        rows,
+        page,
+        hasPrev: page > 0,
+        hasNext: nextCursor !== null,
+        next: () => load(page + 1, [...cursors.slice(0, page + 1), nextCursor]),
+        prev: () => load(page - 1, cursors),
+        reload,
+    };
+}
+
+export default function Pager({ list }) {
+    if (!list.hasPrev && !list.hasNext) return null;
+    const button = "px-4 py-2 border border-gray-300 rounded text-gray-700 hover:bg-gray-50 disabled:opacity-40 disabled:cursor-not-allowed";
+    return (
+        <div className="flex justify-end items-center gap-3 mt-4">
+            <button onClick={list.prev} disabled={!list.hasPrev} className={button}>Previous</button>
+            <span className="text-sm text-gray-500">Page {list.page + 1}</span>
+            <button onClick={list.next} disabled={!list.hasNext} className={button}>Next</button>
+        </div>
+    );
+}
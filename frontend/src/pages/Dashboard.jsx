@@ -1,25 +1,66 @@
 import { useEffect, useState } from 'react';
 import api from '../api';
+import Pager, { useCursorPages } from '../components/Pager';
 import ChatBot from '../components/Chatbot';
 import { BarChart, Bar, Line, ComposedChart, XAxis, YAxis, Tooltip, ResponsiveContainer, Legend } from 'recharts';
 import { Download, UploadCloud } from 'lucide-react'; // Make sure to install lucide-react
 
 export default function Dashboard() {
-  const [subs, setSubs] = useState([]);
+  // The chart shows one page of subscriptions at a time
+  const list = useCursorPages('/subscriptions', 20);
+  const subs = list.rows.map(sub => ({
+      ...sub,
+      forecast: sub.cost * 1.1
+  }));
+  const [spendByCategory, setSpendByCategory] = useState([]);
   const [uploading, setUploading] = useState(false);
 
-  const fetchData = async () => {
+  // Totals come from the server-side rollups, not from summing every subscription
+  const fetchSpend = async () => {
     try {
-        const res = await api.get('/subscriptions');
-        const dataWithForecast = res.data.map(sub => ({
-            ...sub,
-            forecast: sub.cost * 1.1 
-        }));
-        setSubs(dataWithForecast);
+        const spend = await api.get('/analytics/spend/by-category');
+        setSpendByCategory(spend.data);
     } catch (e) { console.error(e); }
   };
 
-  useEffect(() => { fetchData(); }, []);
+  const fetchData = () => {
+    list.reload();
+    fetchSpend();
+  };
+
+  useEffect(() => { fetchSpend(); }, []);
+
+  // Scan progress is pushed over SSE instead of re-fetching on a timer
+  // EventSource can't send headers, so it connects with a short-lived stream token
+  // instead of putting the login token in the URL
+  useEffect(() => {
+    if (!localStorage.getItem('token')) return;
+    let source = null;
+    let retry = null;
+    let closed = false;
+    const connect = async () => {
+        try {
+            const { data } = await api.post('/events/token');
+            if (closed) return;
+            source = new EventSource(`${api.defaults.baseURL}/events?stream_token=${encodeURIComponent(data.stream_token)}`);
+            source.addEventListener('task.completed', () => {
+                fetchData();
+                setUploading(false);
+            });
+            // The browser's own reconnect would reuse the expired token; get a fresh one
+            source.onerror = () => {
+                source.close();
+                retry = setTimeout(connect, 3000);
+            };
+        } catch (e) { console.error(e); }
+    };
+    connect();
+    return () => {
+        closed = true;
+        clearTimeout(retry);
+        if (source) source.close();
+    };
+  }, []);
 
   // NEW: File Upload Handler
   const handleFileUpload = async (e) => {
@@ -36,17 +77,17 @@ export default function Dashboard() {
     formData.append("file", file);
 
     try {
-        await api.post('/upload-invoice', formData, {
+        const res = await api.post('/upload-invoice', formData, {
             headers: { 'Content-Type': 'multipart/form-data' }
         });
-        alert("Invoice uploaded! AI is processing it. Data will refresh shortly.");
-        
-        // Simple polling to refresh data after 5 seconds
-        setTimeout(() => {
+        alert("Invoice uploaded! AI is processing it. Data will refresh when the scan completes.");
+
+        // The scan may have finished before the event stream saw it; check once
+        const task = await api.get(`/tasks/${res.data.task_id}`);
+        if (task.data.status !== 'Queued') {
             fetchData();
             setUploading(false);
-        }, 5000);
-        
+        }
     } catch (err) {
         console.error(err);
         alert("Upload failed.");
@@ -64,7 +105,8 @@ export default function Dashboard() {
     link.click();
   };
 
-  const totalSpend = subs.reduce((acc, curr) => acc + curr.cost, 0);
+  const totalSpend = spendByCategory.reduce((acc, curr) => acc + curr.total_cost, 0);
+  const activeLicenses = spendByCategory.reduce((acc, curr) => acc + curr.count, 0);
 
   return (
     <div className="relative">
@@ -107,7 +149,7 @@ export default function Dashboard() {
         </div>
         <div className="bg-white p-6 rounded-xl shadow-sm border border-gray-100">
             <h3 className="text-gray-500 font-medium">Active Licenses</h3>
-            <p className="text-4xl font-bold text-blue-600 mt-2">{subs.length}</p>
+            <p className="text-4xl font-bold text-blue-600 mt-2">{activeLicenses}</p>
         </div>
         <div className="bg-white p-6 rounded-xl shadow-sm border border-gray-100">
             <h3 className="text-gray-500 font-medium">Forecasted Spend</h3>
@@ -132,6 +174,7 @@ export default function Dashboard() {
             </ComposedChart>
         </ResponsiveContainer>
       </div>
+      <Pager list={list} />
 
       <ChatBot />
     </div>
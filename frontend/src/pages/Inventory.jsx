@@ -1,9 +1,11 @@
-import { useEffect, useState } from 'react';
+import { useState } from 'react';
 import api from '../api';
+import Pager, { useCursorPages } from '../components/Pager';
 import { Plus, Trash2, Edit2, Calendar, Tag, DollarSign, X } from 'lucide-react';
 
 export default function Inventory() {
-    const [subs, setSubs] = useState([]);
+    const list = useCursorPages('/subscriptions');
+    const subs = list.rows;
     const [isFormOpen, setIsFormOpen] = useState(false);
     const [editingId, setEditingId] = useState(null); // Tracks if we are editing or creating
     
@@ -15,12 +17,8 @@ export default function Inventory() {
         renewal_date: new Date().toISOString().split('T')[0] 
     });
 
-    // Load Data
-    const fetchData = () => {
-        api.get('/subscriptions').then(res => setSubs(res.data));
-    };
-
-    useEffect(() => { fetchData(); }, []);
+    // Refresh the page being viewed
+    const fetchData = list.reload;
 
     // HANDLE SUBMIT (Create OR Update)
     const handleSubmit = async (e) => {
@@ -185,6 +183,7 @@ export default function Inventory() {
                     </tbody>
                 </table>
             </div>
+            <Pager list={list} />
         </div>
     );
 }
\ No newline at end of file
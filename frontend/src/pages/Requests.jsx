@@ -1,17 +1,18 @@
-import { useEffect, useState } from 'react';
+import { useState } from 'react';
 import api from '../api';
+import Pager, { useCursorPages } from '../components/Pager';
 import { useAuth } from '../context/AuthContext';
 import { Check, X, Coffee, Calendar, Monitor, ShoppingCart } from 'lucide-react';
 
 export default function Requests() {
     const { user } = useAuth();
     const isAdmin = user?.role === 'admin';
-    const [requests, setRequests] = useState([]);
+    const list = useCursorPages('/requests');
+    const requests = list.rows;
     const [activeTab, setActiveTab] = useState('software');
     const [details, setDetails] = useState({});
 
-    const fetchRequests = () => api.get('/requests').then(res => setRequests(res.data));
-    useEffect(() => { fetchRequests(); }, []);
+    const fetchRequests = list.reload;
 
     const handleSubmit = async (e) => {
         e.preventDefault();
@@ -95,6 +96,7 @@ export default function Requests() {
                     </div>
                 ))}
             </div>
+            <Pager list={list} />
         </div>
     );
 }
\ No newline at end of file